@@ -6,4 +6,20 @@ class InvalidToken(ApiError):
     code = 401
 
 class EmptyToken(ApiError):
-    code = 403
\ No newline at end of file
+    code = 403
+
+class UpstreamError(ApiError):
+    code = 502
+    description = "Upstream service error"
+
+class UpstreamTimeout(UpstreamError):
+    code = 504
+    description = "Upstream service timed out"
+
+class UpstreamUnavailable(UpstreamError):
+    code = 503
+    description = "Upstream service unavailable"
+
+class UpstreamBusy(UpstreamError):
+    code = 503
+    description = "Upstream service concurrency limit reached"
\ No newline at end of file
@@ -1,13 +1,50 @@
+from .services import coldstart  # first, so STARTUP_PROFILE can time every import below
+
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 
 from .routers import company, user
+from .schemas.user import WARMUP_SAMPLES
 from .errors.errors import ApiError
+from .services import admission, auth, blocking, cache, coalescer, compression, database, metrics, read_model, serialization, tracing, upstream
+from .services import health as health_checks
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    with coldstart.profile.phase("lifespan"):
+        metrics.startup()
+        await upstream.startup()
+        await read_model.startup()
+        health_checks.startup()
+        detector = blocking.detector_from_env(app)
+        if detector is not None:
+            detector.start()
+        app.state.blocking_detector = detector
+    prewarm = asyncio.create_task(coldstart.prewarm_in_background(app, WARMUP_SAMPLES)) if coldstart.PREWARM else None
+    if coldstart.PROFILE:
+        coldstart.profile.log()
+    try:
+        yield
+    finally:
+        if prewarm is not None:
+            await prewarm
+        if detector is not None:
+            detector.stop()
+        await health_checks.shutdown()
+        await read_model.shutdown()
+        await coalescer.shutdown()
+        await upstream.shutdown()
+        await cache.shutdown()
+        await database.shutdown()
+        await metrics.shutdown()
+        tracing.shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=serialization.default_response_class())
 
 # Add CORS middleware
 app.add_middleware(
@@ -18,6 +55,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(admission.AdmissionMiddleware)
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.registry.add_collector(metrics.stats_collector(
+    "cache", "Response cache counters", "cache", cache.stats, ("size",),
+    counters=("hits", "misses", "evictions", "expirations", "coalesced", "errors"),
+))
+metrics.registry.add_collector(metrics.stats_collector(
+    "upstream_guard", "Upstream resilience counters", "upstream", upstream.guard_stats,
+    counters=("calls", "retries", "failures", "timeouts", "short_circuited", "bulkhead_rejections", "circuit_opened"),
+))
+metrics.registry.add_collector(metrics.stats_collector(
+    "coalescer", "Request coalescing counters", "loader", coalescer.stats, ("max_batch_size",),
+    counters=("batches", "keys", "window_seconds", "fallback_batches"),
+))
+metrics.registry.add_collector(metrics.stats_collector(
+    "auth", "JWT verification counters", "verifier", lambda: {"jwt": auth.stats()},
+    counters=("verifications", "failures", "cache_hits", "cache_evictions", "verify_seconds"),
+))
+metrics.registry.add_collector(metrics.stats_collector(
+    "read_model", "Local read-model counters", "model", read_model.stats,
+    counters=("hits", "misses", "stale", "ungranted", "writes", "errors", "sync_runs", "sync_items", "sync_errors",
+              "sync_skipped", "grants_pruned"),
+))
+metrics.registry.add_collector(metrics.stats_collector(
+    "admission", "Rate limiting and load shedding", "scope", admission.stats,
+    ("limit", "in_flight", "baseline_latency_seconds", "clients"),
+    counters=("admitted", "rate_limited", "shed", "store_errors"),
+))
+metrics.registry.add_collector(metrics.stats_collector(
+    "health_check", "Last dependency probe result", "check", health_checks.stats, ("up", "latency_seconds"),
+))
+metrics.registry.add_collector(metrics.stats_collector(
+    "db_pool", "Database connection pool state", "pool", database.stats,
+    ("size", "checked_in", "checked_out", "overflow"),
+))
+
 app.include_router(company.router)
 app.include_router(user.router)
 
@@ -27,8 +103,22 @@ version = "1.0"
 async def health():
     return {"status": "OK Python 5"}
 
+@app.get("/user-management/health/live")
+async def liveness():
+    return {"status": "OK"}
+
+@app.get("/user-management/health/ready")
+async def readiness():
+    report = health_checks.prober.report()
+    return JSONResponse(status_code=200 if report["status"] == "ready" else 503, content=report)
+
+@app.get("/user-management/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.exception_handler(ApiError)
 async def api_error_exception_handler(request: Request, exc: ApiError):
+    metrics.API_ERRORS.inc(type(exc).__name__, exc.code)
     return JSONResponse(
         status_code=exc.code,
         content={
@@ -56,4 +146,6 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
             "details": errors,
             "version": version
         },
-    )
\ No newline at end of file
+    )
+
+coldstart.finish_imports()
@@ -0,0 +1,28 @@
+from typing import Any, Optional
+
+from sqlalchemy import JSON, Float, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class DispatchJob(Base):
+    """A queued incident creation, kept so queued jobs survive a restart.
+
+    ``owner`` is the process sending the job; its lease is renewed on every state change.
+    """
+
+    __tablename__ = "dispatch_jobs"
+    __table_args__ = (Index("ix_dispatch_jobs_status", "status"),)
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    payload: Mapped[Any] = mapped_column(JSON)
+    status: Mapped[str] = mapped_column(String(16))
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    status_code: Mapped[Optional[int]] = mapped_column(Integer)
+    result: Mapped[Optional[Any]] = mapped_column(JSON)
+    error: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[float] = mapped_column(Float)
+    updated_at: Mapped[float] = mapped_column(Float)
+    owner: Mapped[Optional[str]] = mapped_column(String(100))
+    lease_until: Mapped[Optional[float]] = mapped_column(Float)
@@ -0,0 +1,74 @@
+from typing import Any, Optional
+
+from sqlalchemy import JSON, Float, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import Base
+
+
+class Company(Base):
+    """Company profile as returned by the user service."""
+
+    __tablename__ = "read_companies"
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    data: Mapped[Any] = mapped_column(JSON)
+    synced_at: Mapped[float] = mapped_column(Float)
+
+
+class User(Base):
+    """User profile and the freshness of its company links.
+
+    A row can exist with only the document columns when the companies of a user were
+    read by document before the profile itself.
+    """
+
+    __tablename__ = "read_users"
+    __table_args__ = (Index("ix_read_users_document", "document_type", "document_id"),)
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    document_type: Mapped[Optional[str]] = mapped_column(String(50))
+    document_id: Mapped[Optional[str]] = mapped_column(String(100))
+    data: Mapped[Optional[Any]] = mapped_column(JSON)
+    synced_at: Mapped[Optional[float]] = mapped_column(Float)
+    companies_synced_at: Mapped[Optional[float]] = mapped_column(Float)
+
+
+class UserCompany(Base):
+    """One company of a user, as listed by ``/user/companies-user``."""
+
+    __tablename__ = "read_user_companies"
+    __table_args__ = (Index("ix_read_user_companies_user_id", "user_id"),)
+
+    user_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    company_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer)
+    data: Mapped[Any] = mapped_column(JSON)
+
+
+class ReadGrant(Base):
+    """A principal the user service let read a resource, and when it last did.
+
+    Local rows are only served to principals with a recent grant, so the read model never
+    answers a caller the upstream would have refused.
+    """
+
+    __tablename__ = "read_grants"
+    __table_args__ = (Index("ix_read_grants_granted_at", "granted_at"),)
+
+    principal: Mapped[str] = mapped_column(String(255), primary_key=True)
+    resource: Mapped[str] = mapped_column(String(20), primary_key=True)
+    resource_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    granted_at: Mapped[float] = mapped_column(Float)
+
+
+class SyncState(Base):
+    """Cursor and time of the last successful incremental sync, and the process leasing the sync job."""
+
+    __tablename__ = "read_sync_state"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    cursor: Mapped[Optional[str]] = mapped_column(String(500))
+    synced_at: Mapped[Optional[float]] = mapped_column(Float)
+    owner: Mapped[Optional[str]] = mapped_column(String(100))
+    lease_until: Mapped[Optional[float]] = mapped_column(Float)
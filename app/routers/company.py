@@ -1,61 +1,166 @@
-from typing import List
-from fastapi import APIRouter, HTTPException, Path, Query, Header, Depends
-from ..schemas.user import CompanyCreate, CompanyResponse
-import requests
+from typing import Any, List, Optional
+from fastapi import APIRouter, Body, HTTPException, Path, Query, Header, Depends
+from pydantic import TypeAdapter
+from ..schemas.user import CompanyCreate, CompanyResponse, BatchIdsRequest, CompanyBatchResponse, CompanyBulkResponse
+from ..services import batch, cache, coalescer, conditional, serialization, upstream
+from ..services.read_model import read_model
+from ..services.auth import token_headers, token_scope
 import os
 from datetime import date
-import jwt
+from urllib.parse import urljoin
 
 router = APIRouter(prefix="/user-management/company", tags=["Company"])
 
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "https://api.aws.cloud/user")
-SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'secret_key')
-ALGORITHM = "HS256"
-
-def get_current_user(token: str = Header(None)):
-    if token is None:
-        return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except jwt.PyJWTError:
-        return None
-
-def create_company_request(company: CompanyCreate):
+
+USER_SERVICE_TRUSTED = upstream.is_trusted(upstream.USER_SERVICE)
+
+company_cache = cache.from_env("company", default_ttl=300, model=CompanyResponse)
+company_validators = conditional.validators_from_env("company")
+
+COMPANY_CACHE_CONTROL = conditional.cache_control_from_env("company")
+
+COMPANY_BULK_MAX_ROWS = int(os.getenv("COMPANY_BULK_MAX_ROWS", "1000"))
+
+# Built once; validating a list through it runs the compiled CompanyCreate validator for every row
+company_create_list = TypeAdapter(List[CompanyCreate])
+
+async def create_company_request(company: CompanyCreate, token: Optional[str] = None):
     api_url = USER_SERVICE_URL
     endpoint = "/company/"
     company_json = company.model_dump_json()
-    response = requests.post(f"{api_url}{endpoint}", data=company_json, headers={'Content-Type': 'application/json'})
+    response = await upstream.send(
+        upstream.USER_SERVICE, "POST", f"{api_url}{endpoint}",
+        content=company_json, headers={**token_headers(token), 'Content-Type': 'application/json'}
+    )
     return response.json(), response.status_code
 
-def get_company_request(company_id: str, token: str):
+async def get_company_request(company_id: str, token: str):
+    return await company_cache.get_or_load(
+        str(company_id), lambda: load_company_request(str(company_id), token), cacheable=cache.is_success,
+        scope=token_scope(token),
+    )
+
+async def load_company_request(company_id: str, token: str):
+    local = await read_model.get_company(company_id, token)
+    if local is not None:
+        return local, 200
+    response_data, status_code = await company_loader.load((company_id, token))
+    if status_code == 200:
+        await read_model.put_companies([response_data], token)
+    return response_data, status_code
+
+async def fetch_company_request(company_id: str, token: str):
     api_url = USER_SERVICE_URL
 
-    from urllib.parse import urljoin
-    
     endpoint = f"company/{company_id}"
     full_url = urljoin(api_url, endpoint)
     
-    headers = {"token": f"{token}"}
-    response = requests.get(
-        url=full_url,
+    validator_key = (str(company_id), token_scope(token))
+    headers = {**token_headers(token), **company_validators.headers(validator_key)}
+    response = await upstream.send(
+        upstream.USER_SERVICE, "GET", full_url,
         headers=headers
     )
     
-    return response.json(), response.status_code
+    return company_validators.resolve(validator_key, response)
+
+async def fetch_companies_bulk_request(company_ids: List[str], token: str):
+    full_url = urljoin(USER_SERVICE_URL, "company/bulk")
+    headers = {**token_headers(token), 'Content-Type': 'application/json'}
+    response = await upstream.send(upstream.USER_SERVICE, "POST", full_url, json={"ids": company_ids}, headers=headers, idempotent=True)
+    if response.status_code in (404, 405, 501):
+        raise coalescer.BulkUnsupported()
+    response_data = response.json()
+    if response.status_code != 200:
+        return {company_id: (response_data, response.status_code) for company_id in company_ids}
+    found = {str(item["id"]): (item, 200) for item in response_data}
+    return {
+        company_id: found.get(company_id, ({"detail": "Company not found"}, 404))
+        for company_id in company_ids
+    }
+
+async def create_companies_bulk_request(companies: List[CompanyCreate], token: Optional[str] = None):
+    full_url = urljoin(USER_SERVICE_URL, "company/bulk-create")
+    headers = {**token_headers(token), 'Content-Type': 'application/json'}
+    response = await upstream.send(
+        upstream.USER_SERVICE, "POST", full_url, content=company_create_list.dump_json(companies), headers=headers
+    )
+    if response.status_code in (404, 405, 501):
+        raise coalescer.BulkUnsupported()
+    response_data = response.json()
+    if response.status_code >= 400 or not isinstance(response_data, list) or len(response_data) != len(companies):
+        return [(response_data, response.status_code if response.status_code >= 400 else 502)] * len(companies)
+    return [(item, 201) for item in response_data]
+
+company_bulk_forwarder = batch.BulkForwarder("company_create", create_companies_bulk_request, create_company_request)
+
+company_loader = coalescer.from_env(
+    "company",
+    lambda keys: coalescer.resolve_per_token(keys, fetch_companies_bulk_request),
+    lambda key: fetch_company_request(*key),
+)
 
 @router.post("/", response_model=CompanyResponse, status_code=201)
-def create_company(company: CompanyCreate):
-    response_data, status_code = create_company_request(company)
+async def create_company(company: CompanyCreate, token: Optional[str] = Header(None)):
+    response_data, status_code = await create_company_request(company, token)
     if status_code != 201:
         raise HTTPException(status_code=status_code, detail=response_data)
+    await company_cache.invalidate(company_cache.scoped_key(str(response_data["id"]), token_scope(token)))
+    await read_model.put_companies([response_data], token)
     return response_data
 
+@router.post("/bulk", response_model=CompanyBulkResponse, status_code=200)
+async def create_companies_bulk(
+    rows: List[Any] = Body(..., min_length=1, max_length=COMPANY_BULK_MAX_ROWS),
+    token: Optional[str] = Header(None),
+):
+    valid, errors = batch.validate_rows(company_create_list, rows, context={"today": date.today()})
+    results = {
+        index: {"index": index, "status_code": 400, "error": {"message": "Validation Error", "details": details}}
+        for index, details in errors.items()
+    }
+    outcomes = await company_bulk_forwarder.forward([company for _, company in valid], token)
+    created = []
+    for (index, _), (response_data, status_code) in zip(valid, outcomes):
+        item = {"index": index, "status_code": status_code}
+        if status_code == 201:
+            item["data"] = response_data
+            created.append(response_data)
+        else:
+            item["error"] = response_data
+        results[index] = item
+    for company in created:
+        await company_cache.invalidate(company_cache.scoped_key(str(company["id"]), token_scope(token)))
+    await read_model.put_companies(created, token)
+    return serialization.model_response(
+        CompanyBulkResponse, {"results": [results[index] for index in sorted(results)]}, trusted=USER_SERVICE_TRUSTED
+    )
+
+@router.post("/batch", response_model=CompanyBatchResponse, status_code=200)
+async def get_companies_batch(
+    request_data: BatchIdsRequest,
+    token: Optional[str] = Header(None),
+):
+    results = await batch.fetch_many(
+        request_data.ids, company_cache, lambda company_id: get_company_request(str(company_id), token),
+        scope=token_scope(token),
+    )
+    return serialization.model_response(
+        CompanyBatchResponse, {"results": batch.batch_items(results)}, trusted=USER_SERVICE_TRUSTED
+    )
+
 @router.get("/{company_id}", response_model=CompanyResponse, status_code=200)
-def get_company(
+async def get_company(
     company_id: str = Path(..., description="Id of the company"),
+    token: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
 ):
-    response_data, status_code = get_company_request(company_id, 'token')
+    response_data, status_code = await get_company_request(company_id, token)
     if status_code != 200:
         raise HTTPException(status_code=status_code, detail=response_data)
-    return response_data
\ No newline at end of file
+    return conditional.respond(
+        response_data,
+        lambda: serialization.model_response(CompanyResponse, response_data, trusted=USER_SERVICE_TRUSTED),
+        if_none_match, "company", COMPANY_CACHE_CONTROL,
+    )
\ No newline at end of file
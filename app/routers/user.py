@@ -1,97 +1,341 @@
-from typing import List
+import asyncio
+from typing import List, Optional
 from uuid import UUID
-from fastapi import APIRouter, HTTPException, Header, Depends
-from ..schemas.user import UserIdRequest, UserDocumentInfo, UserCompanyRequest, UserWithIncidents, UserCompaniesResponseFiltered
-import requests
+from fastapi import APIRouter, HTTPException, Header, Depends, Query
+from fastapi.responses import StreamingResponse
+from ..schemas.user import UserIdRequest, UserDocumentInfo, UserCompanyRequest, UserResponse, UserView, BatchIdsRequest, UserBatchResponse, IncidentResponse
+from ..services import batch, cache, coalescer, conditional, pagination, serialization, streaming, upstream
+from ..services.pagination import PageParams
+from ..services.read_model import read_model
+from ..errors.errors import UpstreamError
+from ..services.auth import token_headers, token_scope
 import os
-import jwt
 
 router = APIRouter(prefix="/user-management/user", tags=["User"])
 
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "https://api.aws.cloud/user")
 QUERY_INCIDENT_SERVICE_URL = os.getenv("QUERY_INCIDENT_SERVICE_URL", "https://api.aws.cloud/incident-query")
-SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'secret_key')
-ALGORITHM = "HS256"
 APLICATION = "application/json"
 
-def get_user_info_request(user_id: UUID, token: str):
+USER_SERVICE_TRUSTED = upstream.is_trusted(upstream.USER_SERVICE)
+USERS_VIEW_TRUSTED = USER_SERVICE_TRUSTED and upstream.is_trusted(upstream.INCIDENT_QUERY)
+
+user_cache = cache.from_env("user", default_ttl=30, model=UserResponse)
+companies_user_validators = conditional.validators_from_env("companies_user")
+
+COMPANIES_USER_CACHE_CONTROL = conditional.cache_control_from_env("companies_user")
+
+# Per-branch timeouts (seconds) for the composite /users-view call
+USERS_VIEW_TIMEOUTS = {
+    "user": float(os.getenv("USERS_VIEW_USER_TIMEOUT", "2")),
+    "companies": float(os.getenv("USERS_VIEW_COMPANIES_TIMEOUT", "2")),
+    "incidents": float(os.getenv("USERS_VIEW_INCIDENTS_TIMEOUT", "2")),
+}
+
+async def get_user_info_request(user_id: UUID, token: str):
+    return await user_cache.get_or_load(
+        str(user_id), lambda: load_user_info_request(str(user_id), token), cacheable=cache.is_success,
+        scope=token_scope(token),
+    )
+
+async def load_user_info_request(user_id: str, token: str):
+    local = await read_model.get_user(user_id, token)
+    if local is not None:
+        return local, 200
+    response_data, status_code = await user_loader.load((user_id, token))
+    if status_code == 200:
+        await read_model.put_users([response_data], token)
+    return response_data, status_code
+
+async def fetch_user_info_request(user_id: UUID, token: str):
     api_url = USER_SERVICE_URL
     endpoint = f"/user/{user_id}"
-    headers = {"token": f"{token}"}
-    response = requests.get(f"{api_url}{endpoint}", headers=headers)
+    headers = token_headers(token)
+    response = await upstream.send(upstream.USER_SERVICE, "GET", f"{api_url}{endpoint}", headers=headers)
     return response.json(), response.status_code
 
-def get_user_incidents_request(user_id: UUID, company_id: UUID, token: str):
+async def fetch_users_bulk_request(user_ids: List[str], token: str):
+    api_url = USER_SERVICE_URL
+    endpoint = "/user/bulk"
+    headers = {
+        **token_headers(token),
+        "Content-Type": APLICATION
+    }
+    response = await upstream.send(upstream.USER_SERVICE, "POST", f"{api_url}{endpoint}", headers=headers, json={"ids": user_ids}, idempotent=True)
+    if response.status_code in (404, 405, 501):
+        raise coalescer.BulkUnsupported()
+    response_data = response.json()
+    if response.status_code != 200:
+        return {user_id: (response_data, response.status_code) for user_id in user_ids}
+    found = {str(item["id"]): (item, 200) for item in response_data}
+    return {
+        user_id: found.get(user_id, ({"detail": "User not found"}, 404))
+        for user_id in user_ids
+    }
+
+user_loader = coalescer.from_env(
+    "user",
+    lambda keys: coalescer.resolve_per_token(keys, fetch_users_bulk_request),
+    lambda key: fetch_user_info_request(*key),
+)
+
+async def get_user_incidents_request(user_id: UUID, company_id: UUID, token: str, page: Optional[PageParams] = None):
     api_url = QUERY_INCIDENT_SERVICE_URL
     endpoint = "/user-company"
     headers = {
-        "token": f"{token}",
+        **token_headers(token),
         "Content-Type": APLICATION
     }
     data = {
         "user_id": str(user_id),
         "company_id": str(company_id)
     }
-    response = requests.post(f"{api_url}{endpoint}", headers=headers, json=data)
+    params = page.upstream_params() if page else None
+    response = await upstream.send(upstream.INCIDENT_QUERY, "POST", f"{api_url}{endpoint}", headers=headers, json=data, params=params, idempotent=True)
     return response.json(), response.status_code
 
-def get_current_user(token: str = Header(None)):
-    if token is None:
-        return None
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except jwt.PyJWTError:
-        return None
+def stream_user_incidents_request(user_id: UUID, company_id: UUID, token: str, page: PageParams):
+    headers = {
+        **token_headers(token),
+        "Content-Type": APLICATION
+    }
+    data = {
+        "user_id": str(user_id),
+        "company_id": str(company_id)
+    }
+    return upstream.stream(upstream.INCIDENT_QUERY, "POST", f"{QUERY_INCIDENT_SERVICE_URL}/user-company", headers=headers, json=data, params=page.upstream_params(), idempotent=True)
 
-def get_user_companies_request(user_doc_info: UserDocumentInfo, token: str):
+def full_list_request(page: Optional[PageParams]) -> bool:
+    # Only unpaged, unprojected upstream lists are complete enough for the read model
+    return page is None or not page.upstream_params()
+
+async def get_user_companies_request(user_doc_info: UserDocumentInfo, token: str, page: Optional[PageParams] = None):
+    document = (user_doc_info.document_type, user_doc_info.document_id)
+    if page is None or page.upstream_cursor is None:
+        local = await read_model.get_user_companies(token, document=document)
+        if local is not None:
+            return local, 200
     api_url = USER_SERVICE_URL
     endpoint = "user/companies"
     headers = {
-        "token": f"{token}",
+        **token_headers(token),
         "Content-Type": APLICATION
     }
     data = user_doc_info.model_dump_json()
-    response = requests.post(f"{api_url}/{endpoint}", data=data, headers=headers)
-    return response.json(), response.status_code
+    params = page.upstream_params() if page else None
+    response = await upstream.send(upstream.USER_SERVICE, "POST", f"{api_url}/{endpoint}", content=data, headers=headers, params=params, idempotent=True)
+    response_data = response.json()
+    if response.status_code == 200 and full_list_request(page) and isinstance(response_data, dict) and "user_id" in response_data:
+        await read_model.put_user_companies(response_data["user_id"], response_data.get("companies") or [], document, token=token)
+    return response_data, response.status_code
 
-def get_user_companies_request_user(user_doc_info: UserIdRequest, token: str):
+async def get_user_companies_request_user(user_doc_info: UserIdRequest, token: str, page: Optional[PageParams] = None):
+    if page is None or page.upstream_cursor is None:
+        local = await read_model.get_user_companies(token, user_id=str(user_doc_info.id))
+        if local is not None:
+            return local, 200
     api_url = USER_SERVICE_URL
     endpoint = "user/companies-user"
+    params = page.upstream_params() if page else None
+    validator_key = (str(user_doc_info.id), tuple(sorted((params or {}).items())), token_scope(token))
     headers = {
-        "token": f"{token}",
+        **token_headers(token),
+        **companies_user_validators.headers(validator_key),
         "Content-Type": APLICATION
     }
     data = user_doc_info.model_dump_json()
-    response = requests.post(f"{api_url}/{endpoint}", data=data, headers=headers)
-    return response.json(), response.status_code
+    response = await upstream.send(upstream.USER_SERVICE, "POST", f"{api_url}/{endpoint}", content=data, headers=headers, params=params, idempotent=True)
+    response_data, status_code = companies_user_validators.resolve(validator_key, response)
+    if status_code == 200 and full_list_request(page) and isinstance(response_data, dict):
+        await read_model.put_user_companies(str(user_doc_info.id), response_data.get("companies") or [], token=token)
+    return response_data, status_code
+
+def stream_user_companies_request(endpoint: str, user_doc_info, token: str, page: PageParams):
+    headers = {
+        **token_headers(token),
+        "Content-Type": APLICATION
+    }
+    data = user_doc_info.model_dump_json()
+    return upstream.stream(upstream.USER_SERVICE, "POST", f"{USER_SERVICE_URL}/{endpoint}", content=data, headers=headers, params=page.upstream_params(), idempotent=True)
+
+def paged_companies(response_data, page: PageParams):
+    if not (page.active or page.fields) or not isinstance(response_data, dict):
+        return response_data
+    companies, next_cursor = page.paginate(response_data, "companies")
+    paged = {**response_data, "companies": page.project(companies)}
+    if page.active:
+        paged["next_cursor"] = next_cursor
+    return paged
+
+@router.post("/batch", response_model=UserBatchResponse)
+async def get_users_batch(
+    request_data: BatchIdsRequest,
+    token: Optional[str] = Header(None),
+):
+    results = await batch.fetch_many(
+        request_data.ids, user_cache, lambda user_id: get_user_info_request(user_id, token),
+        scope=token_scope(token),
+    )
+    return serialization.model_response(
+        UserBatchResponse, {"results": batch.batch_items(results)}, trusted=USER_SERVICE_TRUSTED
+    )
 
 @router.post("/companies")
-def get_user_companies(
+async def get_user_companies(
     user_doc_info: UserDocumentInfo,
+    token: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    stream: bool = Query(False, description="Forward the upstream body as it arrives"),
+    page: PageParams = Depends(pagination.page_params),
 ):
+    # The raw passthrough cannot project items, so a stream with ``fields`` is answered buffered
+    if ((stream and not page.fields) or streaming.wants_ndjson(accept)) and not page.active:
+        return await streaming.proxy(
+            stream_user_companies_request("user/companies", user_doc_info, token, page),
+            ndjson=streaming.wants_ndjson(accept), key="companies", transform=page.project_item,
+        )
 
-    response_data, status_code = get_user_companies_request(user_doc_info, 'token')
+    response_data, status_code = await get_user_companies_request(user_doc_info, token, page)
     
     if status_code != 200:
         raise HTTPException(status_code=status_code, detail=response_data)
     
-    return response_data
+    return paged_companies(response_data, page)
 
 @router.post("/companies-user")
-def get_user_companies(
+async def get_user_companies(
     user_doc_info: UserIdRequest,
+    token: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    stream: bool = Query(False, description="Forward the upstream body as it arrives"),
+    page: PageParams = Depends(pagination.page_params),
 ):
-    response_data, _ = get_user_companies_request_user(user_doc_info, 'token')
-    
-    return response_data
+    # The raw passthrough cannot project items, so a stream with ``fields`` is answered buffered
+    if ((stream and not page.fields) or streaming.wants_ndjson(accept)) and not page.active:
+        return await streaming.proxy(
+            stream_user_companies_request("user/companies-user", user_doc_info, token, page),
+            ndjson=streaming.wants_ndjson(accept), key="companies", transform=page.project_item,
+        )
+    response_data, status_code = await get_user_companies_request_user(user_doc_info, token, page)
+    if status_code != 200:
+        return response_data
+    paged = paged_companies(response_data, page)
+    return conditional.respond(
+        paged, lambda: serialization.json_response(paged), if_none_match, "companies-user", COMPANIES_USER_CACHE_CONTROL,
+    )
+
+
+
+async def fetch_branch(branch: str, request):
+    try:
+        response_data, status_code = await asyncio.wait_for(request, USERS_VIEW_TIMEOUTS[branch])
+    except asyncio.TimeoutError:
+        return None, 504
+    except UpstreamError as exc:
+        return None, exc.code
+    if status_code != 200:
+        return None, status_code
+    return response_data, status_code
+
+async def open_incidents_stream(request_data: UserCompanyRequest, token: str, page: PageParams):
+    try:
+        response, stack = await asyncio.wait_for(
+            streaming.open_stream(stream_user_incidents_request(request_data.user_id, request_data.company_id, token, page)),
+            USERS_VIEW_TIMEOUTS["incidents"],
+        )
+    except (asyncio.TimeoutError, UpstreamError):
+        return None
+    if response.status_code != 200:
+        await stack.aclose()
+        return None
+    return response, stack
 
+def project_incident(item):
+    return item if USERS_VIEW_TRUSTED else IncidentResponse.model_validate(item).model_dump(mode="json")
 
+def users_view_header(user_data, user_status: int, companies_data, incidents_unavailable: bool) -> bytes:
+    if user_data is None:
+        status_code = user_status if user_status >= 400 else 502
+        raise HTTPException(status_code=status_code, detail="User profile unavailable")
 
-@router.post("/users-view")
+    unavailable = [] if companies_data is not None else ["companies"]
+    if incidents_unavailable:
+        unavailable.append("incidents")
+    view = {
+        **user_data,
+        "companies": (companies_data or {}).get("companies", []),
+        "unavailable": unavailable,
+    }
+    if USERS_VIEW_TRUSTED:
+        return serialization.dumps(view)
+    return UserView.model_validate({**view, "incidents": []}).model_dump_json(exclude={"incidents", "next_cursor"}).encode()
+
+async def stream_user_with_incidents(request_data: UserCompanyRequest, token: Optional[str], page: PageParams):
+    (user_data, user_status), (companies_data, _), incidents = await asyncio.gather(
+        fetch_branch("user", get_user_info_request(request_data.user_id, token)),
+        fetch_branch("companies", get_user_companies_request_user(UserIdRequest(id=request_data.user_id), token)),
+        open_incidents_stream(request_data, token, page),
+    )
+
+    try:
+        header = users_view_header(user_data, user_status, companies_data, incidents is None)
+    except BaseException:
+        # Nothing owns the open incidents stream until the response is built
+        if incidents is not None:
+            await incidents[1].aclose()
+        raise
+
+    async def body():
+        # The profile goes first, without incidents; each following line is one incident
+        yield header + b"\n"
+        if incidents is not None:
+            def transform(item):
+                return page.project_item(project_incident(item))
+
+            async for chunk in streaming.ndjson_lines(incidents[0], key="incidents", transform=transform):
+                yield chunk
+
+    if incidents is None:
+        return StreamingResponse(body(), media_type=streaming.NDJSON)
+    return streaming.streaming_response(body(), incidents[1], streaming.NDJSON)
+
+@router.post("/users-view", response_model=UserView)
 async def get_user_with_incidents(
     request_data: UserCompanyRequest,
-):        
-    incidents_data = get_user_incidents_request(request_data.user_id, request_data.company_id, 'token')
-    
-    return incidents_data
\ No newline at end of file
+    token: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    page: PageParams = Depends(pagination.page_params),
+):
+    if streaming.wants_ndjson(accept) and not page.active:
+        return await stream_user_with_incidents(request_data, token, page)
+
+    (user_data, user_status), (companies_data, _), (incidents_data, _) = await asyncio.gather(
+        fetch_branch("user", get_user_info_request(request_data.user_id, token)),
+        fetch_branch("companies", get_user_companies_request_user(UserIdRequest(id=request_data.user_id), token)),
+        fetch_branch("incidents", get_user_incidents_request(request_data.user_id, request_data.company_id, token, page)),
+    )
+
+    if user_data is None:
+        status_code = user_status if user_status >= 400 else 502
+        raise HTTPException(status_code=status_code, detail="User profile unavailable")
+
+    unavailable = []
+    if companies_data is None:
+        unavailable.append("companies")
+    if incidents_data is None:
+        unavailable.append("incidents")
+    incidents, next_cursor = page.paginate(incidents_data, "incidents")
+
+    view = {
+        **user_data,
+        "incidents": incidents,
+        "companies": (companies_data or {}).get("companies", []),
+        "unavailable": unavailable,
+        "next_cursor": next_cursor,
+    }
+    if not page.fields:
+        return serialization.model_response(UserView, view, trusted=USERS_VIEW_TRUSTED)
+    # Project after validation so the incident model still checks the full items
+    data = view if USERS_VIEW_TRUSTED else UserView.model_validate(view).model_dump(mode="json")
+    return serialization.json_response({**data, "incidents": page.project(data["incidents"])})
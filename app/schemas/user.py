@@ -1,8 +1,11 @@
 from uuid import UUID
-from pydantic import BaseModel, EmailStr, field_validator, Field
+from pydantic import BaseModel, EmailStr, field_validator, Field, ValidationInfo
 from datetime import date, datetime
+import os
 import re
-from typing import List
+from typing import Any, List, Optional
+
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "100"))
     
 class AbcallUserCreate(BaseModel):
     username: EmailStr
@@ -20,8 +23,10 @@ class CompanyCreate(AbcallUserCreate):
 
     @field_validator('birth_date')
     @classmethod
-    def validate_birth_date(cls, v: date) -> date:
-        if v > date.today():
+    def validate_birth_date(cls, v: date, info: ValidationInfo) -> date:
+        # Bulk validation passes one "today" for the whole batch
+        today = (info.context or {}).get("today") or date.today()
+        if v > today:
             raise ValueError('The birth date cannot be in the future.')
         return v
 
@@ -70,6 +75,11 @@ class IncidentResponse(BaseModel):
 
 class UserWithIncidents(UserResponse):
     incidents: List[IncidentResponse]
+
+class UserView(UserWithIncidents):
+    companies: List[CompanyResponseFiltered] = []
+    unavailable: List[str] = []
+    next_cursor: Optional[str] = None
     
 class UserCompanyRequest(BaseModel):
     user_id: UUID
@@ -78,4 +88,48 @@ class UserCompanyRequest(BaseModel):
 class UserCompaniesResponseFiltered(BaseModel):
     user_id: UUID
     companies: List[CompanyResponseFiltered]
-    
\ No newline at end of file
+
+class BatchIdsRequest(BaseModel):
+    ids: List[UUID] = Field(..., min_length=1, max_length=BATCH_MAX_IDS)
+
+class CompanyBatchItem(BaseModel):
+    id: UUID
+    status_code: int
+    data: Optional[CompanyResponse] = None
+    error: Optional[Any] = None
+
+class CompanyBatchResponse(BaseModel):
+    results: List[CompanyBatchItem]
+
+class CompanyBulkItem(BaseModel):
+    index: int
+    status_code: int
+    data: Optional[CompanyResponse] = None
+    error: Optional[Any] = None
+
+class CompanyBulkResponse(BaseModel):
+    results: List[CompanyBulkItem]
+
+class UserBatchItem(BaseModel):
+    id: UUID
+    status_code: int
+    data: Optional[UserResponse] = None
+    error: Optional[Any] = None
+
+class UserBatchResponse(BaseModel):
+    results: List[UserBatchItem]
+
+# Validated once at startup so the email and pattern validators are loaded before the first request
+WARMUP_SAMPLES = [
+    (CompanyCreate, {
+        "username": "warmup@example.com", "password": "warmup-password", "first_name": "Warm", "last_name": "Up",
+        "name": "Warmup", "birth_date": "2000-01-01", "phone_number": "+12 345 678 9012", "country": "Colombia",
+        "city": "Bogota",
+    }),
+    (UserView, {
+        "id": "12345678-1234-5678-1234-567812345678", "username": "warmup@example.com", "first_name": "Warm",
+        "last_name": "Up", "document_id": "1", "document_type": "CC", "birth_date": "2000-01-01",
+        "phone_number": "+12 345 678 9012", "importance": 1, "allow_call": True, "allow_sms": True,
+        "allow_email": True, "registration_date": "2024-01-01T00:00:00", "incidents": [],
+    }),
+]
@@ -0,0 +1,272 @@
+import logging
+import logging.config
+import math
+import os
+import random
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+
+import uvicorn
+from uvicorn.config import LOGGING_CONFIG
+from uvicorn.importer import import_from_string
+
+from .services import database, health, metrics, upstream
+
+logger = logging.getLogger("uvicorn.error")
+
+HANDLED_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _cgroup_cpu_limit(root: str = "/sys/fs/cgroup") -> Optional[float]:
+    # cgroup v2 writes "<quota> <period>" (quota "max" when unlimited); v1 uses two files
+    try:
+        with open(os.path.join(root, "cpu.max")) as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(root, "cpu", "cpu.cfs_quota_us")) as f:
+            quota = int(f.read())
+        with open(os.path.join(root, "cpu", "cpu.cfs_period_us")) as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus(cgroup_root: str = "/sys/fs/cgroup") -> int:
+    """CPUs this process may run on: its affinity mask, capped by a container CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available outside Linux
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit(cgroup_root)
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+@dataclass(frozen=True)
+class ServeSettings:
+    app: str = "app.main:app"
+    host: str = "0.0.0.0"
+    port: int = 8001
+    workers: int = 1
+    preload: bool = True
+    max_requests: int = 10000
+    max_requests_jitter: int = 1000
+    graceful_timeout: float = 30.0
+    drain_delay: float = 0.0
+    metrics_dir: Optional[str] = None
+    log_level: str = "info"
+
+
+def load_settings() -> ServeSettings:
+    return ServeSettings(
+        app=os.getenv("SERVE_APP", "app.main:app"),
+        host=os.getenv("SERVE_HOST", "0.0.0.0"),
+        port=int(os.getenv("SERVE_PORT", "8001")),
+        workers=int(os.getenv("WEB_CONCURRENCY") or available_cpus()),
+        preload=_env_bool("SERVE_PRELOAD", "true"),
+        max_requests=int(os.getenv("SERVE_MAX_REQUESTS", "10000")),
+        max_requests_jitter=int(os.getenv("SERVE_MAX_REQUESTS_JITTER", "1000")),
+        graceful_timeout=float(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30")),
+        drain_delay=float(os.getenv("SERVE_DRAIN_DELAY", "0")),
+        metrics_dir=os.getenv("METRICS_MULTIPROC_DIR") or None,
+        log_level=os.getenv("SERVE_LOG_LEVEL", "info"),
+    )
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class DrainingServer(uvicorn.Server):
+    """uvicorn server that keeps serving for ``drain_delay`` seconds after SIGTERM with readiness failing.
+
+    That gives load balancers time to stop routing here before the socket closes; uvicorn then
+    waits up to ``timeout_graceful_shutdown`` for in-flight requests, and their upstream calls,
+    before the lifespan closes the clients. A second signal exits without waiting.
+    """
+
+    def __init__(self, config: uvicorn.Config, drain_delay: float = 0.0):
+        super().__init__(config)
+        self.drain_delay = drain_delay
+        self._drain_timer: Optional[threading.Timer] = None
+
+    def handle_exit(self, sig, frame):
+        if self.drain_delay > 0 and self._drain_timer is None and not self.should_exit:
+            health.prober.draining = True
+            self._drain_timer = threading.Timer(self.drain_delay, super().handle_exit, (sig, frame))
+            self._drain_timer.daemon = True
+            self._drain_timer.start()
+            return
+        if self._drain_timer is not None:
+            self._drain_timer.cancel()
+        super().handle_exit(sig, frame)
+
+
+def run_worker(settings: ServeSettings, sock: socket.socket, app=None):
+    """Serve ``app`` on the shared ``sock`` until SIGTERM or until the request budget is spent."""
+    for sig in HANDLED_SIGNALS:
+        signal.signal(sig, signal.SIG_DFL)
+    # Forked workers share the parent's random state; reseed so retry jitter and recycling differ
+    random.seed()
+    upstream.after_fork()
+    database.after_fork()
+    if app is None:
+        app = import_from_string(settings.app)
+    max_requests = None
+    if settings.max_requests > 0:
+        max_requests = settings.max_requests + random.randint(0, max(0, settings.max_requests_jitter))
+    config = uvicorn.Config(
+        app,
+        lifespan="on",
+        log_level=settings.log_level,
+        limit_max_requests=max_requests,
+        timeout_graceful_shutdown=settings.graceful_timeout,
+    )
+    DrainingServer(config, settings.drain_delay).run(sockets=[sock])
+
+
+class Supervisor:
+    """Pre-forking process manager for ``app.main``.
+
+    The app is imported once before forking, so workers share its memory and skip the import.
+    Nothing opens a connection at import time; each worker creates its upstream clients and
+    database engine in its own lifespan. Workers that exit (recycled after their request budget,
+    or crashed) are replaced until the supervisor gets SIGTERM or SIGINT, which it forwards.
+    """
+
+    def __init__(self, settings: ServeSettings):
+        self.settings = settings
+        self.workers: Dict[int, float] = {}
+        self.stopping = False
+        self.app = None
+        self.sock: Optional[socket.socket] = None
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.settings, self.sock, self.app)
+            except BaseException:
+                logger.exception("Worker failed")
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        logger.info("Started worker %d", pid)
+
+    def signal_workers(self, sig: int):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def _handle_signal(self, sig, frame):
+        if self.stopping:
+            # Second signal: stop waiting for the drain
+            self.signal_workers(signal.SIGKILL)
+            return
+        logger.info("Received %s; draining %d workers", signal.Signals(sig).name, len(self.workers))
+        self.stopping = True
+        self.signal_workers(signal.SIGTERM)
+
+    def _reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            if self.settings.metrics_dir:
+                metrics.retire_worker(self.settings.metrics_dir, str(pid))
+            if self.stopping or started is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code == 0:
+                logger.info("Worker %d recycled", pid)
+            else:
+                logger.warning("Worker %d exited with %d", pid, code)
+                if time.monotonic() - started < 1:
+                    # Crashing on boot; do not spin
+                    time.sleep(1)
+            self.spawn()
+
+    def run(self) -> int:
+        settings = self.settings
+        self.sock = bind_socket(settings.host, settings.port)
+        if settings.preload:
+            self.app = import_from_string(settings.app)
+        for sig in HANDLED_SIGNALS:
+            signal.signal(sig, self._handle_signal)
+        logger.info("Serving %s on %s:%d with %d workers", settings.app, settings.host, settings.port,
+                    settings.workers)
+        for _ in range(settings.workers):
+            self.spawn()
+
+        deadline = None
+        while self.workers:
+            self._reap()
+            if self.stopping:
+                if deadline is None:
+                    deadline = time.monotonic() + settings.drain_delay + settings.graceful_timeout + 5
+                elif time.monotonic() > deadline:
+                    logger.warning("Workers did not drain in time; killing %s", sorted(self.workers))
+                    self.signal_workers(signal.SIGKILL)
+            time.sleep(0.1)
+        self.sock.close()
+        logger.info("All workers stopped")
+        return 0
+
+
+def main() -> int:
+    logging.config.dictConfig(LOGGING_CONFIG)
+    settings = load_settings()
+    created_metrics_dir = settings.metrics_dir is None
+    metrics_dir = settings.metrics_dir or tempfile.mkdtemp(prefix="user-management-metrics-")
+    # Snapshots from a previous run would be merged into this one's totals
+    for filename in os.listdir(metrics_dir):
+        if filename.endswith(".json"):
+            os.remove(os.path.join(metrics_dir, filename))
+    os.environ["METRICS_MULTIPROC_DIR"] = metrics_dir
+    settings = replace(settings, metrics_dir=metrics_dir)
+
+    if not hasattr(os, "fork"):
+        logger.warning("Pre-forking is not supported here; serving in a single process")
+        config = uvicorn.Config(settings.app, host=settings.host, port=settings.port, log_level=settings.log_level,
+                                timeout_graceful_shutdown=settings.graceful_timeout)
+        DrainingServer(config, settings.drain_delay).run()
+        return 0
+    try:
+        return Supervisor(settings).run()
+    finally:
+        if created_metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,300 @@
+import abc
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from starlette.responses import JSONResponse
+
+from . import auth, cache, upstream
+from .resp import RespClient
+
+logger = logging.getLogger(__name__)
+
+# Set while the middleware holds a concurrency slot for the current request
+_admitted: ContextVar[bool] = ContextVar("admission_admitted", default=False)
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class AdmissionSettings:
+    enabled: bool = False
+    rate: float = 50.0
+    burst: int = 100
+    store: str = "memory"
+    max_clients: int = 10000
+    trust_forwarded: bool = False
+    initial_limit: int = 50
+    min_limit: int = 5
+    max_limit: int = 500
+    latency_tolerance: float = 2.0
+    exempt_paths: Tuple[str, ...] = ("/user-management/health", "/user-management/metrics")
+    critical_upstreams: Tuple[str, ...] = (upstream.USER_SERVICE, upstream.INCIDENT_QUERY)
+
+
+def load_settings() -> AdmissionSettings:
+    exempt = os.getenv("ADMISSION_EXEMPT_PATHS", "/user-management/health,/user-management/metrics")
+    critical = os.getenv("ADMISSION_CRITICAL_UPSTREAMS", f"{upstream.USER_SERVICE},{upstream.INCIDENT_QUERY}")
+    return AdmissionSettings(
+        enabled=_env_bool("ADMISSION_ENABLED", "false"),
+        rate=float(os.getenv("RATE_LIMIT_RATE", "50")),
+        burst=int(os.getenv("RATE_LIMIT_BURST", "100")),
+        store=os.getenv("RATE_LIMIT_STORE", "memory").strip().lower(),
+        max_clients=int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000")),
+        trust_forwarded=_env_bool("RATE_LIMIT_TRUST_FORWARDED", "false"),
+        initial_limit=int(os.getenv("CONCURRENCY_LIMIT_INITIAL", "50")),
+        min_limit=int(os.getenv("CONCURRENCY_LIMIT_MIN", "5")),
+        max_limit=int(os.getenv("CONCURRENCY_LIMIT_MAX", "500")),
+        latency_tolerance=float(os.getenv("CONCURRENCY_LIMIT_TOLERANCE", "2")),
+        exempt_paths=tuple(path.strip() for path in exempt.split(",") if path.strip()),
+        critical_upstreams=tuple(name.strip() for name in critical.split(",") if name.strip()),
+    )
+
+
+class BucketStore(abc.ABC):
+    """Where the per-client token buckets live."""
+
+    @abc.abstractmethod
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take one token for ``key``; returns 0 when granted, else the seconds until one is available."""
+        raise NotImplementedError
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class MemoryBucketStore(BucketStore):
+    """Token buckets in this process, dropping the least recently seen clients past ``max_keys``."""
+
+    def __init__(self, max_keys: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        now = self._clock()
+        tokens, updated = self._buckets.pop(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def size(self) -> Optional[int]:
+        return len(self._buckets)
+
+
+class RespBucketStore(BucketStore):
+    """Budgets shared by every worker through a Redis-compatible server.
+
+    Each client gets ``burst`` requests per window of ``burst / rate`` seconds, counted with one
+    ``INCR``/``PEXPIRE`` round trip. The average rate matches the memory bucket, but a client can
+    fit up to twice ``burst`` around a window boundary.
+    """
+
+    def __init__(self, client: RespClient, namespace: str, clock: Callable[[], float] = time.time):
+        self.client = client
+        self.namespace = namespace
+        self._clock = clock
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        window = burst / rate
+        now = self._clock()
+        slot = int(now // window)
+        name = f"{self.namespace}:{key}:{slot}"
+        count, _ = await self.client.pipeline([("INCR", name), ("PEXPIRE", name, int(window * 1000) + 1000)])
+        if count <= burst:
+            return 0.0
+        return (slot + 1) * window - now
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that follows upstream latency.
+
+    A slow moving average of upstream latency is the baseline. Calls slower than ``tolerance``
+    times the baseline shrink the limit in proportion, down to half per step; otherwise it grows by
+    about its square root while it is in use. Upstream errors, timeouts and 429s cut it by ``backoff``.
+    """
+
+    def __init__(self, initial: int = 50, min_limit: int = 5, max_limit: int = 500, tolerance: float = 2.0,
+                 smoothing: float = 0.2, backoff: float = 0.9):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.backoff = backoff
+        self.in_flight = 0
+        self.baseline: Optional[float] = None
+
+    def acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.baseline or 0))
+
+    def observe(self, latency: float, failed: bool = False):
+        if failed:
+            self._set(self.limit * self.backoff)
+            return
+        if self.baseline is None:
+            self.baseline = latency
+        else:
+            self.baseline += (latency - self.baseline) * 0.01
+        gradient = max(0.5, min(1.0, self.tolerance * self.baseline / latency)) if latency > 0 else 1.0
+        if gradient == 1.0 and self.in_flight < self.limit / 2:
+            # Plenty of headroom already; growing now would only let a later spike through
+            return
+        target = self.limit * gradient + math.sqrt(self.limit)
+        self._set(self.limit * (1 - self.smoothing) + target * self.smoothing)
+
+    def _set(self, limit: float):
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), limit))
+
+
+@dataclass
+class AdmissionStats:
+    admitted: int = 0
+    rate_limited: int = 0
+    shed: int = 0
+    store_errors: int = 0
+
+
+def create_store(settings: AdmissionSettings) -> BucketStore:
+    if settings.store == "memory":
+        return MemoryBucketStore(settings.max_clients)
+    if settings.store == "redis":
+        prefix = os.getenv("CACHE_KEY_PREFIX", "user-management")
+        return RespBucketStore(cache.get_resp_client(), f"{prefix}:rate")
+    raise ValueError(f"Unknown RATE_LIMIT_STORE: {settings.store}")
+
+
+class AdmissionController:
+    """Per-client token buckets in front of one adaptive concurrency limit for the process."""
+
+    def __init__(self, settings: Optional[AdmissionSettings] = None, store: Optional[BucketStore] = None,
+                 limiter: Optional[AdaptiveLimiter] = None):
+        self.settings = settings or load_settings()
+        self.store = store if store is not None else create_store(self.settings)
+        self.limiter = limiter or AdaptiveLimiter(
+            self.settings.initial_limit, self.settings.min_limit, self.settings.max_limit,
+            self.settings.latency_tolerance,
+        )
+        self.stats = AdmissionStats()
+
+    def exempt(self, path: str) -> bool:
+        return any(path.startswith(prefix) for prefix in self.settings.exempt_paths)
+
+    def client_key(self, scope) -> str:
+        token = forwarded = None
+        for name, value in scope.get("headers", ()):
+            if name == b"token":
+                token = value.decode("latin-1")
+            elif name == b"x-forwarded-for":
+                forwarded = value.decode("latin-1")
+        user = auth.get_current_user(token) if token else None
+        if user is not None and user.get("sub"):
+            return f"sub:{user['sub']}"
+        if self.settings.trust_forwarded and forwarded:
+            return f"ip:{forwarded.split(',')[0].strip()}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    async def wait_for_token(self, key: str) -> float:
+        if self.settings.rate <= 0:
+            return 0.0
+        try:
+            return await self.store.take(key, self.settings.rate, self.settings.burst)
+        except Exception:
+            # A broken shared store must not take the gateway down with it
+            self.stats.store_errors += 1
+            logger.warning("Rate limit store failed; admitting the request", exc_info=True)
+            return 0.0
+
+    def observe_upstream(self, name: str, seconds: float, status: Union[int, str]):
+        # Only calls made for an admitted request to an upstream it depends on say anything about
+        # how much traffic to admit; health probes, sync and dispatch run outside any request
+        if not _admitted.get() or name not in self.settings.critical_upstreams:
+            return
+        failed = not isinstance(status, int) or status == 429 or status >= 500
+        self.limiter.observe(seconds, failed)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware answering 429 to clients over their rate and 503 when the concurrency limit is full.
+
+    Both answers carry ``Retry-After``. Health and metrics paths are never limited.
+    """
+
+    def __init__(self, app, admission: Optional[AdmissionController] = None):
+        self.app = app
+        self._controller = admission
+
+    @property
+    def controller(self) -> AdmissionController:
+        return self._controller or controller
+
+    async def __call__(self, scope, receive, send):
+        controller = self.controller
+        if scope["type"] != "http" or not controller.settings.enabled or controller.exempt(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        wait = await controller.wait_for_token(controller.client_key(scope))
+        if wait > 0:
+            controller.stats.rate_limited += 1
+            response = JSONResponse(
+                status_code=429, content={"detail": "Rate limit exceeded"},
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+            await response(scope, receive, send)
+            return
+        if not controller.limiter.acquire():
+            controller.stats.shed += 1
+            response = JSONResponse(
+                status_code=503, content={"detail": "Service overloaded"},
+                headers={"Retry-After": str(controller.limiter.retry_after())},
+            )
+            await response(scope, receive, send)
+            return
+
+        controller.stats.admitted += 1
+        admitted = _admitted.set(True)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _admitted.reset(admitted)
+            controller.limiter.release()
+
+
+controller = AdmissionController()
+upstream.add_observer(lambda name, seconds, status: controller.observe_upstream(name, seconds, status))
+
+
+def stats() -> Dict[str, dict]:
+    limiter = controller.limiter
+    return {"gateway": {
+        **asdict(controller.stats),
+        "limit": limiter.limit,
+        "in_flight": limiter.in_flight,
+        "baseline_latency_seconds": limiter.baseline,
+        "clients": controller.store.size(),
+    }}
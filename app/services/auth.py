@@ -0,0 +1,120 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+import jwt
+from fastapi import Header
+
+SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'secret_key')
+PREVIOUS_SECRET_KEYS = [key for key in os.environ.get('JWT_PREVIOUS_SECRET_KEYS', '').split(',') if key]
+ALGORITHM = "HS256"
+
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("JWT_CACHE_MAX_SIZE", "10000"))
+# Upper bound for tokens without an ``exp`` claim
+TOKEN_CACHE_MAX_TTL = float(os.getenv("JWT_CACHE_MAX_TTL", "300"))
+
+
+@dataclass
+class AuthStats:
+    verifications: int = 0
+    failures: int = 0
+    cache_hits: int = 0
+    cache_evictions: int = 0
+    verify_seconds: float = 0.0
+
+
+class TokenVerifier:
+    """Verifies JWTs once and caches the decoded payload until the token expires.
+
+    Entries are keyed by a SHA-256 digest of the token, so raw tokens are never
+    kept in memory. Tokens signed with a previous key keep verifying after a
+    rotation until they expire.
+    """
+
+    def __init__(self, secret_key: str, previous_keys: Optional[List[str]] = None, algorithm: str = ALGORITHM,
+                 max_size: int = TOKEN_CACHE_MAX_SIZE, max_ttl: float = TOKEN_CACHE_MAX_TTL, clock=time.time):
+        self.keys = [secret_key] + list(previous_keys or [])
+        self.algorithm = algorithm
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.stats = AuthStats()
+        self._clock = clock
+        self._verified: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+
+    def rotate(self, new_secret_key: str, keep_previous: int = 1):
+        self.keys = [new_secret_key] + self.keys[:keep_previous]
+        self._verified.clear()
+
+    def verify(self, token: str) -> Optional[dict]:
+        digest = hashlib.sha256(token.encode()).digest()
+        now = self._clock()
+        entry = self._verified.get(digest)
+        if entry is not None:
+            expires_at, payload = entry
+            if expires_at > now:
+                self._verified.move_to_end(digest)
+                self.stats.cache_hits += 1
+                return payload
+            del self._verified[digest]
+
+        payload = self._decode(token)
+        if payload is None:
+            return None
+        expires_at = now + self.max_ttl
+        if isinstance(payload.get("exp"), (int, float)):
+            expires_at = min(expires_at, payload["exp"])
+        if self.max_size > 0 and expires_at > now:
+            self._verified[digest] = (expires_at, payload)
+            if len(self._verified) > self.max_size:
+                self._verified.popitem(last=False)
+                self.stats.cache_evictions += 1
+        return payload
+
+    def _decode(self, token: str) -> Optional[dict]:
+        started = time.perf_counter()
+        self.stats.verifications += 1
+        try:
+            for key in self.keys:
+                try:
+                    return jwt.decode(token, key, algorithms=[self.algorithm])
+                except jwt.InvalidSignatureError:
+                    continue
+            self.stats.failures += 1
+            return None
+        except jwt.PyJWTError:
+            self.stats.failures += 1
+            return None
+        finally:
+            self.stats.verify_seconds += time.perf_counter() - started
+
+    def clear(self):
+        self._verified.clear()
+
+
+verifier = TokenVerifier(SECRET_KEY, PREVIOUS_SECRET_KEYS)
+
+
+def get_current_user(token: str = Header(None)):
+    if token is None:
+        return None
+    payload = verifier.verify(token)
+    return dict(payload) if payload is not None else None
+
+
+def token_headers(token: Optional[str]) -> Dict[str, str]:
+    """Headers forwarding the caller's token to an upstream service."""
+    return {"token": token} if token else {}
+
+
+def token_scope(token: Optional[str]) -> str:
+    """Short digest of the caller's token, for keying data whose visibility depends on who asked."""
+    if not token:
+        return "anonymous"
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def stats() -> Dict[str, float]:
+    return asdict(verifier.stats)
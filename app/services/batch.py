@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from ..errors.errors import UpstreamError
+from .cache import ResponseCache
+from .coalescer import BulkUnsupported
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "10"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "50"))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "4"))
+
+Result = Tuple[Any, int]
+
+
+async def fetch_many(
+    ids: Sequence[Hashable],
+    response_cache: ResponseCache,
+    fetch: Callable[[Hashable], Awaitable[Result]],
+    concurrency: int = BATCH_CONCURRENCY,
+    scope: Optional[str] = None,
+) -> List[Tuple[Hashable, Result]]:
+    """Resolve ``ids`` to ``(response_data, status_code)`` results, one per requested position.
+
+    Duplicate ids are resolved once and repeated in the result, cached entries of the caller's ``scope`` are read
+    in a single batch and the remaining ids are fetched with at most ``concurrency``
+    calls in flight. A failing id yields an error result instead of failing the whole batch.
+    """
+    unique = list(dict.fromkeys(ids))
+    stored_keys = {key: response_cache.scoped_key(key, scope) for key in unique}
+    cached = await response_cache.get_many(stored_keys.values())
+    found = {key: cached[stored] for key, stored in stored_keys.items() if stored in cached}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def load(key):
+        async with semaphore:
+            try:
+                return await fetch(key)
+            except UpstreamError as exc:
+                logger.warning("Batch fetch of %s failed: %s", key, exc)
+                return {"detail": exc.description}, exc.code
+            except Exception:
+                # A missing bulk item, a non-JSON body or an invalid payload only fails its own id
+                logger.exception("Batch fetch of %s failed", key)
+                return {"detail": UpstreamError.description}, UpstreamError.code
+
+    missing = [key for key in unique if key not in found]
+    for key, result in zip(missing, await asyncio.gather(*(load(key) for key in missing))):
+        found[key] = result
+    return [(key, found[key]) for key in ids]
+
+
+def batch_items(results: List[Tuple[Hashable, Result]]) -> List[Dict[str, Any]]:
+    items = []
+    for key, (response_data, status_code) in results:
+        item = {"id": key, "status_code": status_code}
+        if status_code == 200:
+            item["data"] = response_data
+        else:
+            item["error"] = response_data
+        items.append(item)
+    return items
+
+
+def validate_rows(adapter: TypeAdapter, rows: List[Any],
+                  context: Optional[Dict[str, Any]] = None) -> Tuple[List[Tuple[int, Any]], Dict[int, List[dict]]]:
+    """Validate ``rows`` with a list ``adapter`` and split them into ``(index, model)`` pairs and per-row errors.
+
+    The whole list is validated in one call; only when some rows fail are the others validated
+    again. Errors use the ``location``/``message``/``type`` shape of the validation error handler.
+    """
+    try:
+        return list(enumerate(adapter.validate_python(rows, context=context))), {}
+    except ValidationError as exc:
+        errors: Dict[int, List[dict]] = {}
+        for error in exc.errors(include_url=False):
+            index = error["loc"][0]
+            errors.setdefault(index, []).append(
+                {"location": ["body", *error["loc"]], "message": error["msg"], "type": error["type"]}
+            )
+    valid = [index for index in range(len(rows)) if index not in errors]
+    models = adapter.validate_python([rows[index] for index in valid], context=context) if valid else []
+    return list(zip(valid, models)), errors
+
+
+class BulkForwarder:
+    """Send items upstream in chunks of ``chunk_size`` with at most ``concurrency`` chunks in flight.
+
+    Each chunk is sent with one ``bulk_fn(chunk, *args)`` call. Once ``bulk_fn`` raises
+    ``BulkUnsupported`` every item is sent with ``single_fn(item, *args)`` instead. Results keep
+    the order of the items.
+    """
+
+    def __init__(self, name: str, bulk_fn: Callable[..., Awaitable[List[Result]]],
+                 single_fn: Callable[..., Awaitable[Result]], chunk_size: int = BULK_CHUNK_SIZE,
+                 concurrency: int = BULK_CONCURRENCY):
+        self.name = name
+        self.bulk_fn = bulk_fn
+        self.single_fn = single_fn
+        self.chunk_size = max(1, chunk_size)
+        self.concurrency = max(1, concurrency)
+        self.bulk_supported = True
+
+    async def forward(self, items: Sequence[Any], *args) -> List[Result]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        chunks = [list(items[start:start + self.chunk_size]) for start in range(0, len(items), self.chunk_size)]
+
+        async def send(chunk):
+            async with semaphore:
+                try:
+                    return await self._send_chunk(chunk, args)
+                except UpstreamError as exc:
+                    logger.warning("Bulk %s chunk of %d failed: %s", self.name, len(chunk), exc)
+                    return [({"detail": exc.description}, exc.code)] * len(chunk)
+
+        results = await asyncio.gather(*(send(chunk) for chunk in chunks))
+        return [result for chunk_results in results for result in chunk_results]
+
+    async def _send_chunk(self, chunk: List[Any], args: tuple) -> List[Result]:
+        if self.bulk_supported:
+            try:
+                return await self.bulk_fn(chunk, *args)
+            except BulkUnsupported:
+                logger.info("Upstream has no bulk route for %s; falling back to individual calls", self.name)
+                self.bulk_supported = False
+        return list(await asyncio.gather(*(self._send_one(item, args) for item in chunk)))
+
+    async def _send_one(self, item: Any, args: tuple) -> Result:
+        try:
+            return await self.single_fn(item, *args)
+        except UpstreamError as exc:
+            logger.warning("Bulk %s item failed: %s", self.name, exc)
+            return {"detail": exc.description}, exc.code
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_HANDLER = "<unknown>"
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a synchronous callable in the worker threadpool instead of on the event loop."""
+    return await run_in_threadpool(func, *args, **kwargs)
+
+
+class BlockingEvent(NamedTuple):
+    handler: str
+    duration: float
+    stack: List[str]
+
+
+class LoopBlockingDetector:
+    """Watchdog thread that reports when the event loop stops servicing callbacks.
+
+    Every ``interval`` seconds a no-op callback is scheduled on the loop. If it has
+    not run after ``threshold`` seconds the loop thread's stack is sampled to find
+    the route handler responsible, and the event is reported once the loop
+    recovers with the total time it was blocked.
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: Optional[float] = None, max_events: int = 100):
+        self.threshold = threshold
+        self.interval = interval if interval is not None else threshold / 2
+        self.events: Deque[BlockingEvent] = deque(maxlen=max_events)
+        self._handlers: Dict[object, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def register_app(self, app):
+        for route in app.routes:
+            endpoint = getattr(route, "endpoint", None)
+            code = getattr(endpoint, "__code__", None)
+            if code is None:
+                continue
+            methods = ",".join(sorted(getattr(route, "methods", None) or []))
+            target = f"{methods} {route.path}" if methods else route.path
+            self._handlers[code] = f"{route.name} ({target})"
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self._loop = loop or asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-blocking-detector", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _watch(self):
+        while not self._stopped.is_set():
+            serviced = threading.Event()
+            posted = time.perf_counter()
+            try:
+                self._loop.call_soon_threadsafe(serviced.set)
+            except RuntimeError:
+                return
+            if serviced.wait(self.threshold):
+                self._stopped.wait(self.interval)
+                continue
+            handler, stack = self._sample()
+            while not serviced.wait(self.threshold):
+                if self._stopped.is_set() or self._loop.is_closed():
+                    return
+            self._report(BlockingEvent(handler, time.perf_counter() - posted, stack))
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return UNKNOWN_HANDLER, []
+        stack = traceback.format_stack(frame, limit=8)
+        while frame is not None:
+            handler = self._handlers.get(frame.f_code)
+            if handler is not None:
+                return handler, stack
+            frame = frame.f_back
+        return UNKNOWN_HANDLER, stack
+
+    def _report(self, event: BlockingEvent):
+        self.events.append(event)
+        logger.warning(
+            "Event loop blocked for %.1f ms in %s\n%s",
+            event.duration * 1000, event.handler, "".join(event.stack),
+        )
+
+
+def detector_from_env(app) -> Optional[LoopBlockingDetector]:
+    if os.getenv("BLOCKING_DETECTOR", "false").strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    threshold_ms = float(os.getenv("BLOCKING_DETECTOR_THRESHOLD_MS", "100"))
+    detector = LoopBlockingDetector(threshold=threshold_ms / 1000)
+    detector.register_app(app)
+    return detector
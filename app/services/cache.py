@@ -0,0 +1,383 @@
+import abc
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+from .resp import RespClient, RespError
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+_caches: Dict[str, "ResponseCache"] = {}
+_resp_client: Optional[RespClient] = None
+
+BACKEND_ERRORS = (OSError, asyncio.TimeoutError, RespError, ValueError)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    coalesced: int = 0
+    errors: int = 0
+
+
+class CacheBackend(abc.ABC):
+    """Storage behind a ``ResponseCache``. All operations are async so networked stores fit."""
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Any:
+        """Return the stored value or ``_MISSING``."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the stored values for the keys that are present."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: Any, ttl: float):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def set_many(self, items: Dict[str, Any], ttl: float):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def clear(self):
+        raise NotImplementedError
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU with per-entry expiry. Values are stored as-is, without serialization."""
+
+    def __init__(self, max_size: int = 1024, clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.max_size = max_size
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def _get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.stats.expirations += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key: str, value: Any, ttl: float):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def get(self, key: str) -> Any:
+        return self._get(key)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        found = {}
+        for key in keys:
+            value = self._get(key)
+            if value is not _MISSING:
+                found[key] = value
+        return found
+
+    async def set(self, key: str, value: Any, ttl: float):
+        self._set(key, value, ttl)
+
+    async def set_many(self, items: Dict[str, Any], ttl: float):
+        for key, value in items.items():
+            self._set(key, value, ttl)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def clear(self):
+        self._entries.clear()
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+class JsonCodec:
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+
+    def decode(self, raw: bytes) -> Any:
+        return json.loads(raw)
+
+
+class ResultCodec:
+    """Compact codec for ``(response_data, status_code)`` results of a Pydantic response model.
+
+    The payload is validated into ``model`` once when stored, so only the model's
+    fields are kept, and decoded back to plain JSON data on read.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        self._adapter = TypeAdapter(Tuple[model, int])
+
+    def encode(self, value: Tuple[Any, int]) -> bytes:
+        return self._adapter.dump_json(self._adapter.validate_python(value))
+
+    def decode(self, raw: bytes) -> Tuple[Any, int]:
+        data, status_code = json.loads(raw)
+        return data, status_code
+
+
+class RespBackend(CacheBackend):
+    """Networked backend for any server speaking the Redis protocol (RESP)."""
+
+    def __init__(self, client: RespClient, namespace: str, codec=None):
+        super().__init__()
+        self.client = client
+        self.namespace = namespace
+        self.codec = codec or JsonCodec()
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Any:
+        raw = await self.client.execute("GET", self._key(key))
+        return _MISSING if raw is None else self.codec.decode(raw)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = await self.client.execute("MGET", *[self._key(key) for key in keys])
+        return {key: self.codec.decode(raw) for key, raw in zip(keys, values) if raw is not None}
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self.client.execute("SET", self._key(key), self.codec.encode(value), "PX", int(ttl * 1000))
+
+    async def set_many(self, items: Dict[str, Any], ttl: float):
+        if not items:
+            return
+        ttl_ms = int(ttl * 1000)
+        await self.client.pipeline([
+            ("SET", self._key(key), self.codec.encode(value), "PX", ttl_ms) for key, value in items.items()
+        ])
+
+    async def delete(self, key: str):
+        await self.client.execute("DEL", self._key(key))
+
+    async def clear(self):
+        cursor = b"0"
+        while True:
+            cursor, keys = await self.client.execute("SCAN", cursor, "MATCH", f"{self.namespace}:*", "COUNT", 500)
+            if keys:
+                await self.client.execute("DEL", *keys)
+            if cursor in (b"0", "0", 0):
+                return
+
+
+class ResponseCache:
+    """Cache with a TTL per entry and single-flight loading on top of a ``CacheBackend``.
+
+    Concurrent ``get_or_load`` calls for the same missing key and ``scope`` share
+    one in-flight loader, so a burst of misses causes a single upstream call.
+    Callers pass the digest of their token as ``scope``; entries are stored under
+    ``scoped_key(key, scope)``, so a result loaded with one caller's credentials is
+    never served to another. Backend failures are counted and treated as misses.
+    """
+
+    def __init__(self, name: str, backend: Optional[CacheBackend] = None, ttl: float = 60, max_size: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.backend = backend if backend is not None else MemoryBackend(max_size)
+        self._inflight: Dict[Tuple[Hashable, Optional[str]], asyncio.Future] = {}
+        _caches[name] = self
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.backend.stats
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def __len__(self):
+        return self.backend.size() or 0
+
+    @staticmethod
+    def scoped_key(key: Hashable, scope: Optional[str]) -> Hashable:
+        return key if scope is None else f"{key}@{scope}"
+
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        try:
+            value = await self.backend.get(str(key))
+        except BACKEND_ERRORS:
+            self._backend_failed("get")
+            value = _MISSING
+        if value is _MISSING:
+            self.stats.misses += 1
+            return default
+        self.stats.hits += 1
+        return value
+
+    async def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        keys = list(keys)
+        if not self.enabled:
+            return {}
+        try:
+            found = await self.backend.get_many([str(key) for key in keys])
+        except BACKEND_ERRORS:
+            self._backend_failed("get_many")
+            found = {}
+        result = {key: found[str(key)] for key in keys if str(key) in found}
+        self.stats.hits += len(result)
+        self.stats.misses += len(keys) - len(result)
+        return result
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if not self.enabled:
+            return
+        try:
+            await self.backend.set(str(key), value, self.ttl if ttl is None else ttl)
+        except BACKEND_ERRORS:
+            self._backend_failed("set")
+
+    async def set_many(self, items: Dict[Hashable, Any], ttl: Optional[float] = None):
+        if not self.enabled:
+            return
+        try:
+            await self.backend.set_many({str(k): v for k, v in items.items()}, self.ttl if ttl is None else ttl)
+        except BACKEND_ERRORS:
+            self._backend_failed("set_many")
+
+    async def invalidate(self, key: Hashable):
+        try:
+            await self.backend.delete(str(key))
+        except BACKEND_ERRORS:
+            self._backend_failed("delete")
+
+    async def clear(self):
+        self._inflight.clear()
+        await self.backend.clear()
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]] = None,
+        scope: Optional[str] = None,
+    ) -> Any:
+        stored_key = self.scoped_key(key, scope)
+        value = await self.get(stored_key, _MISSING)
+        if value is not _MISSING:
+            return value
+        flight = (key, scope)
+        task = self._inflight.get(flight)
+        if task is None:
+            task = asyncio.ensure_future(self._load(stored_key, loader, cacheable))
+            self._inflight[flight] = task
+            task.add_done_callback(lambda done: self._loaded(flight, done))
+        else:
+            self.stats.coalesced += 1
+        # Shield the shared load so one cancelled caller does not cancel it for the others
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader, cacheable) -> Any:
+        value = await loader()
+        if cacheable is None or cacheable(value):
+            await self.set(key, value)
+        return value
+
+    def _loaded(self, flight: Tuple[Hashable, Optional[str]], task: asyncio.Future):
+        if self._inflight.get(flight) is task:
+            del self._inflight[flight]
+        if not task.cancelled():
+            # Mark the exception as retrieved even when every waiter was cancelled
+            task.exception()
+
+    def _backend_failed(self, operation: str):
+        self.stats.errors += 1
+        logger.warning("Cache %s: backend %s failed", self.name, operation, exc_info=True)
+
+
+def is_success(result: Tuple[Any, int]) -> bool:
+    """Only cache ``(response_data, status_code)`` results from successful upstream reads."""
+    _, status_code = result
+    return status_code == 200
+
+
+def get_resp_client() -> RespClient:
+    global _resp_client
+    if _resp_client is None:
+        _resp_client = RespClient.from_url(
+            os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"),
+            pool_size=int(os.getenv("CACHE_REDIS_POOL_SIZE", "10")),
+            timeout=float(os.getenv("CACHE_REDIS_TIMEOUT", "0.25")),
+        )
+    return _resp_client
+
+
+def create_backend(name: str, max_size: int, model: Optional[Type[BaseModel]] = None) -> CacheBackend:
+    kind = os.getenv("CACHE_BACKEND", "memory").strip().lower()
+    if kind == "memory":
+        return MemoryBackend(max_size)
+    if kind == "redis":
+        prefix = os.getenv("CACHE_KEY_PREFIX", "user-management")
+        codec = ResultCodec(model) if model is not None else JsonCodec()
+        return RespBackend(get_resp_client(), f"{prefix}:{name}", codec)
+    raise ValueError(f"Unknown CACHE_BACKEND: {kind}")
+
+
+def from_env(name: str, default_ttl: float, default_max_size: int = 1024, model: Optional[Type[BaseModel]] = None) -> ResponseCache:
+    prefix = f"{name.upper()}_CACHE"
+    max_size = int(os.getenv(f"{prefix}_MAX_SIZE", str(default_max_size)))
+    return ResponseCache(
+        name,
+        backend=create_backend(name, max_size, model),
+        ttl=float(os.getenv(f"{prefix}_TTL", str(default_ttl))),
+    )
+
+
+def get_cache(name: str) -> Optional[ResponseCache]:
+    return _caches.get(name)
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {name: {**asdict(c.stats), "size": c.backend.size()} for name, c in _caches.items()}
+
+
+async def clear_all():
+    for c in _caches.values():
+        await c.clear()
+
+
+async def shutdown():
+    global _resp_client
+    if _resp_client is not None:
+        await _resp_client.close()
+        _resp_client = None
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_loaders: Dict[str, "BatchLoader"] = {}
+_MISSING_RESULT = object()
+
+
+class BulkUnsupported(Exception):
+    """Raised by a bulk function when the upstream has no bulk route."""
+
+
+@dataclass
+class CoalescerStats:
+    batches: int = 0
+    keys: int = 0
+    max_batch_size: int = 0
+    window_seconds: float = 0.0
+    fallback_batches: int = 0
+    batch_sizes: Dict[int, int] = field(default_factory=dict)
+
+
+class BatchLoader:
+    """Dataloader-style coalescer for upstream lookups.
+
+    Keys requested within ``window`` seconds (or until ``max_batch_size`` keys
+    are pending) are resolved by one call to ``batch_fn``, which returns a
+    mapping of key to result. If ``batch_fn`` raises ``BulkUnsupported`` the
+    loader switches to resolving each key with ``single_fn``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+        single_fn: Callable[[Hashable], Awaitable[Any]],
+        window: float = 0.002,
+        max_batch_size: int = 50,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.single_fn = single_fn
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.enabled = enabled
+        self.bulk_supported = True
+        self.stats = CoalescerStats()
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._opened_at = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The loop only keeps weak references to tasks; a batch must not be collected mid-flight
+        self._tasks: Set[asyncio.Task] = set()
+        _loaders[name] = self
+
+    async def load(self, key: Hashable) -> Any:
+        if not self.enabled:
+            return await self.single_fn(key)
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._pending[key] = loop.create_future()
+            if len(self._pending) == 1:
+                self._opened_at = time.perf_counter()
+                self._timer = loop.call_later(self.window, self._dispatch)
+            if len(self._pending) >= self.max_batch_size:
+                self._dispatch()
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        size = len(pending)
+        self.stats.batches += 1
+        self.stats.keys += size
+        self.stats.max_batch_size = max(self.stats.max_batch_size, size)
+        self.stats.batch_sizes[size] = self.stats.batch_sizes.get(size, 0) + 1
+        self.stats.window_seconds += time.perf_counter() - self._opened_at
+        task = asyncio.get_running_loop().create_task(self._resolve(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """Cancel the open window and every batch in flight; their waiters get ``CancelledError``."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.cancel()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _resolve(self, pending: Dict[Hashable, asyncio.Future]):
+        keys = list(pending)
+        try:
+            results = await self._run(keys)
+        except asyncio.CancelledError:
+            for future in pending.values():
+                future.cancel()
+            raise
+        except Exception as exc:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(exc)
+                    # Waiters that were cancelled never retrieve it
+                    future.exception()
+            return
+        for key, future in pending.items():
+            if future.done():
+                continue
+            result = results.get(key, _MISSING_RESULT)
+            if result is _MISSING_RESULT:
+                result = LookupError(f"{self.name} batch returned no result for {key!r}")
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+                future.exception()
+            else:
+                future.set_result(result)
+
+    async def _run(self, keys: List[Hashable]) -> Dict[Hashable, Any]:
+        if self.bulk_supported and len(keys) > 1:
+            try:
+                return await self.batch_fn(keys)
+            except BulkUnsupported:
+                logger.info("Upstream has no bulk route for %s; falling back to individual calls", self.name)
+                self.bulk_supported = False
+        if len(keys) > 1:
+            self.stats.fallback_batches += 1
+        results = await asyncio.gather(*(self.single_fn(key) for key in keys), return_exceptions=True)
+        return dict(zip(keys, results))
+
+
+async def resolve_per_token(keys: List[Tuple[str, Any]], bulk_fn) -> Dict[Tuple[str, Any], Any]:
+    """Resolve ``(id, token)`` keys with one ``bulk_fn(ids, token)`` call per distinct caller token.
+
+    The calls run concurrently. A call that fails fails only its own keys, unless it raises
+    ``BulkUnsupported``, which is passed on so the loader falls back to single lookups.
+    """
+    by_token: Dict[Any, List[str]] = {}
+    for key_id, token in keys:
+        by_token.setdefault(token, []).append(key_id)
+    outcomes = await asyncio.gather(*(bulk_fn(ids, token) for token, ids in by_token.items()), return_exceptions=True)
+    results = {}
+    for (token, ids), found in zip(by_token.items(), outcomes):
+        if isinstance(found, BulkUnsupported):
+            raise found
+        if isinstance(found, BaseException):
+            results.update({(key_id, token): found for key_id in ids})
+        else:
+            results.update({(key_id, token): result for key_id, result in found.items()})
+    return results
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def from_env(name: str, batch_fn, single_fn) -> BatchLoader:
+    prefix = f"{name.upper()}_COALESCE"
+    return BatchLoader(
+        name,
+        batch_fn,
+        single_fn,
+        window=float(os.getenv(f"{prefix}_WINDOW_MS", os.getenv("COALESCE_WINDOW_MS", "2"))) / 1000,
+        max_batch_size=int(os.getenv(f"{prefix}_MAX_BATCH", os.getenv("COALESCE_MAX_BATCH", "50"))),
+        enabled=_env_bool(f"{prefix}_ENABLED", os.getenv("COALESCE_ENABLED", "false")),
+    )
+
+
+def get_loader(name: str) -> Optional[BatchLoader]:
+    return _loaders.get(name)
+
+
+async def shutdown():
+    for loader in _loaders.values():
+        await loader.close()
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        name: {**asdict(loader.stats), "enabled": loader.enabled, "bulk_supported": loader.bulk_supported}
+        for name, loader in _loaders.items()
+    }
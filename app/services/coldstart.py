@@ -0,0 +1,184 @@
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from importlib.machinery import ExtensionFileLoader, SourceFileLoader, SourcelessFileLoader
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Only the standard library above: this module is imported before everything it measures
+
+logger = logging.getLogger(__name__)
+
+PROFILE = os.getenv("STARTUP_PROFILE", "false").strip().lower() in ("1", "true", "yes", "on")
+PREWARM = os.getenv("STARTUP_PREWARM", "true").strip().lower() in ("1", "true", "yes", "on")
+REPORT_TOP = int(os.getenv("STARTUP_PROFILE_TOP", "15"))
+
+
+class ImportTimer:
+    """Meta path hook recording how long each module takes to execute on import.
+
+    Self time excludes the modules imported while it ran, so the per-module times add up to the
+    total. Only file-based modules are timed; their loaders are swapped for timed subclasses.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.timings: Dict[str, float] = {}
+        self._clock = clock
+        # One stack per thread, so imports running in worker threads keep their own nesting
+        self._local = threading.local()
+        self._loaders: Dict[type, type] = {}
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            loader_class = self._timed_loader(type(spec.loader))
+            if loader_class is not None:
+                spec.loader = loader_class(spec.loader.name, spec.loader.path)
+                spec.loader.timer = self
+            return spec
+        return None
+
+    def _timed_loader(self, loader_class: type) -> Optional[type]:
+        if loader_class not in (SourceFileLoader, SourcelessFileLoader, ExtensionFileLoader):
+            return None
+        timed = self._loaders.get(loader_class)
+        if timed is None:
+            def exec_module(loader, module):
+                with loader.timer.measure(module.__name__):
+                    loader_class.exec_module(loader, module)
+
+            timed = self._loaders[loader_class] = type(
+                f"Timed{loader_class.__name__}", (loader_class,), {"exec_module": exec_module}
+            )
+        return timed
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [self._clock(), 0.0]
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = self._clock() - frame[0]
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed - frame[1]
+            if stack:
+                stack[-1][1] += elapsed
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+
+def group_timings(timings: Dict[str, float], own_package: str = "app") -> List[Tuple[str, float]]:
+    """Per-module times for ``own_package``, per top-level package for everything else, slowest first."""
+    grouped: Dict[str, float] = {}
+    for name, seconds in timings.items():
+        key = name if name.split(".")[0] == own_package else name.split(".")[0]
+        grouped[key] = grouped.get(key, 0.0) + seconds
+    return sorted(grouped.items(), key=lambda item: item[1], reverse=True)
+
+
+class StartupProfile:
+    """Wall time of each startup phase, plus module import times when an ``ImportTimer`` is attached."""
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.started = clock()
+        self.phases: Dict[str, float] = {}
+        self.timer: Optional[ImportTimer] = None
+        self._clock = clock
+        self._mark = self.started
+
+    def attach(self, timer: ImportTimer):
+        self.timer = timer
+        timer.install()
+
+    def mark(self, phase: str):
+        """Record the time since the previous mark as ``phase``."""
+        now = self._clock()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._mark
+        self._mark = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + self._clock() - started
+            self._mark = self._clock()
+
+    def report(self, top: int = REPORT_TOP) -> Dict[str, Any]:
+        report: Dict[str, Any] = {
+            "total_seconds": round(self._mark - self.started, 4),
+            "phases": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+        }
+        if self.timer is not None:
+            report["modules"] = {name: round(seconds, 4) for name, seconds in group_timings(self.timer.timings)[:top]}
+        return report
+
+    def log(self, top: int = REPORT_TOP):
+        report = self.report(top)
+        logger.info("Startup took %.3fs", report["total_seconds"])
+        for name, seconds in report["phases"].items():
+            logger.info("  phase %-28s %8.1f ms", name, seconds * 1000)
+        for name, seconds in report.get("modules", {}).items():
+            logger.info("  import %-27s %8.1f ms", name, seconds * 1000)
+
+
+profile = StartupProfile()
+if PROFILE:
+    profile.attach(ImportTimer())
+
+
+def finish_imports():
+    """Close the import phase; later imports are first-use imports and no longer timed."""
+    profile.mark("imports")
+    if profile.timer is not None:
+        profile.timer.uninstall()
+
+
+def prewarm(app, samples: List[Tuple[Any, dict]]) -> Dict[str, float]:
+    """Build what Pydantic and FastAPI otherwise build on the first request; returns seconds per step.
+
+    Validating one sample per model loads the email and pattern validators, and building the
+    OpenAPI schema caches it for ``/docs``.
+    """
+    timings = {}
+    started = time.perf_counter()
+    for model, sample in samples:
+        try:
+            model.model_validate(sample)
+        except ValueError:
+            logger.warning("Warm-up sample for %s is invalid", model.__name__, exc_info=True)
+    timings["prewarm.validators"] = time.perf_counter() - started
+    started = time.perf_counter()
+    app.openapi()
+    timings["prewarm.openapi"] = time.perf_counter() - started
+    return timings
+
+
+async def prewarm_in_background(app, samples: List[Tuple[Any, dict]]):
+    """Run ``prewarm`` in the worker threadpool, so the first requests are served while it runs."""
+    from . import blocking
+
+    try:
+        timings = await blocking.run_blocking(prewarm, app, samples)
+    except Exception:
+        logger.exception("Startup warm-up failed")
+        return
+    profile.phases.update(timings)
+    if PROFILE:
+        for name, seconds in timings.items():
+            logger.info("  phase %-28s %8.1f ms", name, seconds * 1000)
@@ -0,0 +1,296 @@
+import os
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class CompressionSettings:
+    enabled: bool = True
+    min_size: int = 1024
+    gzip_level: int = 4
+    brotli_quality: int = 4
+    zstd_level: int = 3
+    cache_size: int = 256
+
+
+def load_settings() -> CompressionSettings:
+    # Levels default to the fast end: most of the size win of JSON comes at low levels
+    return CompressionSettings(
+        enabled=_env_bool("COMPRESSION_ENABLED", "true"),
+        min_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+        gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "4")),
+        brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")),
+        zstd_level=int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3")),
+        cache_size=int(os.getenv("COMPRESSION_CACHE_SIZE", "256")),
+    )
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        # Sync flush so each streamed chunk reaches the client without waiting for the next one
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class _ZstdStream:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class Encoder:
+    def __init__(self, name: str, stream_factory, level: int):
+        self.name = name
+        self._stream_factory = stream_factory
+        self.level = level
+
+    def stream(self):
+        return self._stream_factory(self.level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.stream().finish(data)
+
+
+def available_encoders(settings: CompressionSettings) -> Dict[str, Encoder]:
+    """Encoders usable in this process, in server preference order."""
+    encoders: Dict[str, Encoder] = {}
+    if zstandard is not None:
+        encoders["zstd"] = Encoder("zstd", _ZstdStream, settings.zstd_level)
+    if brotli is not None:
+        encoders["br"] = Encoder("br", _BrotliStream, settings.brotli_quality)
+    encoders["gzip"] = Encoder("gzip", _GzipStream, settings.gzip_level)
+    return encoders
+
+
+def negotiate(accept_encoding: Optional[str], available: Sequence[str]) -> Optional[str]:
+    """Pick the encoding of ``available`` with the highest q-value in ``Accept-Encoding``.
+
+    Ties go to the earlier entry of ``available``; ``q=0`` refuses an encoding.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        weights[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for name in available:
+        quality = weights.get(name, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+class PrecompressedCache:
+    """Compressed bodies keyed by the response ETag, so hot cached responses are compressed once."""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, etag: str, encoding: str) -> Optional[bytes]:
+        body = self._entries.get((etag, encoding))
+        if body is not None:
+            self._entries.move_to_end((etag, encoding))
+        return body
+
+    def put(self, etag: str, encoding: str, body: bytes):
+        if self.max_size <= 0:
+            return
+        self._entries[(etag, encoding)] = body
+        self._entries.move_to_end((etag, encoding))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def _compressible(status: int, headers: MutableHeaders) -> bool:
+    if status < 200 or status in (204, 304) or "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _mark_encoded(headers: MutableHeaders, encoding: str):
+    headers["Content-Encoding"] = encoding
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+    # The encoded body differs byte for byte, so a strong validator becomes weak
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+class _CompressingSend:
+    def __init__(self, send, encoder: Encoder, min_size: int, cache: PrecompressedCache):
+        self.send = send
+        self.encoder = encoder
+        self.min_size = min_size
+        self.cache = cache
+        self.start = None
+        self.headers: Optional[MutableHeaders] = None
+        self.passthrough = False
+        self.stream = None
+        self.raw_size = 0
+        self.encoded_size = 0
+        self.cpu_seconds = 0.0
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.headers = MutableHeaders(scope=message)
+            if not _compressible(message["status"], self.headers):
+                self.passthrough = True
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.stream is None:
+            if not more_body:
+                await self._send_whole(body)
+                return
+            # Streamed bodies have no known size, so they are always compressed chunk by chunk
+            self.stream = self.encoder.stream()
+            del self.headers["content-length"]
+            _mark_encoded(self.headers, self.encoder.name)
+            await self.send(self.start)
+
+        started = time.thread_time()
+        chunk = self.stream.compress(body) if more_body else self.stream.finish(body)
+        self.cpu_seconds += time.thread_time() - started
+        self.raw_size += len(body)
+        self.encoded_size += len(chunk)
+        if not more_body:
+            self._record(self.raw_size, self.encoded_size)
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    async def _send_whole(self, body: bytes):
+        if len(body) < self.min_size:
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": body})
+            return
+
+        name = self.encoder.name
+        etag = self.headers.get("etag")
+        encoded = self.cache.get(etag, name) if etag else None
+        if encoded is not None:
+            metrics.COMPRESSION_CACHE_HITS.inc(name)
+        else:
+            started = time.thread_time()
+            encoded = self.encoder.compress(body)
+            self.cpu_seconds = time.thread_time() - started
+            if etag:
+                self.cache.put(etag, name, encoded)
+        self._record(len(body), len(encoded))
+
+        if len(encoded) >= len(body):
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": body})
+            return
+        self.headers["Content-Length"] = str(len(encoded))
+        _mark_encoded(self.headers, name)
+        await self.send(self.start)
+        await self.send({"type": "http.response.body", "body": encoded})
+
+    def _record(self, raw_size: int, encoded_size: int):
+        name = self.encoder.name
+        if self.cpu_seconds:
+            metrics.COMPRESSION_CPU_SECONDS.inc(name, amount=self.cpu_seconds)
+        if encoded_size:
+            metrics.COMPRESSION_RATIO.observe(raw_size / encoded_size, name)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing JSON and text responses with the best encoding the client accepts.
+
+    Bodies under ``min_size`` are sent as is. Complete bodies that carry an ETag are compressed
+    once and then served from a ``PrecompressedCache``; streamed bodies are compressed chunk by chunk.
+    """
+
+    def __init__(self, app, settings: Optional[CompressionSettings] = None):
+        self.app = app
+        self.settings = settings or load_settings()
+        self.encoders = available_encoders(self.settings)
+        self.cache = PrecompressedCache(self.settings.cache_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.settings.enabled or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = None
+        for name, value in scope.get("headers", ()):
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate(accept_encoding, tuple(self.encoders))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressingSend(send, self.encoders[encoding], self.settings.min_size, self.cache)
+        await self.app(scope, receive, responder)
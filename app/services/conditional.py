@@ -0,0 +1,99 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import httpx
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from . import serialization
+
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
+
+def cache_control_from_env(name: str, default: str = DEFAULT_CACHE_CONTROL) -> str:
+    # COMPANY_CACHE_CONTROL="private, max-age=5" lets clients skip revalidation for 5 seconds
+    return os.getenv(f"{name.upper()}_CACHE_CONTROL", default)
+
+
+def etag_for(data: Any, representation: str) -> str:
+    """Strong ETag of the response rendered from ``data``.
+
+    The source data is hashed with the fast JSON codec instead of the rendered body, so a
+    match skips model validation and rendering. ``representation`` names the route so the
+    same data rendered differently gets a different tag.
+    """
+    raw = data.model_dump_json().encode() if isinstance(data, BaseModel) else serialization.dumps(data)
+    digest = hashlib.blake2b(representation.encode() + b"\0" + raw, digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def none_match(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header matches ``etag`` (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def respond(data: Any, render: Callable[[], Response], if_none_match: Optional[str], representation: str,
+            cache_control: str) -> Response:
+    """Answer 304 when the client already has ``data``, otherwise render it, adding ETag and Cache-Control."""
+    headers = {"ETag": etag_for(data, representation), "Cache-Control": cache_control}
+    if none_match(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response = render()
+    response.headers.update(headers)
+    return response
+
+
+class UpstreamValidators:
+    """Last ETag and body seen per key, so expired entries are revalidated with If-None-Match.
+
+    A 304 from the upstream is answered with the stored body; the data is not downloaded again.
+    Keys must include the caller's token scope: a 304 to one caller must not replay a body
+    fetched for another.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[str, Any]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def headers(self, key: Hashable) -> Dict[str, str]:
+        entry = self._entries.get(key)
+        return {"If-None-Match": entry[0]} if entry is not None else {}
+
+    def resolve(self, key: Hashable, response: httpx.Response) -> Tuple[Any, int]:
+        entry = self._entries.get(key)
+        if response.status_code == 304 and entry is not None:
+            self._entries.move_to_end(key)
+            return entry[1], 200
+        data = response.json()
+        etag = response.headers.get("ETag")
+        if response.status_code == 200 and isinstance(etag, str):
+            self._entries[key] = (etag, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        elif entry is not None:
+            del self._entries[key]
+        return data, response.status_code
+
+    def clear(self):
+        self._entries.clear()
+
+
+def validators_from_env(name: str, default_max_size: int = 1024) -> UpstreamValidators:
+    return UpstreamValidators(int(os.getenv(f"{name.upper()}_REVALIDATION_MAX_SIZE", str(default_max_size))))
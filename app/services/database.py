@@ -0,0 +1,234 @@
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+from . import blocking, metrics
+
+# SQLAlchemy is imported when the first engine is built, so processes that never touch the
+# database do not pay for it at startup
+
+DEFAULT = "default"
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    url: str
+    async_mode: bool = True
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+
+
+def database_url(async_mode: bool) -> str:
+    # DATABASE_URL wins, e.g. sqlite+aiosqlite:///local.db for local runs
+    url = os.getenv("DATABASE_URL")
+    if url:
+        return url
+    driver = "postgresql+asyncpg" if async_mode else "postgresql"
+    return (f"{driver}://{os.getenv('DB_USERNAME')}:{os.getenv('DB_PASSWORD')}"
+            f"@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME', 'postgres')}")
+
+
+def load_settings() -> DatabaseSettings:
+    # Opt-in, so deployments configured with DB_HOST & co. keep the psycopg2 driver they already run
+    async_mode = _env_bool("DB_ASYNC", "false")
+    return DatabaseSettings(
+        url=database_url(async_mode),
+        async_mode=async_mode,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        pool_pre_ping=_env_bool("DB_POOL_PRE_PING", "true"),
+    )
+
+
+def timed_pool(pool_class, name: str):
+    """Subclass ``pool_class`` so the time spent waiting for a connection is recorded under ``name``."""
+    from sqlalchemy import exc
+
+    class TimedPool(pool_class):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                metrics.DB_POOL_TIMEOUTS.inc(name)
+                raise
+            finally:
+                metrics.DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started, name)
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+def _is_async(session) -> bool:
+    from sqlalchemy.ext.asyncio import AsyncSession
+    return isinstance(session, AsyncSession)
+
+
+class Database:
+    """Engine and session factory built on first use from ``DatabaseSettings`` (by default read from the env).
+
+    In async mode sessions are ``AsyncSession`` objects on an async driver, so queries never block the
+    event loop. Sync mode keeps the plain ``Session`` and runs its calls in the blocking executor.
+    """
+
+    def __init__(self, settings: Optional[DatabaseSettings] = None, name: str = DEFAULT):
+        self._settings = settings
+        self.name = name
+        self._engine = None
+        self._sessionmaker = None
+
+    @property
+    def settings(self) -> DatabaseSettings:
+        # Read on first use so a .env loaded after import is still honoured
+        if self._settings is None:
+            self._settings = load_settings()
+        return self._settings
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from sqlalchemy import create_engine
+            from sqlalchemy.ext.asyncio import create_async_engine
+            from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+            settings = self.settings
+            options = dict(
+                pool_size=settings.pool_size,
+                max_overflow=settings.max_overflow,
+                pool_timeout=settings.pool_timeout,
+                pool_recycle=settings.pool_recycle,
+                pool_pre_ping=settings.pool_pre_ping,
+            )
+            if settings.async_mode:
+                self._engine = create_async_engine(
+                    settings.url, poolclass=timed_pool(AsyncAdaptedQueuePool, self.name), **options
+                )
+            else:
+                self._engine = create_engine(settings.url, poolclass=timed_pool(QueuePool, self.name), **options)
+        return self._engine
+
+    @property
+    def sessionmaker(self):
+        if self._sessionmaker is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+            from sqlalchemy.orm import sessionmaker
+
+            if self.settings.async_mode:
+                self._sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+            else:
+                self._sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        return self._sessionmaker
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[Any]:
+        """A session for one unit of work; uncommitted changes are rolled back on exit."""
+        if self.settings.async_mode:
+            async with self.sessionmaker() as session:
+                yield session
+            return
+        session = self.sessionmaker()
+        try:
+            yield session
+        finally:
+            await blocking.run_blocking(session.close)
+
+    async def execute(self, session, statement, *args, **kwargs):
+        if _is_async(session):
+            return await session.execute(statement, *args, **kwargs)
+        return await blocking.run_blocking(session.execute, statement, *args, **kwargs)
+
+    async def run(self, fn, *args):
+        """Run ``fn(session, *args)`` in a new session: through ``run_sync`` in async mode, else in the executor."""
+        async with self.session() as session:
+            if _is_async(session):
+                return await session.run_sync(fn, *args)
+            return await blocking.run_blocking(fn, session, *args)
+
+    async def ping(self):
+        """Run ``SELECT 1`` on a pooled connection; raises when the database is unreachable."""
+        from sqlalchemy import text
+
+        if self.settings.async_mode:
+            async with self.engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+            return
+
+        def ping():
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+
+        await blocking.run_blocking(ping)
+
+    async def create_all(self, metadata):
+        if self.settings.async_mode:
+            async with self.engine.begin() as connection:
+                await connection.run_sync(metadata.create_all)
+        else:
+            await blocking.run_blocking(metadata.create_all, self.engine)
+
+    def pool_stats(self) -> Optional[Dict[str, int]]:
+        if self._engine is None:
+            return None
+        pool = self._engine.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+
+    def after_fork(self):
+        """Drop an engine inherited from a parent process without closing the parent's connections."""
+        if self._engine is None:
+            return
+        engine = self._engine.sync_engine if self.settings.async_mode else self._engine
+        engine.dispose(close=False)
+        self._engine = None
+        self._sessionmaker = None
+
+    async def dispose(self):
+        if self._engine is None:
+            return
+        if self.settings.async_mode:
+            await self._engine.dispose()
+        else:
+            await blocking.run_blocking(self._engine.dispose)
+        self._engine = None
+        self._sessionmaker = None
+
+
+database = Database()
+
+
+async def get_session() -> AsyncIterator[Any]:
+    """FastAPI dependency yielding a session scoped to the request."""
+    async with database.session() as session:
+        yield session
+
+
+async def execute(session, statement, *args, **kwargs):
+    return await database.execute(session, statement, *args, **kwargs)
+
+
+def stats() -> Dict[str, dict]:
+    snapshot = database.pool_stats()
+    return {database.name: snapshot} if snapshot is not None else {}
+
+
+async def shutdown():
+    await database.dispose()
+
+
+def after_fork():
+    database.after_fork()
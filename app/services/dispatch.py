@@ -0,0 +1,424 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from . import database, upstream
+
+logger = logging.getLogger(__name__)
+
+QUEUED, SENDING, SENT, FAILED = "queued", "sending", "sent", "failed"
+
+# sender([(job_id, payload), ...]) -> [(response_data, status_code), ...] in the same order
+Sender = Callable[[List[Tuple[str, Any]]], Awaitable[Sequence[Tuple[Any, int]]]]
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class DispatchSettings:
+    enabled: bool = False
+    max_size: int = 1000
+    batch_size: int = 20
+    batch_wait: float = 0.05
+    concurrency: int = 4
+    max_attempts: int = 5
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+    durable: bool = False
+    lease: float = 300.0
+    status_max_size: int = 10000
+
+
+def load_settings() -> DispatchSettings:
+    return DispatchSettings(
+        enabled=os.getenv("INCIDENT_DISPATCH_MODE", "sync").strip().lower() == "async",
+        max_size=int(os.getenv("INCIDENT_QUEUE_MAX_SIZE", "1000")),
+        batch_size=int(os.getenv("INCIDENT_BATCH_SIZE", "20")),
+        batch_wait=float(os.getenv("INCIDENT_BATCH_WAIT", "0.05")),
+        concurrency=int(os.getenv("INCIDENT_DISPATCH_CONCURRENCY", "4")),
+        max_attempts=int(os.getenv("INCIDENT_DISPATCH_MAX_ATTEMPTS", "5")),
+        backoff_base=float(os.getenv("INCIDENT_DISPATCH_BACKOFF_BASE", "0.5")),
+        backoff_max=float(os.getenv("INCIDENT_DISPATCH_BACKOFF_MAX", "30")),
+        durable=_env_bool("INCIDENT_QUEUE_DURABLE", "false"),
+        lease=float(os.getenv("INCIDENT_QUEUE_LEASE", "300")),
+        status_max_size=int(os.getenv("INCIDENT_STATUS_MAX_SIZE", "10000")),
+    )
+
+
+class QueueFull(Exception):
+    """The dispatch queue holds ``max_size`` unfinished jobs; the caller should retry later."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Dispatch queue is full")
+        self.retry_after = retry_after
+
+
+@dataclass
+class Job:
+    id: str
+    payload: Any
+    created_at: float
+    updated_at: float
+    status: str = QUEUED
+    attempts: int = 0
+    status_code: Optional[int] = None
+    result: Any = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SENT, FAILED)
+
+    def to_status(self) -> Dict[str, Any]:
+        return {
+            "tracking_id": self.id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "status_code": self.status_code,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+@dataclass
+class DispatchStats:
+    submitted: int = 0
+    rejected: int = 0
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    batches: int = 0
+    queue_depth: int = 0
+
+
+class MemoryJobStore:
+    """Job states of this process; the oldest finished jobs are forgotten past ``max_size``."""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    async def setup(self):
+        pass
+
+    async def add(self, job: Job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_size:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.finished:
+                break
+            del self._jobs[oldest_id]
+
+    async def update(self, job: Job):
+        self._jobs[job.id] = job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def claim(self) -> List[Job]:
+        return []
+
+    async def release(self):
+        pass
+
+
+def _store():
+    # The SQLAlchemy side is imported on first use, so a process without a durable queue never loads it
+    from . import dispatch_store
+    return dispatch_store
+
+
+class DatabaseJobStore:
+    """Job states in the service database, so queued jobs are resent after a restart.
+
+    Every job is owned by the process that stored it, under a lease of ``lease`` seconds renewed
+    on each state change. ``claim`` takes unfinished jobs that are unowned, owned by this process
+    or whose lease lapsed in one UPDATE, so workers starting together do not all resend them.
+    """
+
+    PENDING = (QUEUED, SENDING)
+
+    def __init__(self, db: database.Database, lease: float = 300.0, owner: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        self.db = db
+        self.lease = lease
+        self.owner = owner
+        self._clock = clock
+
+    async def setup(self):
+        # Resolved here rather than at import, so each forked worker gets its own pid
+        self.owner = self.owner or f"{socket.gethostname()}:{os.getpid()}"
+        await self.db.create_all(_store().metadata)
+
+    async def add(self, job: Job):
+        await self.update(job)
+
+    async def update(self, job: Job):
+        await self.db.run(_store().save, job, self.owner, self._clock() + self.lease)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await self.db.run(_store().load, job_id)
+
+    async def claim(self) -> List[Job]:
+        """Take the unfinished jobs no live process owns and return every unfinished job of this one."""
+        return await self.db.run(_store().claim, self.owner, self._clock(), self.lease, self.PENDING)
+
+    async def release(self):
+        """Give up this process's unfinished jobs, so the next process to start claims them at once."""
+        await self.db.run(_store().release, self.owner, self.PENDING)
+
+
+def _retriable(status_code: Optional[int]) -> bool:
+    # None means the call itself failed (timeout, connection error, open circuit)
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+class Dispatcher:
+    """Bounded in-process queue flushed to an upstream in batches by a background task.
+
+    ``submit`` answers as soon as the job is queued (and stored, when durable) and raises
+    ``QueueFull`` once ``max_size`` jobs are unfinished, retries included. Batches of up to
+    ``batch_size`` jobs, collected for at most ``batch_wait`` seconds, are sent with at most
+    ``concurrency`` batches in flight. Failed sends are retried with jittered exponential backoff
+    up to ``max_attempts``, so delivery is at least once.
+    """
+
+    def __init__(self, sender: Sender, settings: Optional[DispatchSettings] = None, store=None,
+                 clock: Callable[[], float] = time.time):
+        self.sender = sender
+        self.settings = settings or load_settings()
+        self.store = store if store is not None else MemoryJobStore(self.settings.status_max_size)
+        self.stats = DispatchStats()
+        self._clock = clock
+        self._queue: Optional[asyncio.Queue] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Future] = set()
+        self._retries: Set[asyncio.TimerHandle] = set()
+        self._idle: Optional[asyncio.Event] = None
+        self._unfinished = 0
+        self._accepting = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.enabled
+
+    @property
+    def unfinished(self) -> int:
+        return self._unfinished
+
+    async def start(self):
+        if self._collector is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(self.settings.concurrency)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        await self.store.setup()
+        for job in await self.store.claim():
+            self._enqueue(job)
+        self._accepting = True
+        self._collector = asyncio.create_task(self._collect())
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop accepting jobs and wait up to ``timeout`` seconds for the queue to drain."""
+        self._accepting = False
+        if self._collector is None:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stopping with %d undelivered incident jobs", self._unfinished)
+        # Retries still waiting out their backoff stay unfinished in the store for the next claim
+        for handle in self._retries:
+            handle.cancel()
+        self._retries.clear()
+        self._collector.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(self._collector, *self._tasks, return_exceptions=True)
+        self._collector = None
+        self._tasks.clear()
+        try:
+            await self.store.release()
+        except Exception:
+            logger.exception("Failed to release undelivered incident jobs")
+
+    def _reserve(self):
+        self._unfinished += 1
+        self._idle.clear()
+        self.stats.queue_depth = self._unfinished
+
+    def _enqueue(self, job: Job):
+        self._reserve()
+        self._queue.put_nowait(job)
+
+    def _retry_after(self) -> float:
+        # Roughly the time to flush one batch window per concurrent sender
+        return max(1.0, self.settings.batch_wait * self._unfinished / max(1, self.settings.batch_size))
+
+    async def submit(self, payload: Any) -> Job:
+        if not self._accepting or self._unfinished >= self.settings.max_size:
+            self.stats.rejected += 1
+            raise QueueFull(self._retry_after())
+        now = self._clock()
+        job = Job(id=uuid.uuid4().hex, payload=payload, created_at=now, updated_at=now)
+        # The slot is taken before the store write so concurrent submits cannot overshoot max_size
+        self._reserve()
+        try:
+            await self.store.add(job)
+        except Exception:
+            self._finish_count()
+            raise
+        self._queue.put_nowait(job)
+        self.stats.submitted += 1
+        return job
+
+    async def status(self, job_id: str) -> Optional[Job]:
+        return await self.store.get(job_id)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.settings.batch_wait
+            while len(batch) < self.settings.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Job]):
+        try:
+            self.stats.batches += 1
+            for job in batch:
+                job.status = SENDING
+                job.attempts += 1
+            try:
+                outcomes = list(await self.sender([(job.id, job.payload) for job in batch]))
+            except Exception as exc:
+                logger.warning("Incident batch of %d failed: %r", len(batch), exc)
+                outcomes = [(None, None)] * len(batch)
+                error = repr(exc)
+            else:
+                error = None
+            for job, (data, status_code) in zip(batch, outcomes):
+                await self._settle(job, data, status_code, error)
+        finally:
+            self._semaphore.release()
+
+    def _backoff(self, attempts: int) -> float:
+        return random.uniform(0, min(self.settings.backoff_max, self.settings.backoff_base * 2 ** (attempts - 1)))
+
+    def _finish_count(self):
+        self._unfinished -= 1
+        self.stats.queue_depth = self._unfinished
+        if self._unfinished == 0:
+            self._idle.set()
+
+    async def _settle(self, job: Job, data: Any, status_code: Optional[int], error: Optional[str]):
+        job.status_code = status_code
+        job.updated_at = self._clock()
+        if status_code is not None and status_code < 400:
+            job.status, job.result, job.error = SENT, data, None
+            self.stats.sent += 1
+        else:
+            error = error or (f"Upstream answered {status_code}" if status_code is not None else "Request failed")
+            if _retriable(status_code) and job.attempts < self.settings.max_attempts:
+                job.status, job.error = QUEUED, error
+                self.stats.retries += 1
+            else:
+                job.status, job.result, job.error = FAILED, data, error
+                self.stats.failed += 1
+        await self._save(job)
+        if job.finished:
+            # Counted down after the save so a drained queue means every state is stored
+            self._finish_count()
+        else:
+            self._schedule_retry(job)
+
+    def _schedule_retry(self, job: Job):
+        def requeue():
+            self._retries.discard(handle)
+            self._queue.put_nowait(job)
+
+        handle = asyncio.get_running_loop().call_later(self._backoff(job.attempts), requeue)
+        self._retries.add(handle)
+
+    async def _save(self, job: Job):
+        try:
+            await self.store.update(job)
+        except Exception:
+            logger.exception("Failed to store the state of incident job %s", job.id)
+
+
+def bulk_idempotency_key(job_ids: Sequence[str]) -> str:
+    """Idempotency key of a bulk post, the same whenever the same jobs are sent together in the same order."""
+    return hashlib.sha256(",".join(job_ids).encode()).hexdigest()[:32]
+
+
+class IncidentSender:
+    """Posts a batch to ``/incidents/bulk``, or one ``/incidents`` call per job when bulk is unsupported.
+
+    A bulk answer that is not one item per job cannot be matched to the jobs, so it fails the
+    whole batch as a retriable 502 instead of marking jobs sent that may not have been created.
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.bulk_supported = True
+
+    async def __call__(self, items: List[Tuple[str, Any]]) -> List[Tuple[Any, int]]:
+        if self.bulk_supported and len(items) > 1:
+            response = await upstream.send(
+                upstream.INCIDENT_MANAGEMENT, "POST", f"{self.base_url}/incidents/bulk",
+                json=[payload for _, payload in items],
+                headers={"Idempotency-Key": bulk_idempotency_key([job_id for job_id, _ in items])},
+            )
+            if response.status_code not in (404, 405, 501):
+                data = response.json()
+                if response.status_code >= 400:
+                    return [(data, response.status_code)] * len(items)
+                if isinstance(data, list) and len(data) == len(items):
+                    return [(item, response.status_code) for item in data]
+                logger.warning("Incident bulk answer does not match the batch of %d; failing it", len(items))
+                return [(data, 502)] * len(items)
+            self.bulk_supported = False
+        return list(await asyncio.gather(*(self._send_one(job_id, payload) for job_id, payload in items)))
+
+    async def _send_one(self, job_id: str, payload: Any) -> Tuple[Any, int]:
+        try:
+            response = await upstream.send(
+                upstream.INCIDENT_MANAGEMENT, "POST", f"{self.base_url}/incidents",
+                json=payload, headers={"Idempotency-Key": job_id},
+            )
+        except Exception as exc:
+            logger.warning("Incident job %s failed: %r", job_id, exc)
+            return None, None
+        return response.json(), response.status_code
+
+
+def from_env(base_url: str) -> Dispatcher:
+    settings = load_settings()
+    if settings.durable:
+        store = DatabaseJobStore(database.database, settings.lease)
+    else:
+        store = MemoryJobStore(settings.status_max_size)
+    return Dispatcher(IncidentSender(base_url), settings, store)
@@ -0,0 +1,53 @@
+from dataclasses import asdict
+from typing import List, Optional, Sequence
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from ..models.base import Base
+from ..models.dispatch import DispatchJob
+from .dispatch import Job
+
+metadata = Base.metadata
+
+
+def _from_row(row: DispatchJob) -> Job:
+    return Job(id=row.id, payload=row.payload, created_at=row.created_at, updated_at=row.updated_at,
+               status=row.status, attempts=row.attempts, status_code=row.status_code, result=row.result,
+               error=row.error)
+
+
+def save(session: Session, job: Job, owner: Optional[str], lease_until: float):
+    session.merge(DispatchJob(**asdict(job), owner=owner, lease_until=lease_until))
+    session.commit()
+
+
+def load(session: Session, job_id: str) -> Optional[Job]:
+    row = session.get(DispatchJob, job_id)
+    return _from_row(row) if row is not None else None
+
+
+def claim(session: Session, owner: str, now: float, lease: float, pending: Sequence[str]) -> List[Job]:
+    session.execute(
+        update(DispatchJob)
+        .where(DispatchJob.status.in_(pending),
+               or_(DispatchJob.owner.is_(None), DispatchJob.owner == owner,
+                   DispatchJob.lease_until.is_(None), DispatchJob.lease_until < now))
+        .values(owner=owner, lease_until=now + lease)
+    )
+    session.commit()
+    rows = session.scalars(
+        select(DispatchJob)
+        .where(DispatchJob.status.in_(pending), DispatchJob.owner == owner)
+        .order_by(DispatchJob.created_at)
+    ).all()
+    return [_from_row(row) for row in rows]
+
+
+def release(session: Session, owner: str, pending: Sequence[str]):
+    session.execute(
+        update(DispatchJob)
+        .where(DispatchJob.status.in_(pending), DispatchJob.owner == owner)
+        .values(owner=None, lease_until=None)
+    )
+    session.commit()
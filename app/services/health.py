@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from . import database, read_model, upstream
+
+logger = logging.getLogger(__name__)
+
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "https://api.aws.cloud/user")
+QUERY_INCIDENT_SERVICE_URL = os.getenv("QUERY_INCIDENT_SERVICE_URL", "https://api.aws.cloud/incident-query")
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Probe:
+    """A dependency check; ``check`` raises when the dependency is down."""
+
+    name: str
+    check: Callable[[], Awaitable[None]]
+    critical: bool = True
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    name: str
+    ok: bool
+    critical: bool
+    latency: float
+    checked_at: float
+    error: Optional[str] = None
+
+
+class HealthProber:
+    """Runs every probe each ``interval`` seconds in the background and keeps the last results.
+
+    Readiness is read from those results, so a probe request costs no dependency call. Results
+    older than ``max_age`` count as failed, so a stuck prober turns the service unready.
+    """
+
+    def __init__(self, probes: List[Probe], interval: float = 5.0, timeout: float = 2.0,
+                 max_age: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.probes = probes
+        self.interval = interval
+        self.timeout = timeout
+        self.max_age = max_age if max_age is not None else 3 * interval
+        self.results: Dict[str, ProbeResult] = {}
+        # Set on shutdown so load balancers stop routing here while in-flight requests finish
+        self.draining = False
+        self._clock = clock
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_probe(self, probe: Probe) -> ProbeResult:
+        started = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(probe.check(), self.timeout)
+        except asyncio.TimeoutError:
+            error = f"Timed out after {self.timeout}s"
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        return ProbeResult(probe.name, error is None, probe.critical, time.perf_counter() - started, self._clock(), error)
+
+    async def run_once(self):
+        for result in await asyncio.gather(*(self._run_probe(probe) for probe in self.probes)):
+            previous = self.results.get(result.name)
+            if not result.ok and (previous is None or previous.ok):
+                logger.warning("Dependency %s is down: %s", result.name, result.error)
+            self.results[result.name] = result
+
+    def start(self):
+        if self._task is None and self.probes:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Health probes failed")
+            await asyncio.sleep(self.interval)
+
+    def _current(self, result: ProbeResult) -> bool:
+        return result.ok and self._clock() - result.checked_at <= self.max_age
+
+    def ready(self) -> bool:
+        if self.draining:
+            return False
+        for probe in self.probes:
+            result = self.results.get(probe.name)
+            if probe.critical and (result is None or not self._current(result)):
+                return False
+        return True
+
+    def report(self) -> dict:
+        now = self._clock()
+        checks = {}
+        for probe in self.probes:
+            result = self.results.get(probe.name)
+            if result is None:
+                checks[probe.name] = {"status": "pending", "critical": probe.critical}
+                continue
+            checks[probe.name] = {
+                "status": "up" if self._current(result) else "down",
+                "critical": result.critical,
+                "latency_ms": round(result.latency * 1000, 3),
+                "age_seconds": round(now - result.checked_at, 3),
+                "error": result.error,
+            }
+        status = "draining" if self.draining else "ready" if self.ready() else "unavailable"
+        return {"status": status, "checks": checks}
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            name: {"up": int(self._current(result)), "latency_seconds": result.latency}
+            for name, result in self.results.items()
+        }
+
+
+def http_check(upstream_name: str, url: str) -> Callable[[], Awaitable[None]]:
+    # Any answer below 500 means reachable; the call goes through the upstream guard, so an open
+    # circuit reads as down too
+    async def check():
+        response = await upstream.send(upstream_name, "GET", url)
+        if response.status_code >= 500:
+            raise RuntimeError(f"Answered {response.status_code}")
+
+    return check
+
+
+def probes_from_env() -> List[Probe]:
+    critical = {name.strip() for name in os.getenv("HEALTH_CRITICAL", "user_service,database").split(",") if name.strip()}
+    probes = [
+        Probe("user_service", http_check(upstream.USER_SERVICE, os.getenv("HEALTH_USER_SERVICE_URL", f"{USER_SERVICE_URL}/health")),
+              "user_service" in critical),
+        Probe("incident_query", http_check(upstream.INCIDENT_QUERY,
+                                           os.getenv("HEALTH_INCIDENT_QUERY_URL", f"{QUERY_INCIDENT_SERVICE_URL}/health")),
+              "incident_query" in critical),
+    ]
+    # The database only matters to this app when the read model serves from it
+    if _env_bool("HEALTH_CHECK_DATABASE", "true" if read_model.read_model.enabled else "false"):
+        probes.append(Probe("database", database.database.ping, "database" in critical))
+    return probes
+
+
+prober = HealthProber(
+    probes_from_env(),
+    interval=float(os.getenv("HEALTH_PROBE_INTERVAL", "5")),
+    timeout=float(os.getenv("HEALTH_PROBE_TIMEOUT", "2")),
+)
+
+
+def startup():
+    prober.start()
+
+
+async def shutdown():
+    await prober.stop()
+
+
+def stats() -> Dict[str, dict]:
+    return prober.stats()
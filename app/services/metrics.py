@@ -0,0 +1,416 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+# (name, type, help, samples) produced by collectors at scrape time
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Sequence[str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(label) for label in labels)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        for key, value in list(self._values.items()):
+            yield self.name, self._labels(key), value
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, *labels: str):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def samples(self):
+        for key, (counts, total) in list(self._values.items()):
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_count", labels, cumulative
+            yield f"{self.name}_sum", labels, total
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]):
+        self._collectors.append(collector)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def families(self) -> Iterable[Family]:
+        for metric in list(self._metrics.values()):
+            yield metric.name, metric.type, metric.documentation, list(metric.samples())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                yield name, kind, documentation, [(name, labels, value) for labels, value in samples]
+
+    def render(self) -> str:
+        return render_families(self.families())
+
+    def snapshot(self) -> list:
+        """Every family as plain JSON-ready lists, for merging with other workers."""
+        return [[name, kind, documentation, [list(sample) for sample in samples]]
+                for name, kind, documentation, samples in self.families()]
+
+
+def render_families(families: Iterable[Family]) -> str:
+    lines = []
+    for name, kind, documentation, samples in families:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample_name, labels, value in samples:
+            lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# Counters and histograms add up across workers; gauges keep one series per worker
+SUMMED_TYPES = ("counter", "histogram")
+
+
+def merge_snapshots(snapshots: Dict[str, list]) -> List[Family]:
+    """Merge ``Registry.snapshot()`` results keyed by worker id into one set of families."""
+    merged: Dict[str, list] = {}
+    for worker, families in sorted(snapshots.items()):
+        for name, kind, documentation, samples in families:
+            entry = merged.setdefault(name, [kind, documentation, {}])
+            for sample_name, labels, value in samples:
+                if kind not in SUMMED_TYPES:
+                    labels = {**labels, "worker": worker}
+                key = (sample_name, tuple(labels.items()))
+                entry[2][key] = entry[2].get(key, 0.0) + value
+    return [
+        (name, kind, documentation, [(sample_name, dict(labels), value) for (sample_name, labels), value in values.items()])
+        for name, (kind, documentation, values) in merged.items()
+    ]
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests handled by the gateway", ("method", "route", "status")
+)
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Gateway request latency by route template", ("method", "route")
+)
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled"
+)
+UPSTREAM_LATENCY = registry.histogram(
+    "upstream_request_duration_seconds", "Latency of outbound calls by upstream", ("upstream", "method", "status")
+)
+UPSTREAM_IN_FLIGHT = registry.gauge(
+    "upstream_requests_in_flight", "Outbound calls currently in flight", ("upstream",)
+)
+API_ERRORS = registry.counter(
+    "api_errors_total", "ApiError responses returned by the gateway", ("error", "code")
+)
+DB_POOL_CHECKOUT_SECONDS = registry.histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a database connection from the pool", ("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+DB_POOL_TIMEOUTS = registry.counter(
+    "db_pool_timeouts_total", "Pool checkouts that gave up after DB_POOL_TIMEOUT", ("pool",)
+)
+COMPRESSION_RATIO = registry.histogram(
+    "http_response_compression_ratio", "Uncompressed over compressed body size", ("encoding",),
+    buckets=(1.0, 1.5, 2.0, 3.0, 4.0, 6.0, 8.0, 12.0, 16.0, 32.0),
+)
+COMPRESSION_CPU_SECONDS = registry.counter(
+    "http_response_compression_cpu_seconds_total", "CPU time spent compressing response bodies", ("encoding",)
+)
+COMPRESSION_CACHE_HITS = registry.counter(
+    "http_response_compression_cache_hits_total", "Responses served from precompressed bodies", ("encoding",)
+)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    # Unmatched paths share one label so arbitrary URLs cannot blow up cardinality
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency per route template and in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            route = _route_label(scope)
+            REQUESTS.inc(scope["method"], route, status)
+            REQUEST_LATENCY.observe(elapsed, scope["method"], route)
+
+
+def stats_collector(name: str, documentation: str, label: str, source: Callable[[], Dict[str, dict]],
+                    fields: Sequence[str] = (), counters: Sequence[str] = ()) -> Callable[[], Iterable[Family]]:
+    """Expose values from an existing ``stats()`` function as metric families.
+
+    ``fields`` are point-in-time values, exported as ``<name>_<field>`` gauges. ``counters`` only
+    ever grow, and are exported as ``<name>_<field>_total`` counters so ``rate()`` works on them.
+    """
+
+    def samples(snapshot, field):
+        return [
+            ({label: key}, values[field]) for key, values in snapshot.items()
+            if isinstance(values.get(field), (int, float))
+        ]
+
+    def collect():
+        snapshot = source()
+        for field in counters:
+            yield f"{name}_{field}_total", "counter", f"{documentation} ({field})", samples(snapshot, field)
+        for field in fields:
+            yield f"{name}_{field}", "gauge", f"{documentation} ({field})", samples(snapshot, field)
+
+    return collect
+
+
+class MultiprocessMetrics:
+    """Shares this worker's metrics with the other workers of a pre-forked server through ``directory``.
+
+    Each worker writes a snapshot of its registry to ``<directory>/<worker>.json`` every ``interval``
+    seconds and on shutdown. A scrape served by any worker merges its live registry with the other
+    workers' latest snapshots, so other workers lag by at most ``interval``.
+    """
+
+    def __init__(self, directory: str, worker: Optional[str] = None, registry: Registry = registry,
+                 interval: float = 1.0):
+        self.directory = directory
+        self.worker = worker or str(os.getpid())
+        self.registry = registry
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{self.worker}.json")
+
+    def write(self):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(temporary, self.path)
+
+    def snapshots(self) -> Dict[str, list]:
+        snapshots = {}
+        for filename in os.listdir(self.directory):
+            worker, extension = os.path.splitext(filename)
+            if extension != ".json" or worker == self.worker:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    snapshots[worker] = json.load(f)
+            except (OSError, ValueError):
+                logger.warning("Skipping unreadable metrics snapshot %s", filename)
+        snapshots[self.worker] = self.registry.snapshot()
+        return snapshots
+
+    def render(self) -> str:
+        return render_families(merge_snapshots(self.snapshots()))
+
+    def start(self):
+        if self._task is None:
+            self.write()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.write()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write()
+            except OSError:
+                logger.warning("Could not write the metrics snapshot", exc_info=True)
+
+
+# Snapshot holding the summed totals of every worker that exited
+RETIRED = "retired"
+
+
+def retire_worker(directory: str, worker: str):
+    """Fold the counters and histograms of a worker that exited into the retired totals.
+
+    Totals never go backwards, gauges of the worker are dropped, and its snapshot is removed, so
+    the directory does not grow with every recycled worker and a reused pid starts from zero.
+    """
+    path = os.path.join(directory, f"{worker}.json")
+    try:
+        with open(path) as f:
+            families = json.load(f)
+    except (OSError, ValueError):
+        return
+    retired_path = os.path.join(directory, f"{RETIRED}.json")
+    snapshots = {worker: [family for family in families if family[1] in SUMMED_TYPES]}
+    try:
+        with open(retired_path) as f:
+            snapshots[RETIRED] = json.load(f)
+    except FileNotFoundError:
+        pass
+    temporary = f"{retired_path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(merge_snapshots(snapshots), f)
+    os.replace(temporary, retired_path)
+    os.remove(path)
+
+
+_multiprocess: Optional[MultiprocessMetrics] = None
+
+
+def startup():
+    """Share metrics through ``METRICS_MULTIPROC_DIR`` when it is set (``app.serve`` sets it for its workers)."""
+    global _multiprocess
+    directory = os.getenv("METRICS_MULTIPROC_DIR")
+    if directory and _multiprocess is None:
+        _multiprocess = MultiprocessMetrics(directory, interval=float(os.getenv("METRICS_MULTIPROC_INTERVAL", "1")))
+        _multiprocess.start()
+
+
+async def shutdown():
+    global _multiprocess
+    if _multiprocess is not None:
+        await _multiprocess.stop()
+        _multiprocess = None
+
+
+def render() -> str:
+    if _multiprocess is not None:
+        return _multiprocess.render()
+    return registry.render()
@@ -0,0 +1,110 @@
+import base64
+import binascii
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Query
+
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "100"))
+
+# Cursors are opaque to clients: either a gateway offset or a wrapped upstream cursor
+_OFFSET, _UPSTREAM = "o:", "u:"
+
+
+def _encode(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def encode_cursor(offset: int) -> str:
+    return _encode(f"{_OFFSET}{offset}")
+
+
+def wrap_upstream_cursor(cursor: str) -> str:
+    return _encode(f"{_UPSTREAM}{cursor}")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, Optional[str]]:
+    """Return ``(offset, upstream_cursor)`` for a cursor issued by ``encode_cursor``/``wrap_upstream_cursor``."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if raw.startswith(_UPSTREAM):
+            return 0, raw[len(_UPSTREAM):]
+        if not raw.startswith(_OFFSET):
+            raise ValueError(cursor)
+        offset = int(raw[len(_OFFSET):])
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor") from None
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset, None
+
+
+@dataclass(frozen=True)
+class PageParams:
+    """``limit``/``cursor``/``fields`` of a list request.
+
+    The parameters are forwarded to the upstream. An upstream that pages by itself answers
+    with a ``next_cursor`` next to the list, which is wrapped into the gateway's cursor;
+    otherwise the gateway slices the list and issues offset cursors. Such an upstream may still
+    honor ``limit``, so it is asked for everything up to the end of the page (``offset + limit``)
+    and a list that fills it is assumed to go on; the last page can then come back empty.
+    """
+
+    limit: Optional[int] = None
+    offset: int = 0
+    upstream_cursor: Optional[str] = None
+    fields: Optional[Tuple[str, ...]] = None
+    paged: bool = False
+
+    @property
+    def active(self) -> bool:
+        return self.paged or self.limit is not None
+
+    def upstream_params(self) -> Dict[str, Any]:
+        params: Dict[str, Any] = {}
+        if self.limit is not None:
+            params["limit"] = self.offset + self.limit
+        if self.upstream_cursor is not None:
+            params["cursor"] = self.upstream_cursor
+        if self.fields:
+            params["fields"] = ",".join(self.fields)
+        return params
+
+    def paginate(self, payload: Any, key: str) -> Tuple[List[Any], Optional[str]]:
+        """Return the page of the list found at the root of ``payload`` or under ``key``, and the next cursor."""
+        if isinstance(payload, dict):
+            items = payload.get(key) or []
+            if "next_cursor" in payload:
+                upstream_next = payload["next_cursor"]
+                return items, wrap_upstream_cursor(upstream_next) if upstream_next else None
+        else:
+            items = payload or []
+        if not self.active:
+            return items, None
+        if self.limit is None:
+            return items[self.offset:], None
+        end = self.offset + self.limit
+        # A list of exactly ``end`` items may have been cut there by the upstream
+        return items[self.offset:end], encode_cursor(end) if end <= len(items) else None
+
+    def project(self, items: List[Any]) -> List[Any]:
+        if not self.fields:
+            return items
+        return [self.project_item(item) for item in items]
+
+    def project_item(self, item: Any) -> Any:
+        if not self.fields or not isinstance(item, dict):
+            return item
+        return {field: item[field] for field in self.fields if field in item}
+
+
+def page_params(
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX_LIMIT, description="Maximum items to return"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma separated item fields to return"),
+) -> PageParams:
+    selected = tuple(field.strip() for field in fields.split(",") if field.strip()) if fields else None
+    offset, upstream_cursor = decode_cursor(cursor) if cursor is not None else (0, None)
+    return PageParams(limit=limit, offset=offset, upstream_cursor=upstream_cursor, fields=selected or None,
+                      paged=cursor is not None)
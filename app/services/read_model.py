@@ -0,0 +1,345 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from . import auth, database, upstream
+
+logger = logging.getLogger(__name__)
+
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "https://api.aws.cloud/user")
+
+SYNC_STATE = "user_service"
+
+# fetch(cursor, limit) -> (payload, status_code)
+ChangesFetcher = Callable[[Optional[str], int], Awaitable[Any]]
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class ReadModelSettings:
+    enabled: bool = False
+    max_staleness: float = 300.0
+    sync_interval: float = 60.0
+    sync_batch_size: int = 500
+    sync_enabled: bool = True
+
+
+def load_settings() -> ReadModelSettings:
+    return ReadModelSettings(
+        enabled=_env_bool("READ_MODEL_ENABLED", "false"),
+        max_staleness=float(os.getenv("READ_MODEL_MAX_STALENESS", "300")),
+        sync_interval=float(os.getenv("READ_MODEL_SYNC_INTERVAL", "60")),
+        sync_batch_size=int(os.getenv("READ_MODEL_SYNC_BATCH_SIZE", "500")),
+        sync_enabled=_env_bool("READ_MODEL_SYNC_ENABLED", "true"),
+    )
+
+
+class ChangeFeedUnsupported(Exception):
+    """The upstream has no change feed; the read model is then filled by write-through only."""
+
+
+@dataclass
+class ReadModelStats:
+    hits: int = 0
+    misses: int = 0
+    stale: int = 0
+    ungranted: int = 0
+    writes: int = 0
+    errors: int = 0
+    sync_runs: int = 0
+    sync_items: int = 0
+    sync_errors: int = 0
+    sync_skipped: int = 0
+    grants_pruned: int = 0
+
+
+def _store():
+    # The SQLAlchemy side is imported on first use, so a gateway without the read model never loads it
+    from . import read_store
+    return read_store
+
+
+class ReadModel:
+    """Local copy of companies, users and user-company links kept in the service database.
+
+    Rows are written through from upstream reads and ``create_company``, and by the incremental
+    sync job. Each write-through also records a grant for the token's ``sub``: the upstream
+    answered that principal for that row. A row is served only while its own write is younger
+    than ``max_staleness`` and only to a principal granted it within the same window. Anything
+    else returns None, so the caller falls back to the upstream, which re-grants on success.
+    """
+
+    def __init__(self, db: database.Database, settings: Optional[ReadModelSettings] = None,
+                 clock: Callable[[], float] = time.time):
+        self.db = db
+        self.settings = settings or load_settings()
+        self.stats = ReadModelStats()
+        self._clock = clock
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.enabled
+
+    def _fresh(self, at: Optional[float]) -> bool:
+        return at is not None and self._clock() - at <= self.settings.max_staleness
+
+    @staticmethod
+    def _principal(token: Optional[str]) -> Optional[str]:
+        """The verified ``sub`` of ``token``, which grants are recorded for."""
+        payload = auth.verifier.verify(token) if token else None
+        if not payload or payload.get("sub") is None:
+            return None
+        return str(payload["sub"])
+
+    def _usable(self, token: Optional[str]) -> Optional[str]:
+        return self._principal(token) if self.enabled else None
+
+    async def _read(self, fn, *args):
+        store = _store()
+        try:
+            result = await self.db.run(fn, *args)
+        except store.SQLAlchemyError:
+            self.stats.errors += 1
+            logger.exception("Read model lookup failed")
+            return None
+        if result is None:
+            self.stats.misses += 1
+        return result
+
+    async def _write(self, fn, *args):
+        if not self.enabled:
+            return
+        store = _store()
+
+        def write(session):
+            fn(session, *args)
+            session.commit()
+
+        try:
+            await self.db.run(write)
+            self.stats.writes += 1
+        except store.SQLAlchemyError:
+            self.stats.errors += 1
+            logger.exception("Read model write failed")
+
+    def _serve(self, data: Any, synced_at: Optional[float], granted_at: Optional[float]) -> Any:
+        # The upstream authorizes every read, so only principals it recently answered see the row
+        if not self._fresh(granted_at):
+            self.stats.ungranted += 1
+            return None
+        if not self._fresh(synced_at):
+            self.stats.stale += 1
+            return None
+        self.stats.hits += 1
+        return data
+
+    async def get_company(self, company_id: str, token: Optional[str]) -> Optional[dict]:
+        principal = self._usable(token)
+        if principal is None:
+            return None
+        found = await self._read(_store().find_company, str(company_id), principal)
+        return self._serve(*found) if found is not None else None
+
+    async def get_user(self, user_id: str, token: Optional[str]) -> Optional[dict]:
+        principal = self._usable(token)
+        if principal is None:
+            return None
+        found = await self._read(_store().find_user, str(user_id), principal)
+        return self._serve(*found) if found is not None else None
+
+    async def get_user_companies(self, token: Optional[str], user_id: Optional[str] = None,
+                                 document: Optional[tuple] = None) -> Optional[dict]:
+        """``{"user_id", "companies"}`` for a user looked up by id or by ``(document_type, document_id)``."""
+        principal = self._usable(token)
+        if principal is None:
+            return None
+        user_id = str(user_id) if user_id is not None else None
+        found = await self._read(_store().find_user_companies, principal, user_id, document)
+        return self._serve(*found) if found is not None else None
+
+    async def put_companies(self, items: Iterable[dict], token: Optional[str] = None):
+        """Store companies the upstream returned, granting them to the ``sub`` of ``token``."""
+        now = self._clock()
+        principal = self._principal(token)
+        store = _store()
+
+        def put(session):
+            for item in items:
+                store.put_company(session, item, now)
+                if principal is not None:
+                    store.grant(session, principal, "company", str(item["id"]), now)
+
+        await self._write(put)
+
+    async def put_users(self, items: Iterable[dict], token: Optional[str] = None):
+        now = self._clock()
+        principal = self._principal(token)
+        store = _store()
+
+        def put(session):
+            for item in items:
+                store.put_user(session, item, now)
+                if principal is not None:
+                    store.grant(session, principal, "user", str(item["id"]), now)
+
+        await self._write(put)
+
+    async def put_user_companies(self, user_id: str, companies: List[dict], document: Optional[tuple] = None,
+                                 token: Optional[str] = None):
+        now = self._clock()
+        principal = self._principal(token)
+        store = _store()
+
+        def put(session):
+            store.put_user_companies(session, str(user_id), list(companies), document, now)
+            if principal is not None:
+                store.grant(session, principal, "user_companies", str(user_id), now)
+
+        await self._write(put)
+
+    async def load_sync_state(self) -> Optional[str]:
+        cursor, _ = await self.db.run(_store().load_sync_state, SYNC_STATE)
+        return cursor
+
+    async def claim_sync(self, owner: str, lease: float) -> bool:
+        return await self.db.run(_store().claim_sync, SYNC_STATE, owner, self._clock(), lease)
+
+    async def release_sync(self, owner: str):
+        await self.db.run(_store().release_sync, SYNC_STATE, owner)
+
+    async def prune_grants(self) -> int:
+        pruned = await self.db.run(_store().prune_grants, self._clock() - self.settings.max_staleness)
+        self.stats.grants_pruned += pruned
+        return pruned
+
+    async def sync(self, fetch: ChangesFetcher) -> int:
+        """Apply every change page from ``fetch`` after the stored cursor and return the items applied.
+
+        Changed rows are stamped with the time they were applied; rows the feed does not touch
+        keep their own write time and age out, so they are re-read from the upstream.
+        """
+        store = _store()
+        started = self._clock()
+        cursor = await self.load_sync_state()
+        applied = 0
+        while True:
+            payload, status_code = await fetch(cursor, self.settings.sync_batch_size)
+            if status_code in (404, 405, 501):
+                raise ChangeFeedUnsupported()
+            if status_code != 200:
+                raise RuntimeError(f"Change feed answered {status_code}")
+            companies = payload.get("companies") or []
+            users = payload.get("users") or []
+            links = payload.get("user_companies") or []
+            cursor = payload.get("next_cursor", cursor)
+            await self.db.run(store.apply_changes, SYNC_STATE, cursor, companies, users, links, self._clock())
+            applied += len(companies) + len(users) + len(links)
+            if not payload.get("has_more"):
+                break
+
+        await self.db.run(store.finish_sync, SYNC_STATE, cursor, started)
+        self.stats.sync_runs += 1
+        self.stats.sync_items += applied
+        return applied
+
+
+async def fetch_changes(cursor: Optional[str], limit: int):
+    params = {"limit": limit}
+    if cursor is not None:
+        params["cursor"] = cursor
+    response = await upstream.send(upstream.USER_SERVICE, "GET", f"{USER_SERVICE_URL}/sync/changes", params=params)
+    return response.json(), response.status_code
+
+
+class SyncJob:
+    """Runs ``ReadModel.sync`` every ``interval`` seconds until stopped.
+
+    Every worker starts the job, but a run only goes ahead in the process holding the lease on
+    the sync state row, so pre-forked workers do not all pull the same feed. The lease lasts a
+    few intervals and is renewed on each run; if its holder dies another worker takes over once
+    it lapses. The holder also prunes expired read grants.
+    """
+
+    LEASE_INTERVALS = 3
+
+    def __init__(self, model: ReadModel, fetch: ChangesFetcher = fetch_changes, interval: Optional[float] = None,
+                 owner: Optional[str] = None):
+        self.model = model
+        self.fetch = fetch
+        self.interval = model.settings.sync_interval if interval is None else interval
+        self.owner = owner
+        self._feed = True
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            # Resolved here rather than at import, so each forked worker gets its own pid
+            self.owner = self.owner or f"{socket.gethostname()}:{os.getpid()}"
+            self._feed = True
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                await self.model.release_sync(self.owner)
+            except Exception:
+                logger.exception("Releasing the read model sync lease failed")
+
+    async def run_once(self) -> bool:
+        """One run if this process holds the lease; False when another process does."""
+        if not await self.model.claim_sync(self.owner, self.interval * self.LEASE_INTERVALS):
+            self.model.stats.sync_skipped += 1
+            return False
+        await self.model.prune_grants()
+        if self._feed:
+            try:
+                await self.model.sync(self.fetch)
+            except ChangeFeedUnsupported:
+                logger.warning("The user service has no change feed; the read model is filled by write-through only")
+                self._feed = False
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.model.stats.sync_errors += 1
+                logger.exception("Read model sync failed")
+            await asyncio.sleep(self.interval)
+
+
+read_model = ReadModel(database.database)
+sync_job = SyncJob(read_model)
+
+
+async def startup():
+    if not read_model.enabled:
+        return
+    await read_model.db.create_all(_store().metadata)
+    await read_model.load_sync_state()
+    if read_model.settings.sync_enabled and sync_job.interval > 0:
+        sync_job.start()
+
+
+async def shutdown():
+    await sync_job.stop()
+
+
+def stats() -> Dict[str, dict]:
+    return {"read_model": asdict(read_model.stats)}
@@ -0,0 +1,153 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ..models.base import Base
+from ..models.read_model import Company, ReadGrant, SyncState, User, UserCompany
+
+metadata = Base.metadata
+
+
+def _upsert(session: Session, model, values: Dict[str, Any], update: Sequence[str]):
+    """Insert a row or update ``update`` columns of the existing one in one statement.
+
+    Concurrent write-throughs and the sync job write the same ids, so a read-then-insert would
+    race into primary key violations. Other dialects fall back to ``merge``.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        session.merge(model(**values))
+        return
+    statement = insert(model).values(**values)
+    session.execute(statement.on_conflict_do_update(
+        index_elements=[column.name for column in model.__table__.primary_key],
+        set_={name: statement.excluded[name] for name in update},
+    ))
+
+
+def put_company(session: Session, item: dict, now: float):
+    _upsert(session, Company, {"id": str(item["id"]), "data": item, "synced_at": now}, ("data", "synced_at"))
+
+
+def put_user(session: Session, item: dict, now: float):
+    values = {"id": str(item["id"]), "data": item, "document_type": item.get("document_type"),
+              "document_id": item.get("document_id"), "synced_at": now}
+    _upsert(session, User, values, ("data", "document_type", "document_id", "synced_at"))
+
+
+def put_user_companies(session: Session, user_id: str, companies: List[dict], document: Optional[tuple],
+                       now: float):
+    values = {"id": user_id, "companies_synced_at": now}
+    if document is not None:
+        values["document_type"], values["document_id"] = document
+    _upsert(session, User, values, [name for name in values if name != "id"])
+    session.execute(delete(UserCompany).where(UserCompany.user_id == user_id))
+    for position, item in enumerate(companies):
+        _upsert(session, UserCompany,
+                {"user_id": user_id, "company_id": str(item["id"]), "position": position, "data": item},
+                ("position", "data"))
+
+
+def grant(session: Session, principal: str, resource: str, resource_id: str, now: float):
+    _upsert(session, ReadGrant,
+            {"principal": principal, "resource": resource, "resource_id": resource_id, "granted_at": now},
+            ("granted_at",))
+
+
+def granted_at(session: Session, principal: str, resource: str, resource_id: str) -> Optional[float]:
+    row = session.get(ReadGrant, (principal, resource, resource_id))
+    return row.granted_at if row is not None else None
+
+
+def prune_grants(session: Session, before: float) -> int:
+    result = session.execute(delete(ReadGrant).where(ReadGrant.granted_at < before))
+    session.commit()
+    return result.rowcount
+
+
+def find_company(session: Session, company_id: str, principal: str) -> Optional[tuple]:
+    row = session.get(Company, company_id)
+    if row is None:
+        return None
+    return row.data, row.synced_at, granted_at(session, principal, "company", company_id)
+
+
+def find_user(session: Session, user_id: str, principal: str) -> Optional[tuple]:
+    row = session.get(User, user_id)
+    if row is None or row.data is None:
+        return None
+    return row.data, row.synced_at, granted_at(session, principal, "user", user_id)
+
+
+def find_user_companies(session: Session, principal: str, user_id: Optional[str],
+                        document: Optional[tuple]) -> Optional[tuple]:
+    if user_id is not None:
+        user = session.get(User, user_id)
+    else:
+        user = session.scalars(
+            select(User).where(User.document_type == document[0], User.document_id == document[1])
+        ).first()
+    if user is None or user.companies_synced_at is None:
+        return None
+    links = session.scalars(
+        select(UserCompany).where(UserCompany.user_id == user.id).order_by(UserCompany.position)
+    ).all()
+    return ({"user_id": user.id, "companies": [link.data for link in links]}, user.companies_synced_at,
+            granted_at(session, principal, "user_companies", user.id))
+
+
+def load_sync_state(session: Session, name: str) -> Tuple[Optional[str], Optional[float]]:
+    state = session.get(SyncState, name)
+    return (state.cursor, state.synced_at) if state is not None else (None, None)
+
+
+def apply_changes(session: Session, name: str, cursor: Optional[str], companies: List[dict], users: List[dict],
+                  links: List[dict], now: float):
+    for item in companies:
+        put_company(session, item, now)
+    for item in users:
+        put_user(session, item, now)
+    for item in links:
+        put_user_companies(session, str(item["user_id"]), item.get("companies") or [], None, now)
+    state = session.get(SyncState, name) or SyncState(name=name)
+    state.cursor = cursor
+    session.merge(state)
+    session.commit()
+
+
+def claim_sync(session: Session, name: str, owner: str, now: float, lease: float) -> bool:
+    """Take or renew the sync lease for ``owner``; False while another process holds it."""
+    claimed = session.execute(
+        update(SyncState)
+        .where(SyncState.name == name,
+               or_(SyncState.owner == owner, SyncState.lease_until.is_(None), SyncState.lease_until < now))
+        .values(owner=owner, lease_until=now + lease)
+    ).rowcount
+    if not claimed and session.get(SyncState, name) is None:
+        session.add(SyncState(name=name, owner=owner, lease_until=now + lease))
+        claimed = 1
+    try:
+        session.commit()
+    except IntegrityError:
+        # Another process created the row first
+        session.rollback()
+        return False
+    return bool(claimed)
+
+
+def release_sync(session: Session, name: str, owner: str):
+    session.execute(update(SyncState).where(SyncState.name == name, SyncState.owner == owner).values(lease_until=None))
+    session.commit()
+
+
+def finish_sync(session: Session, name: str, cursor: Optional[str], synced_at: float):
+    state = session.get(SyncState, name) or SyncState(name=name, cursor=cursor)
+    state.synced_at = synced_at
+    session.merge(state)
+    session.commit()
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from ..errors.errors import UpstreamBusy, UpstreamError, UpstreamTimeout, UpstreamUnavailable
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRYABLE_STATUS_CODES = frozenset({502, 503, 504})
+
+
+@dataclass(frozen=True)
+class ResiliencePolicy:
+    connect_timeout: float = 1.0
+    read_timeout: float = 5.0
+    pool_timeout: float = 1.0
+    retries: int = 2
+    backoff_base: float = 0.05
+    backoff_max: float = 1.0
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+    max_concurrency: int = 50
+    queue_timeout: float = 0.1
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            self.read_timeout, connect=self.connect_timeout, read=self.read_timeout, pool=self.pool_timeout
+        )
+
+
+@dataclass
+class ResilienceStats:
+    calls: int = 0
+    retries: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    short_circuited: int = 0
+    bulkhead_rejections: int = 0
+    circuit_opened: int = 0
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            # Let a single probe through; everyone else keeps failing fast
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        self._probing = False
+
+    def record_success(self):
+        self._state = self.CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self) -> bool:
+        """Record a failed call; return True if this opened the circuit."""
+        was_probe = self._probing
+        self._probing = False
+        self._failures += 1
+        if was_probe or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+            self._state = self.OPEN
+            self._opened_at = self._clock()
+            return True
+        return False
+
+
+class UpstreamGuard:
+    """Timeouts, retries, circuit breaker and bulkhead for one upstream."""
+
+    def __init__(self, name: str, policy: ResiliencePolicy, sleep=asyncio.sleep):
+        self.name = name
+        self.policy = policy
+        self.stats = ResilienceStats()
+        self.breaker = CircuitBreaker(policy.failure_threshold, policy.reset_timeout)
+        self._slots = asyncio.Semaphore(policy.max_concurrency)
+        self._sleep = sleep
+
+    def backoff(self, attempt: int) -> float:
+        # "Full jitter": spread retries uniformly so clients do not retry in lockstep
+        return random.uniform(0, min(self.policy.backoff_max, self.policy.backoff_base * 2 ** attempt))
+
+    async def call(self, request: Callable[[], Awaitable[httpx.Response]], idempotent: bool,
+                   hold_slot: bool = False) -> httpx.Response:
+        """Send ``request`` under the policy.
+
+        With ``hold_slot`` the bulkhead slot stays taken after the response is returned, for
+        streamed bodies that keep the connection busy; call ``release_slot`` once the body is closed.
+        """
+        self.stats.calls += 1
+        attempts = 1 + (self.policy.retries if idempotent else 0)
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            if not self.breaker.allow():
+                self.stats.short_circuited += 1
+                raise UpstreamUnavailable(f"Circuit open for upstream {self.name}")
+            try:
+                response = await self._send(request, hold_slot)
+            except httpx.TransportError as exc:
+                self._failed(exc)
+                if last_attempt:
+                    if isinstance(exc, httpx.TimeoutException):
+                        raise UpstreamTimeout(f"Upstream {self.name} timed out") from exc
+                    raise UpstreamError(f"Upstream {self.name} request failed: {exc!r}") from exc
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            else:
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                self._failed(None)
+                if last_attempt or response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+                try:
+                    await response.aclose()
+                finally:
+                    if hold_slot:
+                        self.release_slot()
+            self.stats.retries += 1
+            await self._sleep(self.backoff(attempt))
+
+    async def _send(self, request, hold_slot: bool = False) -> httpx.Response:
+        if not self._slots.locked():
+            await self._slots.acquire()
+        elif self.policy.queue_timeout <= 0:
+            self.stats.bulkhead_rejections += 1
+            raise UpstreamBusy(f"Too many concurrent calls to upstream {self.name}")
+        else:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.policy.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats.bulkhead_rejections += 1
+                raise UpstreamBusy(f"Too many concurrent calls to upstream {self.name}") from None
+        try:
+            response = await request()
+        except BaseException:
+            self._slots.release()
+            raise
+        if not hold_slot:
+            self._slots.release()
+        return response
+
+    def release_slot(self):
+        self._slots.release()
+
+    def _failed(self, exc: Optional[Exception]):
+        self.stats.failures += 1
+        if isinstance(exc, httpx.TimeoutException):
+            self.stats.timeouts += 1
+        if self.breaker.record_failure():
+            self.stats.circuit_opened += 1
+            logger.warning("Circuit opened for upstream %s", self.name)
+
+
+def stats(guards: Dict[str, UpstreamGuard]) -> Dict[str, Dict[str, object]]:
+    return {name: {**asdict(guard.stats), "circuit": guard.breaker.state} for name, guard in guards.items()}
@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+from typing import Any, Type
+
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+FAST_JSON = os.getenv("FAST_JSON", "true").strip().lower() in ("1", "true", "yes", "on")
+
+
+def fast_json_enabled() -> bool:
+    return FAST_JSON and orjson is not None
+
+
+def default_response_class() -> Type[Response]:
+    """ORJSONResponse when fast JSON is enabled and orjson is installed, else FastAPI's JSONResponse."""
+    if FAST_JSON and orjson is None:
+        logger.info("orjson is not installed; using the standard JSON response class")
+    return ORJSONResponse if fast_json_enabled() else JSONResponse
+
+
+def dumps(data: Any) -> bytes:
+    """Serialize plain data, including UUIDs and dates, to compact JSON bytes."""
+    if fast_json_enabled():
+        return orjson.dumps(data)
+    return to_json(data)
+
+
+def loads(raw: bytes) -> Any:
+    if fast_json_enabled():
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def json_response(data: Any, status_code: int = 200) -> Response:
+    return Response(content=dumps(data), status_code=status_code, media_type="application/json")
+
+
+def model_response(model: Type[BaseModel], data: Any, status_code: int = 200, trusted: bool = False) -> Response:
+    """Render ``data`` as ``model`` with a single validation pass.
+
+    Returning a ``Response`` bypasses FastAPI's ``response_model`` handling, which would
+    otherwise validate the data again and serialize it through ``jsonable_encoder``.
+    Data from trusted upstreams is not validated at all, so it is sent without the
+    field filtering the model would apply.
+    """
+    if trusted:
+        return json_response(data.model_dump(mode="json") if isinstance(data, BaseModel) else data, status_code)
+    instance = data if isinstance(data, model) else model.model_validate(data)
+    return Response(content=instance.model_dump_json().encode(), status_code=status_code, media_type="application/json")
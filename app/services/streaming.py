@@ -0,0 +1,193 @@
+import os
+import re
+from contextlib import AsyncExitStack
+from typing import Any, AsyncContextManager, AsyncIterator, Callable, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from . import serialization
+
+NDJSON = "application/x-ndjson"
+
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "65536"))
+STREAM_MAX_ITEM_BYTES = int(os.getenv("STREAM_MAX_ITEM_BYTES", "1048576"))
+
+Transform = Callable[[Any], Optional[Any]]
+
+# Bytes that can change the structure: outside strings all of them, inside strings only '"' and '\'
+_TOKENS = re.compile(rb'[\[\]{},"\\]')
+_OPEN = frozenset(b"[{")
+_CLOSE = frozenset(b"]}")
+_QUOTE, _BACKSLASH, _COMMA, _BRACKET = ord('"'), ord("\\"), ord(","), ord("[")
+
+
+class JsonArraySplitter:
+    """Incrementally cut the raw items out of a JSON array as bytes arrive.
+
+    The array is either the document root or the value of ``key`` in a root object, so
+    both ``[...]`` and ``{"incidents": [...]}`` bodies are handled. Only the item being
+    assembled is buffered; ``max_item_bytes`` bounds that buffer.
+    """
+
+    def __init__(self, key: Optional[str] = None, max_item_bytes: int = STREAM_MAX_ITEM_BYTES):
+        self.key = key.encode() if key is not None else None
+        self.max_item_bytes = max_item_bytes
+        self.done = False
+        self._buffer = bytearray()
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_start: Optional[int] = None
+        self._last_string: Optional[bytes] = None
+        self._item_depth: Optional[int] = None
+        self._item_start = 0
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        buffer = self._buffer
+        buffer += chunk
+        items: List[bytes] = []
+        pos = self._pos
+        while not self.done:
+            match = _TOKENS.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            index = match.start()
+            token = buffer[index]
+            pos = index + 1
+            if self._in_string:
+                if token == _BACKSLASH:
+                    if index + 1 >= len(buffer):
+                        pos = index
+                        break
+                    pos = index + 2
+                elif token == _QUOTE:
+                    self._in_string = False
+                    if self._string_start is not None:
+                        self._last_string = bytes(buffer[self._string_start:index])
+                        self._string_start = None
+            elif token == _QUOTE:
+                self._in_string = True
+                # Only strings directly inside the root object can name the array
+                if self._depth == 1 and self._item_depth is None:
+                    self._string_start = index + 1
+            elif token in _OPEN:
+                if token == _BRACKET and self._item_depth is None and (
+                    self._depth == 0 or (self._depth == 1 and self.key is not None and self._last_string == self.key)
+                ):
+                    self._item_depth = self._depth + 1
+                    self._item_start = index + 1
+                self._depth += 1
+            elif token in _CLOSE:
+                self._depth -= 1
+                if self._item_depth is not None and self._depth == self._item_depth - 1:
+                    self._emit(buffer, index, items)
+                    self.done = True
+            elif token == _COMMA and self._depth == self._item_depth:
+                self._emit(buffer, index, items)
+                self._item_start = index + 1
+
+        self._pos = pos
+        self._compact()
+        return items
+
+    def _emit(self, buffer: bytearray, end: int, items: List[bytes]):
+        raw = bytes(buffer[self._item_start:end]).strip()
+        if raw:
+            items.append(raw)
+
+    def _compact(self):
+        if self.done:
+            self._buffer.clear()
+            self._pos = 0
+            return
+        if self._item_depth is not None:
+            cut = self._item_start
+        elif self._string_start is not None:
+            cut = self._string_start
+        else:
+            cut = self._pos
+        if cut:
+            del self._buffer[:cut]
+            self._pos -= cut
+            self._item_start = max(0, self._item_start - cut)
+            if self._string_start is not None:
+                self._string_start -= cut
+        if len(self._buffer) > self.max_item_bytes:
+            raise ValueError(f"Streamed item larger than {self.max_item_bytes} bytes")
+
+
+def wants_ndjson(accept: Optional[str]) -> bool:
+    return bool(accept) and NDJSON in accept
+
+
+async def ndjson_lines(response: httpx.Response, key: Optional[str] = None, transform: Optional[Transform] = None,
+                       chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Re-encode the items of a streamed JSON array as NDJSON, one output chunk per upstream chunk.
+
+    ``transform`` may project an item or drop it by returning None.
+    """
+    splitter = JsonArraySplitter(key)
+    async for chunk in response.aiter_bytes(chunk_size):
+        lines = []
+        for raw in splitter.feed(chunk):
+            item = serialization.loads(raw)
+            if transform is not None:
+                item = transform(item)
+                if item is None:
+                    continue
+            lines.append(serialization.dumps(item))
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+
+async def open_stream(context: AsyncContextManager[httpx.Response]) -> Tuple[httpx.Response, AsyncExitStack]:
+    """Enter an ``upstream.stream`` context whose lifetime outlives the route handler."""
+    stack = AsyncExitStack()
+    response = await stack.enter_async_context(context)
+    return response, stack
+
+
+async def raise_for_upstream(response: httpx.Response, stack: AsyncExitStack):
+    """Close the stream and raise an HTTPException carrying the upstream error body."""
+    try:
+        body = await response.aread()
+    finally:
+        await stack.aclose()
+    try:
+        detail = serialization.loads(body) if body else None
+    except ValueError:
+        detail = body.decode(errors="replace")
+    raise HTTPException(status_code=response.status_code, detail=detail)
+
+
+async def _closing(body: AsyncIterator[bytes], stack: AsyncExitStack) -> AsyncIterator[bytes]:
+    # Cancelled by Starlette when the client disconnects; closing the stack aborts the upstream read
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        await stack.aclose()
+
+
+def streaming_response(body: AsyncIterator[bytes], stack: AsyncExitStack, media_type: str) -> StreamingResponse:
+    return StreamingResponse(_closing(body, stack), media_type=media_type)
+
+
+async def proxy(context: AsyncContextManager[httpx.Response], ndjson: bool, key: Optional[str] = None,
+                transform: Optional[Transform] = None) -> StreamingResponse:
+    """Stream an upstream list response to the client.
+
+    With ``ndjson`` the items of the array (at the root or under ``key``) are re-encoded one
+    per line after ``transform``; otherwise the upstream bytes are forwarded as they arrive.
+    Upstream errors are raised as ``HTTPException`` before any byte is sent.
+    """
+    response, stack = await open_stream(context)
+    if response.status_code != 200:
+        await raise_for_upstream(response, stack)
+    if ndjson:
+        return streaming_response(ndjson_lines(response, key, transform), stack, NDJSON)
+    media_type = response.headers.get("content-type", "application/json")
+    return streaming_response(response.aiter_bytes(STREAM_CHUNK_SIZE), stack, media_type)
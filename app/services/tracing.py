@@ -0,0 +1,275 @@
+import abc
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT = "traceparent"
+
+
+class Span:
+    """A timed unit of work. Unsampled spans keep their ids for propagation but record nothing."""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "sampled",
+                 "start_ns", "end_ns", "attributes", "status")
+
+    def __init__(self, name: str, kind: str, trace_id: str, span_id: str, parent_id: Optional[str],
+                 sampled: bool, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes or {}) if sampled else {}
+        self.status = "ok"
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def set_attribute(self, key: str, value: Any):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException):
+        self.status = "error"
+        self.set_attribute("exception.type", type(exc).__name__)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration * 1000,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class SpanExporter(abc.ABC):
+    @abc.abstractmethod
+    def export(self, span: Span):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+
+class NoopExporter(SpanExporter):
+    def export(self, span: Span):
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """Keeps finished spans in a list; meant for tests."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def clear(self):
+        self.spans.clear()
+
+
+class FileExporter(SpanExporter):
+    """Appends one JSON object per finished span to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """Return ``(trace_id, parent_span_id, sampled)`` from a W3C traceparent header, or None if invalid."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    version, trace_id, span_id, flags = parts[:4]
+    try:
+        int(trace_id, 16), int(span_id, 16)
+        sampled = bool(int(flags, 16) & 0x01)
+    except ValueError:
+        return None
+    if version == "ff" or trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id.lower(), span_id.lower(), sampled
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+class Tracer:
+    """Creates spans, applies ratio sampling to new traces and hands sampled spans to the exporter.
+
+    Traces started by a caller keep the caller's sampling decision so a trace is never half recorded.
+    """
+
+    def __init__(self, exporter: Optional[SpanExporter] = None, sample_ratio: float = 1.0):
+        self.exporter = exporter
+        self.sample_ratio = max(0.0, min(1.0, sample_ratio))
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def _should_sample(self, trace_id: str) -> bool:
+        # Deterministic on the trace id so every hop of a trace takes the same decision
+        return int(trace_id[16:], 16) < self.sample_ratio * (1 << 64)
+
+    def _new_span(self, name: str, kind: str, parent: Optional[Tuple[str, str, bool]],
+                  attributes: Optional[Dict[str, Any]]) -> Span:
+        if parent is None:
+            trace_id = f"{random.getrandbits(128):032x}"
+            parent_id, sampled = None, self._should_sample(trace_id)
+        else:
+            trace_id, parent_id, sampled = parent
+        return Span(name, kind, trace_id, f"{random.getrandbits(64):016x}", parent_id, sampled, attributes)
+
+    @contextmanager
+    def start_span(self, name: str, kind: str = "internal", traceparent: Optional[str] = None,
+                   attributes: Optional[Dict[str, Any]] = None, activate: bool = True) -> Iterator[Optional[Span]]:
+        """Run the block inside a new span, a child of ``traceparent`` or of the current span.
+
+        With ``activate`` the span becomes the current span for the block. Pass ``activate=False``
+        for spans that may end in another task, such as a streamed upstream response closed by
+        the response task. Yields None when tracing is disabled.
+        """
+        if not self.enabled:
+            yield None
+            return
+        parent = parse_traceparent(traceparent)
+        if parent is None:
+            active = _current_span.get()
+            if active is not None:
+                parent = (active.trace_id, active.span_id, active.sampled)
+        span = self._new_span(name, kind, parent, attributes)
+        token = _current_span.set(span) if activate else None
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            if token is not None:
+                _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            if span.sampled:
+                try:
+                    self.exporter.export(span)
+                except Exception:
+                    logger.exception("Failed to export span %s", span.name)
+
+
+def inject(span: Optional[Span], headers: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    """Return a copy of ``headers`` carrying the span's trace context."""
+    if span is None:
+        return headers
+    return {**(headers or {}), TRACEPARENT: span.traceparent}
+
+
+def exporter_from_env() -> Optional[SpanExporter]:
+    kind = os.getenv("TRACING_EXPORTER", "none").lower()
+    if kind == "none":
+        return None
+    if kind == "memory":
+        return InMemoryExporter()
+    if kind == "file":
+        return FileExporter(os.getenv("TRACING_FILE", "traces.jsonl"))
+    if kind == "noop":
+        return NoopExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER {kind!r}")
+
+
+tracer = Tracer(exporter_from_env(), float(os.getenv("TRACING_SAMPLE_RATIO", "0.1")))
+
+
+def configure(exporter: Optional[SpanExporter], sample_ratio: float = 1.0) -> Tracer:
+    """Swap the exporter and sampling ratio of the module tracer, e.g. for tests."""
+    if tracer.exporter is not None and tracer.exporter is not exporter:
+        tracer.exporter.shutdown()
+    tracer.exporter = exporter
+    tracer.sample_ratio = max(0.0, min(1.0, sample_ratio))
+    return tracer
+
+
+def shutdown():
+    if tracer.exporter is not None:
+        tracer.exporter.shutdown()
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per request, named after the matched route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope.get("headers", ()):
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        with tracer.start_span(f"{scope['method']} {scope['path']}", kind="server", traceparent=traceparent,
+                               attributes={"http.method": scope["method"], "http.target": scope["path"]}) as span:
+            response_size = 0
+
+            async def send_wrapper(message):
+                nonlocal response_size
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.status = "error"
+                elif message["type"] == "http.response.body":
+                    response_size += len(message.get("body", b""))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route is not None:
+                    span.name = f"{scope['method']} {route}"
+                    span.set_attribute("http.route", route)
+                span.set_attribute("http.response_size", response_size)
@@ -0,0 +1,243 @@
+import logging
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Union
+
+import httpx
+
+from . import metrics, resilience, tracing
+
+logger = logging.getLogger(__name__)
+
+USER_SERVICE = "user"
+INCIDENT_QUERY = "incident_query"
+INCIDENT_MANAGEMENT = "incident_management"
+
+UPSTREAMS = (USER_SERVICE, INCIDENT_QUERY, INCIDENT_MANAGEMENT)
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_transports: Dict[str, httpx.AsyncBaseTransport] = {}
+_guards: Dict[str, resilience.UpstreamGuard] = {}
+# observer(upstream, seconds, status), where status is the HTTP status or the exception name
+_observers: List[Callable[[str, float, Union[int, str]], None]] = []
+
+
+@dataclass(frozen=True)
+class UpstreamSettings:
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry: float
+    http2: bool
+    trusted: bool
+
+
+def _env(upstream: str, name: str, default: str) -> str:
+    # UPSTREAM_USER_MAX_CONNECTIONS overrides UPSTREAM_MAX_CONNECTIONS
+    specific = os.getenv(f"UPSTREAM_{upstream.upper()}_{name}")
+    if specific is not None:
+        return specific
+    return os.getenv(f"UPSTREAM_{name}", default)
+
+
+def _env_bool(upstream: str, name: str, default: str) -> bool:
+    return _env(upstream, name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def load_settings(upstream: str) -> UpstreamSettings:
+    return UpstreamSettings(
+        max_connections=int(_env(upstream, "MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(_env(upstream, "MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(_env(upstream, "KEEPALIVE_EXPIRY", "30")),
+        http2=_env_bool(upstream, "HTTP2", "false"),
+        trusted=_env_bool(upstream, "TRUSTED", "false"),
+    )
+
+
+def is_trusted(upstream: str) -> bool:
+    """Whether responses from ``upstream`` may be returned without re-validating them."""
+    return load_settings(upstream).trusted
+
+
+def load_policy(upstream: str) -> resilience.ResiliencePolicy:
+    return resilience.ResiliencePolicy(
+        connect_timeout=float(_env(upstream, "CONNECT_TIMEOUT", "1")),
+        read_timeout=float(_env(upstream, "READ_TIMEOUT", "5")),
+        pool_timeout=float(_env(upstream, "POOL_TIMEOUT", "1")),
+        retries=int(_env(upstream, "RETRIES", "2")),
+        backoff_base=float(_env(upstream, "RETRY_BACKOFF", "0.05")),
+        backoff_max=float(_env(upstream, "RETRY_MAX_BACKOFF", "1")),
+        failure_threshold=int(_env(upstream, "BREAKER_FAILURE_THRESHOLD", "5")),
+        reset_timeout=float(_env(upstream, "BREAKER_RESET_TIMEOUT", "30")),
+        max_concurrency=int(_env(upstream, "MAX_CONCURRENCY", "50")),
+        queue_timeout=float(_env(upstream, "QUEUE_TIMEOUT", "0.1")),
+    )
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client(upstream: str) -> httpx.AsyncClient:
+    settings = load_settings(upstream)
+    http2 = settings.http2
+    if http2 and not _http2_available():
+        logger.warning("HTTP/2 requested for upstream %s but the 'h2' package is not installed; using HTTP/1.1", upstream)
+        http2 = False
+    limits = httpx.Limits(
+        max_connections=settings.max_connections,
+        max_keepalive_connections=settings.max_keepalive_connections,
+        keepalive_expiry=settings.keepalive_expiry,
+    )
+    return httpx.AsyncClient(limits=limits, http2=http2, transport=_transports.get(upstream))
+
+
+def set_transport(upstream: str, transport: Optional[httpx.AsyncBaseTransport]):
+    """Route an upstream through a custom transport (fakes in tests and benchmarks)."""
+    if transport is None:
+        _transports.pop(upstream, None)
+    else:
+        _transports[upstream] = transport
+
+
+async def startup():
+    for name in UPSTREAMS:
+        if name not in _clients:
+            _clients[name] = _build_client(name)
+
+
+async def shutdown():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def after_fork():
+    """Forget clients inherited from a parent process; their pooled connections belong to it."""
+    _clients.clear()
+
+
+def get_guard(upstream: str) -> resilience.UpstreamGuard:
+    guard = _guards.get(upstream)
+    if guard is None:
+        guard = _guards[upstream] = resilience.UpstreamGuard(upstream, load_policy(upstream))
+    return guard
+
+
+def reset_guards():
+    _guards.clear()
+
+
+def guard_stats():
+    return resilience.stats(_guards)
+
+
+def add_observer(observer: Callable[[str, float, Union[int, str]], None]):
+    """Call ``observer`` with the latency and outcome of every upstream call."""
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+def get_client(upstream: str) -> httpx.AsyncClient:
+    client = _clients.get(upstream)
+    if client is None:
+        # Routers mounted without the application lifespan (e.g. in tests)
+        client = _clients[upstream] = _build_client(upstream)
+    return client
+
+
+class _Observation:
+    """Outcome of one logical upstream call, filled in by ``send``/``stream``."""
+
+    __slots__ = ("response", "response_size")
+
+    def __init__(self):
+        self.response: Optional[httpx.Response] = None
+        self.response_size: Optional[int] = None
+
+
+@contextmanager
+def _observe(upstream: str, method: str, url: str, kwargs: dict, activate: bool = True) -> Iterator[_Observation]:
+    # Latency histogram, in-flight gauge and a client span carrying the trace context
+    observation = _Observation()
+    status = "error"
+    metrics.UPSTREAM_IN_FLIGHT.inc(upstream)
+    started = time.perf_counter()
+    with tracing.tracer.start_span(f"{method} {upstream}", kind="client", attributes={
+        "upstream": upstream, "http.method": method, "http.url": str(url),
+    }, activate=activate) as span:
+        kwargs["headers"] = tracing.inject(span, kwargs.get("headers"))
+        try:
+            yield observation
+            if observation.response is not None:
+                status = observation.response.status_code
+        except Exception as exc:
+            status = type(exc).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.UPSTREAM_IN_FLIGHT.dec(upstream)
+            metrics.UPSTREAM_LATENCY.observe(elapsed, upstream, method, status)
+            for observer in _observers:
+                observer(upstream, elapsed, status)
+            if span is not None and observation.response is not None:
+                span.set_attribute("http.status_code", observation.response.status_code)
+                span.set_attribute("http.request_size", len(observation.response.request.content))
+                span.set_attribute("http.response_size", observation.response_size)
+                if observation.response.status_code >= 500:
+                    span.status = "error"
+
+
+def _prepare(upstream: str, method: str, idempotent: Optional[bool], kwargs: dict):
+    guard = get_guard(upstream)
+    if idempotent is None:
+        idempotent = method in resilience.IDEMPOTENT_METHODS
+    kwargs.setdefault("timeout", guard.policy.timeout)
+    return get_client(upstream), guard, idempotent
+
+
+async def send(upstream: str, method: str, url: str, idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+    """Send a request through the upstream's pooled client and resilience policy.
+
+    Only idempotent requests are retried; pass ``idempotent=True`` for POSTs that
+    are reads. Raises an ``UpstreamError`` subclass when the upstream cannot be reached.
+    """
+    method = method.upper()
+    client, guard, idempotent = _prepare(upstream, method, idempotent, kwargs)
+    with _observe(upstream, method, url, kwargs) as observation:
+        response = await guard.call(lambda: client.request(method, url, **kwargs), idempotent)
+        observation.response = response
+        observation.response_size = len(response.content)
+        return response
+
+
+@asynccontextmanager
+async def stream(upstream: str, method: str, url: str, idempotent: Optional[bool] = None,
+                 **kwargs) -> AsyncIterator[httpx.Response]:
+    """Like ``send`` but without reading the body; iterate it inside the ``async with`` block.
+
+    The upstream connection, and its bulkhead slot, are released when the block exits,
+    including when the task consuming it is cancelled because the client went away. Retries
+    and the circuit breaker only cover the call up to the response headers.
+    """
+    method = method.upper()
+    client, guard, idempotent = _prepare(upstream, method, idempotent, kwargs)
+    # The block is usually left by the response task, not the task that entered it
+    with _observe(upstream, method, url, kwargs, activate=False) as observation:
+        request = client.build_request(method, url, **kwargs)
+        response = await guard.call(lambda: client.send(request, stream=True), idempotent, hold_slot=True)
+        observation.response = response
+        try:
+            yield response
+        finally:
+            observation.response_size = response.num_bytes_downloaded
+            try:
+                await response.aclose()
+            finally:
+                guard.release_slot()
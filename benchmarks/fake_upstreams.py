@@ -0,0 +1,142 @@
+import asyncio
+import json
+import random
+from datetime import date, datetime
+from typing import Callable, Dict, Optional, Tuple
+from uuid import uuid5, NAMESPACE_URL
+
+import httpx
+
+Handler = Callable[[httpx.Request, bytes], Tuple[int, object]]
+
+
+def company(company_id: str) -> dict:
+    return {
+        "id": company_id,
+        "name": "Benchmark Company",
+        "first_name": "John",
+        "last_name": "Doe",
+        "birth_date": date(1990, 1, 1).isoformat(),
+        "phone_number": "+57 300 123 4567",
+        "country": "Colombia",
+        "city": "Bogota",
+        "username": "company@example.com",
+    }
+
+
+def user(user_id: str) -> dict:
+    return {
+        "id": user_id,
+        "username": "user@example.com",
+        "first_name": "Jane",
+        "last_name": "Doe",
+        "document_id": "123456789",
+        "document_type": "CC",
+        "birth_date": date(1992, 5, 17).isoformat(),
+        "phone_number": "+57 300 765 4321",
+        "importance": 3,
+        "allow_call": True,
+        "allow_sms": True,
+        "allow_email": False,
+        "registration_date": datetime(2024, 1, 1, 12, 0).isoformat(),
+    }
+
+
+def user_companies(user_id: str, count: int) -> dict:
+    return {
+        "user_id": user_id,
+        "companies": [
+            {"id": str(uuid5(NAMESPACE_URL, f"company-{index}")), "name": f"Company {index}"}
+            for index in range(count)
+        ],
+    }
+
+
+def incidents(count: int) -> list:
+    return [
+        {
+            "id": str(uuid5(NAMESPACE_URL, f"incident-{index}")),
+            "description": f"Incident number {index} reported through the benchmark",
+            "state": "open" if index % 3 else "closed",
+            "creation_date": datetime(2024, 2, 1, 10, index % 60).isoformat(),
+        }
+        for index in range(count)
+    ]
+
+
+class FakeUpstream(httpx.AsyncBaseTransport):
+    """In-process stand-in for an upstream service with configurable latency and error rate."""
+
+    def __init__(self, handler: Handler, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.handler = handler
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        body = await request.aread()
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.errors += 1
+            return httpx.Response(503, json={"detail": "Injected failure"})
+        status_code, payload = self.handler(request, body)
+        return httpx.Response(status_code, content=json.dumps(payload).encode(),
+                              headers={"Content-Type": "application/json"})
+
+
+def user_service_handler(companies_per_user: int = 5) -> Handler:
+    def handle(request: httpx.Request, body: bytes):
+        path = request.url.path.rstrip("/")
+        segments = path.split("/")
+        if request.method == "POST" and path.endswith("/company/bulk"):
+            return 200, [company(company_id) for company_id in json.loads(body)["ids"]]
+        if request.method == "POST" and path.endswith("/user/bulk"):
+            return 200, [user(user_id) for user_id in json.loads(body)["ids"]]
+        if request.method == "POST" and path.endswith("/company"):
+            created = json.loads(body)
+            created.pop("password", None)
+            return 201, {**created, "id": str(uuid5(NAMESPACE_URL, created["username"]))}
+        if request.method == "GET" and "company" in segments:
+            return 200, company(segments[-1])
+        if request.method == "POST" and path.endswith(("/companies", "/companies-user")):
+            payload = json.loads(body)
+            user_id = payload.get("id") or str(uuid5(NAMESPACE_URL, payload.get("document_id", "")))
+            return 200, user_companies(user_id, companies_per_user)
+        if request.method == "GET" and "user" in segments:
+            return 200, user(segments[-1])
+        return 404, {"detail": f"No fake route for {request.method} {path}"}
+
+    return handle
+
+
+def incident_query_handler(incidents_per_user: int = 20) -> Handler:
+    def handle(request: httpx.Request, body: bytes):
+        if request.url.path.endswith("/user-company"):
+            return 200, incidents(incidents_per_user)
+        return 404, {"detail": "Not found"}
+
+    return handle
+
+
+def incident_management_handler() -> Handler:
+    def handle(request: httpx.Request, body: bytes):
+        payload = json.loads(body) if body else {}
+        return 201, {"id": str(uuid5(NAMESPACE_URL, json.dumps(payload, sort_keys=True))), **payload}
+
+    return handle
+
+
+def build_fakes(latency: float, jitter: float, error_rate: float, seed: int = 0,
+                companies_per_user: int = 5, incidents_per_user: int = 20) -> Dict[str, FakeUpstream]:
+    return {
+        "user": FakeUpstream(user_service_handler(companies_per_user), latency, jitter, error_rate, seed),
+        "incident_query": FakeUpstream(incident_query_handler(incidents_per_user), latency, jitter, error_rate, seed + 1),
+        "incident_management": FakeUpstream(incident_management_handler(), latency, jitter, error_rate, seed + 2),
+    }
@@ -0,0 +1,248 @@
+"""Load test and latency benchmark for the gateway against in-process fake upstreams.
+
+    python -m benchmarks.run --requests 2000 --concurrency 64 --latency-ms 5 --output bench_results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, List, Optional
+from uuid import uuid5, NAMESPACE_URL
+
+import httpx
+
+from .fake_upstreams import build_fakes
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: Callable[[int], str]
+    body: Optional[Callable[[int], dict]] = None
+
+
+def _company_id(index: int, hot_keys: int) -> str:
+    return str(uuid5(NAMESPACE_URL, f"bench-company-{index % hot_keys}"))
+
+
+def _user_id(index: int, hot_keys: int) -> str:
+    return str(uuid5(NAMESPACE_URL, f"bench-user-{index % hot_keys}"))
+
+
+def build_scenarios(hot_keys: int) -> Dict[str, Scenario]:
+    def company_create(index):
+        return {
+            "username": f"bench{index}@example.com",
+            "password": "benchmark-password",
+            "first_name": "John",
+            "last_name": "Doe",
+            "name": "Benchmark Company",
+            "birth_date": date(1990, 1, 1).isoformat(),
+            "phone_number": "+57 300 123 4567",
+            "country": "Colombia",
+            "city": "Bogota",
+        }
+
+    scenarios = [
+        Scenario("health", "GET", lambda i: "/user-management/health"),
+        Scenario("company_get", "GET", lambda i: f"/user-management/company/{_company_id(i, hot_keys)}"),
+        Scenario("company_create", "POST", lambda i: "/user-management/company/", company_create),
+        Scenario("company_batch", "POST", lambda i: "/user-management/company/batch",
+                 lambda i: {"ids": [_company_id(i + offset, hot_keys) for offset in range(10)]}),
+        Scenario("user_batch", "POST", lambda i: "/user-management/user/batch",
+                 lambda i: {"ids": [_user_id(i + offset, hot_keys) for offset in range(10)]}),
+        Scenario("user_companies", "POST", lambda i: "/user-management/user/companies",
+                 lambda i: {"document_type": "CC", "document_id": str(i % hot_keys)}),
+        Scenario("user_companies_user", "POST", lambda i: "/user-management/user/companies-user",
+                 lambda i: {"id": _user_id(i, hot_keys)}),
+        Scenario("users_view", "POST", lambda i: "/user-management/user/users-view",
+                 lambda i: {"user_id": _user_id(i, hot_keys), "company_id": _company_id(i, hot_keys)}),
+    ]
+    return {scenario.name: scenario for scenario in scenarios}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+async def drive(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for index in counter:
+            body = scenario.body(index) if scenario.body else None
+            started = time.perf_counter()
+            response = await client.request(scenario.method, scenario.path(index), json=body)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    blocks_before = sys.getallocatedblocks()
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    blocks_after = sys.getallocatedblocks()
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        "endpoint": scenario.name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "duration_s": elapsed,
+        "rps": requests / elapsed if elapsed else 0.0,
+        # Client, gateway and fake upstreams share the process, so this is an upper bound
+        "cpu_ms_per_request": 1000 * cpu / requests if requests else 0.0,
+        "latency_ms": {
+            "mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": 1000 * percentile(latencies, 0.50),
+            "p95": 1000 * percentile(latencies, 0.95),
+            "p99": 1000 * percentile(latencies, 0.99),
+            "max": 1000 * latencies[-1] if latencies else 0.0,
+        },
+        "allocated_blocks_delta": blocks_after - blocks_before,
+    }
+
+
+async def run_benchmark(config: dict) -> dict:
+    # Imported here so environment overrides applied by main() are seen at import time
+    from app.main import app
+    from app.services import cache, serialization, upstream
+
+    fakes = build_fakes(
+        latency=config["latency_ms"] / 1000,
+        jitter=config["jitter_ms"] / 1000,
+        error_rate=config["error_rate"],
+        seed=config["seed"],
+        companies_per_user=config["companies_per_user"],
+        incidents_per_user=config["incidents_per_user"],
+    )
+    for name, fake in fakes.items():
+        upstream.set_transport(name, fake)
+    upstream.reset_guards()
+    await upstream.shutdown()
+
+    scenarios = build_scenarios(config["hot_keys"])
+    selected = config["endpoints"] or list(scenarios)
+    results = []
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+                for name in selected:
+                    for cache_name in ("company", "user"):
+                        await cache.get_cache(cache_name).clear()
+                    scenario = scenarios[name]
+                    await drive(client, scenario, min(config["warmup"], config["requests"]), config["concurrency"])
+                    if config["trace_allocations"]:
+                        tracemalloc.start()
+                    result = await drive(client, scenario, config["requests"], config["concurrency"])
+                    if config["trace_allocations"]:
+                        _, peak = tracemalloc.get_traced_memory()
+                        tracemalloc.stop()
+                        result["traced_peak_bytes"] = peak
+                    results.append(result)
+    finally:
+        for name in fakes:
+            upstream.set_transport(name, None)
+        upstream.reset_guards()
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "git_revision": _git_revision(),
+            "fast_json": serialization.fast_json_enabled(),
+            "config": config,
+        },
+        "upstreams": {name: {"requests": fake.requests, "injected_errors": fake.errors} for name, fake in fakes.items()},
+        "results": results,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="fake upstream base latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra fake upstream latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls answered with 503")
+    parser.add_argument("--hot-keys", type=int, default=200, help="distinct company/user ids requested")
+    parser.add_argument("--companies-per-user", type=int, default=5)
+    parser.add_argument("--incidents-per-user", type=int, default=20)
+    parser.add_argument("--endpoints", default="", help="comma separated subset of endpoints")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-allocations", action="store_true", help="report tracemalloc peak (slower)")
+    parser.add_argument("--no-cache", action="store_true", help="disable the company and user response caches")
+    parser.add_argument("--no-fast-json", action="store_true", help="use the standard JSON response class")
+    parser.add_argument("--trusted-upstreams", action="store_true", help="skip re-validating upstream payloads")
+    parser.add_argument("--no-compression", action="store_true", help="send responses uncompressed")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args(argv)
+    config = vars(args)
+    config["endpoints"] = [name for name in args.endpoints.split(",") if name]
+    return config
+
+
+def format_table(report: dict) -> str:
+    lines = [f"{'endpoint':<22}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'cpu ms':>10}"
+             f"{'errors':>8}{'blocks':>10}"]
+    for result in report["results"]:
+        latency = result["latency_ms"]
+        lines.append(
+            f"{result['endpoint']:<22}{result['rps']:>10.1f}{latency['p50']:>10.2f}{latency['p95']:>10.2f}"
+            f"{latency['p99']:>10.2f}{result['cpu_ms_per_request']:>10.3f}{result['errors']:>8}"
+            f"{result['allocated_blocks_delta']:>10}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    config = parse_args(argv)
+    if config["no_cache"]:
+        os.environ["COMPANY_CACHE_TTL"] = "0"
+        os.environ["USER_CACHE_TTL"] = "0"
+    if config["no_fast_json"]:
+        os.environ["FAST_JSON"] = "false"
+    if config["trusted_upstreams"]:
+        os.environ["UPSTREAM_TRUSTED"] = "true"
+    if config["no_compression"]:
+        os.environ["COMPRESSION_ENABLED"] = "false"
+    report = asyncio.run(run_benchmark(config))
+    with open(config["output"], "w") as output:
+        json.dump(report, output, indent=2)
+    print(format_table(report))
+    print(f"\nResults written to {config['output']}")
+
+
+if __name__ == "__main__":
+    main()
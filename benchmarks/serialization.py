@@ -0,0 +1,88 @@
+"""CPU cost of rendering upstream payloads through FastAPI's response_model versus the fast paths.
+
+    python -m benchmarks.serialization --iterations 5000
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict, List
+from uuid import uuid4
+
+from fastapi.responses import JSONResponse
+from fastapi.utils import create_model_field
+
+from app.schemas.user import CompanyResponse, UserView
+from app.services import serialization
+
+from .fake_upstreams import company, incidents, user, user_companies
+
+
+def payloads(incident_count: int) -> Dict[str, tuple]:
+    user_id = str(uuid4())
+    view = {
+        **user(user_id),
+        "incidents": incidents(incident_count),
+        "companies": user_companies(user_id, 5)["companies"],
+        "unavailable": [],
+    }
+    return {
+        "company": (CompanyResponse, json.dumps(company(str(uuid4()))).encode()),
+        "users_view": (UserView, json.dumps(view).encode()),
+    }
+
+
+def response_model_path(model) -> Callable[[bytes], bytes]:
+    field = create_model_field("response", model)
+
+    def render(raw: bytes) -> bytes:
+        # The steps fastapi.routing.serialize_response takes for a dict returned by an async route
+        value, _ = field.validate(json.loads(raw), {}, loc=("response",))
+        return JSONResponse(field.serialize(value, by_alias=True)).body
+
+    return render
+
+
+def time_per_call(render: Callable[[bytes], bytes], raw: bytes, iterations: int) -> float:
+    started = time.process_time()
+    for _ in range(iterations):
+        render(raw)
+    return (time.process_time() - started) / iterations
+
+
+def run(iterations: int, incident_count: int) -> List[dict]:
+    results = []
+    for name, (model, raw) in payloads(incident_count).items():
+        paths = {
+            "response_model": response_model_path(model),
+            "validate_once": lambda raw, model=model: serialization.model_response(model, json.loads(raw)).body,
+            "trusted": lambda raw, model=model: serialization.model_response(model, json.loads(raw), trusted=True).body,
+        }
+        baseline = None
+        for path, render in paths.items():
+            render(raw)
+            cost = time_per_call(render, raw, iterations)
+            baseline = baseline or cost
+            results.append({
+                "payload": name,
+                "path": path,
+                "us_per_request": cost * 1e6,
+                "saved_us_per_request": (baseline - cost) * 1e6,
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--incidents", type=int, default=20, help="incidents in the users_view payload")
+    args = parser.parse_args(argv)
+
+    print(f"fast JSON codec: {'orjson' if serialization.fast_json_enabled() else 'pydantic-core'}")
+    print(f"{'payload':<12}{'path':<16}{'us/request':>12}{'saved us':>10}")
+    for result in run(args.iterations, args.incidents):
+        print(f"{result['payload']:<12}{result['path']:<16}{result['us_per_request']:>12.1f}"
+              f"{result['saved_us_per_request']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,46 @@
 # user-management-service/main.py
 
 from dotenv import load_dotenv
+import math
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy import create_engine, text
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import sessionmaker
-import httpx
 
-load_dotenv()
+from app.services import blocking, database, dispatch, upstream
 
-app = FastAPI()
+load_dotenv()
 
-# Database configuration
-DB_HOST = os.getenv("DB_HOST")
-DB_NAME = os.getenv("DB_NAME", "postgres")
-DB_USERNAME = os.getenv("DB_USERNAME")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await upstream.startup()
+    detector = blocking.detector_from_env(app)
+    if detector is not None:
+        detector.start()
+    if incident_dispatcher.enabled:
+        await incident_dispatcher.start()
+    try:
+        yield
+    finally:
+        await incident_dispatcher.stop()
+        if detector is not None:
+            detector.stop()
+        await upstream.shutdown()
+        await database.shutdown()
 
-DATABASE_URL = f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+app = FastAPI(lifespan=lifespan)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Database configuration: DB_HOST, DB_NAME, DB_USERNAME, DB_PASSWORD and the DB_POOL_* settings,
+# read by app.services.database. The engine is created on the first request that needs it.
+get_db = database.get_session
 
 # Service URLs
 INCIDENT_MANAGEMENT_URL = os.getenv("INCIDENT_MANAGEMENT_URL")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# INCIDENT_DISPATCH_MODE=async queues incident creations and answers 202 with a tracking id
+incident_dispatcher = dispatch.from_env(INCIDENT_MANAGEMENT_URL)
 
 @app.get("/user-management")
 async def user_management_root():
@@ -42,19 +51,39 @@ async def health():
     return {"status": "OK"}
 
 @app.get("/user-management/db-test")
-async def test_db_connection(db: SessionLocal = Depends(get_db)):
+async def test_db_connection(db = Depends(get_db)):
     try:
-        result = db.execute(text("SELECT 1"))
+        result = await database.execute(db, text("SELECT 1"))
         return {"message": "Database connection successful", "result": result.scalar()}
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Database connection failed: {str(e)}")
 
 @app.get("/user-management/create-incident/{user_id}")
 async def create_incident(user_id: int):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{INCIDENT_MANAGEMENT_URL}/incidents", json={"user_id": user_id})
+    if incident_dispatcher.enabled:
+        try:
+            job = await incident_dispatcher.submit({"user_id": user_id})
+        except dispatch.QueueFull as exc:
+            return JSONResponse(
+                status_code=429, content={"detail": "Incident queue is full"},
+                headers={"Retry-After": str(math.ceil(exc.retry_after))},
+            )
+        return JSONResponse(
+            status_code=202, content=job.to_status(),
+            headers={"Location": f"/user-management/create-incident/status/{job.id}"},
+        )
+    response = await upstream.send(
+        upstream.INCIDENT_MANAGEMENT, "POST", f"{INCIDENT_MANAGEMENT_URL}/incidents", json={"user_id": user_id}
+    )
     return response.json()
 
+@app.get("/user-management/create-incident/status/{tracking_id}")
+async def create_incident_status(tracking_id: str):
+    job = await incident_dispatcher.status(tracking_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown tracking id")
+    return job.to_status()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
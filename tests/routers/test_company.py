@@ -1,5 +1,6 @@
+import asyncio
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
 from datetime import date
@@ -10,7 +11,8 @@ import os
 # Mock the environment variable
 os.environ['JWT_SECRET_KEY'] = 'test_secret_key'
 
-from app.routers.company import router, create_company_request, get_company_request, get_current_user, ALGORITHM
+from app.routers.company import router, create_company_request, get_company_request, company_cache, company_loader, company_bulk_forwarder
+from app.services.auth import get_current_user, token_scope, ALGORITHM
 from app.schemas.user import CompanyCreate, CompanyResponse
 
 app = FastAPI()
@@ -27,6 +29,7 @@ class TestCompanyManagement(unittest.TestCase):
     def setUp(self):
         self.secret_key = 'test_secret_key'
         self.valid_token = jwt.encode({"sub": "test@example.com"}, self.secret_key, algorithm=ALGORITHM)
+        asyncio.run(company_cache.clear())
 
     @patch('app.routers.company.create_company_request')
     def test_create_company_success(self, mock_create_company_request):
@@ -86,7 +89,7 @@ class TestCompanyManagement(unittest.TestCase):
     #    self.assertEqual(response.status_code, 401)
     #    self.assertEqual(response.json(), {"detail": "Authentication required"})
 
-    @patch('requests.post')
+    @patch('app.services.upstream.send', new_callable=AsyncMock)
     def test_create_company_request(self, mock_post):
         mock_response = MagicMock()
         mock_response.json.return_value = {
@@ -115,11 +118,12 @@ class TestCompanyManagement(unittest.TestCase):
             city="TestCity"
         )
 
-        response_data, status_code = create_company_request(company)
+        response_data, status_code = asyncio.run(create_company_request(company))
         self.assertEqual(status_code, 201)
         self.assertEqual(response_data["name"], "Test Company")
+        self.assertEqual(mock_post.call_args.args[:2], ("user", "POST"))
 
-    @patch('requests.get')
+    @patch('app.services.upstream.send', new_callable=AsyncMock)
     def test_get_company_request(self, mock_get):
         mock_response = MagicMock()
         mock_response.json.return_value = {
@@ -136,10 +140,224 @@ class TestCompanyManagement(unittest.TestCase):
         mock_response.status_code = 200
         mock_get.return_value = mock_response
 
-        response_data, status_code = get_company_request("12345678-1234-5678-1234-567812345678", self.valid_token)
+        response_data, status_code = asyncio.run(get_company_request("12345678-1234-5678-1234-567812345678", self.valid_token))
         self.assertEqual(status_code, 200)
         self.assertEqual(response_data["name"], "Test Company")
 
+    @patch('app.services.upstream.send', new_callable=AsyncMock)
+    def test_get_company_request_is_cached(self, mock_get):
+        mock_response = MagicMock()
+        mock_response.json.return_value = {"id": "12345678-1234-5678-1234-567812345678", "name": "Test Company"}
+        mock_response.status_code = 200
+        mock_get.return_value = mock_response
+
+        async def run():
+            return await asyncio.gather(*[
+                get_company_request("12345678-1234-5678-1234-567812345678", self.valid_token) for _ in range(5)
+            ])
+
+        asyncio.run(run())
+        response_data, status_code = asyncio.run(get_company_request("12345678-1234-5678-1234-567812345678", self.valid_token))
+        self.assertEqual(status_code, 200)
+        self.assertEqual(response_data["name"], "Test Company")
+        self.assertEqual(mock_get.await_count, 1)
+
+    @patch.object(company_loader, 'enabled', True)
+    @patch('app.services.upstream.send', new_callable=AsyncMock)
+    def test_get_company_request_coalesces_into_bulk_call(self, mock_send):
+        ids = ["12345678-1234-5678-1234-56781234567%d" % index for index in range(3)]
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = [{"id": company_id, "name": "Test Company"} for company_id in ids[:2]]
+        mock_send.return_value = mock_response
+
+        async def run():
+            return await asyncio.gather(*(get_company_request(company_id, self.valid_token) for company_id in ids))
+
+        results = asyncio.run(run())
+        self.assertEqual(mock_send.await_count, 1)
+        self.assertTrue(mock_send.call_args.args[2].endswith("/company/bulk"))
+        self.assertEqual(sorted(mock_send.call_args.kwargs["json"]["ids"]), ids)
+        self.assertEqual([status for _, status in results], [200, 200, 404])
+
+    @patch('app.routers.company.get_company_request')
+    def test_get_company_forwards_caller_token(self, mock_get_company_request):
+        mock_get_company_request.return_value = ({
+            "id": "12345678-1234-5678-1234-567812345678",
+            "username": "testuser@example.com",
+            "name": "Test Company",
+            "first_name": "John",
+            "last_name": "Doe",
+            "birth_date": "2023-01-01",
+            "phone_number": "+12 345 678 9012",
+            "country": "TestCountry",
+            "city": "TestCity"
+        }, 200)
+
+        response = client.get("/user-management/company/12345678-1234-5678-1234-567812345678", headers={"token": self.valid_token})
+        self.assertEqual(response.status_code, 200)
+        mock_get_company_request.assert_awaited_once_with("12345678-1234-5678-1234-567812345678", self.valid_token)
+
+    @patch('app.routers.company.get_company_request')
+    def test_get_company_not_modified(self, mock_get_company_request):
+        mock_get_company_request.return_value = ({
+            "id": "12345678-1234-5678-1234-567812345678",
+            "username": "testuser@example.com",
+            "name": "Test Company",
+            "first_name": "John",
+            "last_name": "Doe",
+            "birth_date": "2023-01-01",
+            "phone_number": "+12 345 678 9012",
+            "country": "TestCountry",
+            "city": "TestCity"
+        }, 200)
+
+        response = client.get("/user-management/company/12345678-1234-5678-1234-567812345678", headers={"token": self.valid_token})
+        etag = response.headers["etag"]
+        self.assertIn("cache-control", response.headers)
+
+        asyncio.run(company_cache.clear())
+        response = client.get("/user-management/company/12345678-1234-5678-1234-567812345678",
+                              headers={"token": self.valid_token, "If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["etag"], etag)
+
+    def test_create_companies_bulk(self):
+        row = {
+            "username": "testuser@example.com",
+            "password": "testpass",
+            "name": "Test Company",
+            "first_name": "John",
+            "last_name": "Doe",
+            "birth_date": "2023-01-01",
+            "phone_number": "+12 345 678 9012",
+            "country": "TestCountry",
+            "city": "TestCity"
+        }
+
+        async def bulk_create(companies, token):
+            return [({**company.model_dump(mode="json", exclude={"password"}), "id": f"12345678-1234-5678-1234-56781234567{index}"}, 201)
+                    for index, company in enumerate(companies)]
+
+        with patch.object(company_bulk_forwarder, "bulk_fn", side_effect=bulk_create) as mock_bulk:
+            response = client.post("/user-management/company/bulk", json=[row, {**row, "first_name": "J0hn"}, row],
+                                   headers={"token": self.valid_token})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([item["index"] for item in results], [0, 1, 2])
+        self.assertEqual([item["status_code"] for item in results], [201, 400, 201])
+        self.assertEqual(results[0]["data"]["name"], "Test Company")
+        self.assertEqual(results[1]["error"]["details"][0]["location"], ["body", 1, "first_name"])
+        mock_bulk.assert_called_once()
+        self.assertEqual(len(mock_bulk.call_args.args[0]), 2)
+        self.assertEqual(mock_bulk.call_args.args[1], self.valid_token)
+
+    def test_create_companies_bulk_rejects_empty_body(self):
+        response = client.post("/user-management/company/bulk", json=[])
+        self.assertEqual(response.status_code, 422)
+
+    @patch('app.routers.company.get_company_request')
+    def test_get_companies_batch(self, mock_get_company_request):
+        first, second = "12345678-1234-5678-1234-567812345678", "87654321-4321-8765-4321-876543218765"
+
+        async def get_company(company_id, token):
+            if company_id == second:
+                return {"detail": "Company not found"}, 404
+            return {
+                "id": company_id,
+                "username": "testuser@example.com",
+                "name": "Test Company",
+                "first_name": "John",
+                "last_name": "Doe",
+                "birth_date": "2023-01-01",
+                "phone_number": "+12 345 678 9012",
+                "country": "TestCountry",
+                "city": "TestCity"
+            }, 200
+
+        mock_get_company_request.side_effect = get_company
+
+        response = client.post("/user-management/company/batch", json={"ids": [second, first, second]})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([item["id"] for item in results], [second, first, second])
+        self.assertEqual(results[0]["status_code"], 404)
+        self.assertEqual(results[0]["error"], {"detail": "Company not found"})
+        self.assertEqual(results[1]["data"]["name"], "Test Company")
+        self.assertEqual(mock_get_company_request.await_count, 2)
+
+    @patch('app.services.upstream.send', new_callable=AsyncMock)
+    def test_cached_company_is_not_served_to_other_callers(self, mock_send):
+        company_id = "12345678-1234-5678-1234-567812345678"
+        other_token = jwt.encode({"sub": "someone@example.com"}, self.secret_key, algorithm=ALGORITHM)
+
+        async def send(service, method, url, headers=None, **kwargs):
+            response = MagicMock()
+            if (headers or {}).get("token") == self.valid_token:
+                response.status_code = 200
+                response.json.return_value = {
+                    "id": company_id,
+                    "username": "testuser@example.com",
+                    "name": "Test Company",
+                    "first_name": "John",
+                    "last_name": "Doe",
+                    "birth_date": "2023-01-01",
+                    "phone_number": "+12 345 678 9012",
+                    "country": "TestCountry",
+                    "city": "TestCity"
+                }
+            else:
+                response.status_code = 403
+                response.json.return_value = {"detail": "Forbidden"}
+            return response
+
+        mock_send.side_effect = send
+
+        response = client.get(f"/user-management/company/{company_id}", headers={"token": self.valid_token})
+        self.assertEqual(response.status_code, 200)
+        response = client.get(f"/user-management/company/{company_id}")
+        self.assertEqual(response.status_code, 403)
+        response = client.post("/user-management/company/batch", json={"ids": [company_id]}, headers={"token": other_token})
+        self.assertEqual(response.json()["results"][0]["status_code"], 403)
+        self.assertEqual(mock_send.await_count, 3)
+
+    def test_get_companies_batch_limit(self):
+        ids = ["12345678-1234-5678-1234-%012d" % index for index in range(101)]
+        response = client.post("/user-management/company/batch", json={"ids": ids})
+        self.assertEqual(response.status_code, 422)
+
+    @patch('app.routers.company.create_company_request')
+    def test_create_company_invalidates_cache(self, mock_create_company_request):
+        company_id = "12345678-1234-5678-1234-567812345678"
+        cache_key = company_cache.scoped_key(company_id, token_scope(None))
+        asyncio.run(company_cache.set(cache_key, ({"id": company_id, "name": "Stale"}, 200)))
+        mock_create_company_request.return_value = ({
+            "id": company_id,
+            "username": "testuser@example.com",
+            "name": "Test Company",
+            "first_name": "John",
+            "last_name": "Doe",
+            "birth_date": "2023-01-01",
+            "phone_number": "+12 345 678 9012",
+            "country": "TestCountry",
+            "city": "TestCity"
+        }, 201)
+
+        company_data = CompanyCreate(
+            username="testuser@example.com",
+            password="testpass",
+            name="Test Company",
+            first_name="John",
+            last_name="Doe",
+            birth_date=date(2023, 1, 1),
+            phone_number="+12 345 678 9012",
+            country="TestCountry",
+            city="TestCity"
+        )
+        response = client.post("/user-management/company/", json=json.loads(company_data.model_dump_json()))
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(asyncio.run(company_cache.get(cache_key)))
+
     def test_get_current_user_valid_token(self):
         token = jwt.encode({"sub": "test@example.com"}, self.secret_key, algorithm=ALGORITHM)
         user = get_current_user(token)
@@ -1,3 +1,5 @@
+import asyncio
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
@@ -7,7 +9,8 @@ from datetime import date
 import jwt
 import os
 
-from app.routers.user import router, get_user_info_request, get_user_incidents_request, get_user_companies_request, get_user_companies_request_user, ALGORITHM, SECRET_KEY
+from app.routers.user import router, get_user_info_request, get_user_incidents_request, get_user_companies_request, get_user_companies_request_user
+from app.services.auth import ALGORITHM, SECRET_KEY
 from app.schemas.user import UserIdRequest, UserDocumentInfo, UserCompanyRequest, UserWithIncidents, UserCompaniesResponseFiltered
 
 # Set up the FastAPI app and TestClient
@@ -46,31 +49,134 @@ class TestUserManagement(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()["companies"][0]["company_name"], "Test Company")
 
-    @patch('app.routers.user.get_user_info_request')
-    @patch('app.routers.user.get_user_incidents_request')
-    def test_get_user_with_incidents_success(self, mock_get_user_incidents_request, mock_get_user_info_request):
-        # Mock the response for user info
-        mock_get_user_info_request.return_value = ({
-            "id": str(uuid4()),
+    def user_info(self, user_id):
+        return {
+            "id": str(user_id),
             "username": "testuser@example.com",
-            "name": "Test User",
             "first_name": "John",
             "last_name": "Doe",
-            "birth_date": date(2023, 1, 1).isoformat(),
-        }, 200)
-
-        # Mock the response for user incidents
-        mock_get_user_incidents_request.return_value = ([
-            {"incident_id": str(uuid4()), "description": "Test Incident"}
-        ], 200)
+            "document_id": "A1234567",
+            "document_type": "passport",
+            "birth_date": date(2000, 1, 1).isoformat(),
+            "phone_number": "+12 345 678 9012",
+            "importance": 1,
+            "allow_call": True,
+            "allow_sms": False,
+            "allow_email": True,
+            "registration_date": "2024-01-01T10:00:00"
+        }
 
+    @patch('app.routers.user.get_user_companies_request_user')
+    @patch('app.routers.user.get_user_info_request')
+    @patch('app.routers.user.get_user_incidents_request')
+    def test_get_user_with_incidents_success(self, mock_get_user_incidents_request, mock_get_user_info_request, mock_get_user_companies_request_user):
         request_data = UserCompanyRequest(
             user_id=uuid4(),
             company_id=uuid4()
         )
+        company_id = str(uuid4())
+        mock_get_user_info_request.return_value = (self.user_info(request_data.user_id), 200)
+        mock_get_user_companies_request_user.return_value = ({
+            "user_id": str(request_data.user_id),
+            "companies": [{"id": company_id, "name": "Test Company"}]
+        }, 200)
+        mock_get_user_incidents_request.return_value = ([
+            {"id": str(uuid4()), "description": "Test Incident", "state": "open", "creation_date": "2024-02-01T10:00:00"}
+        ], 200)
+
+        response = client.post("/user-management/user/users-view", data=request_data.model_dump_json())
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["id"], str(request_data.user_id))
+        self.assertEqual(body["incidents"][0]["description"], "Test Incident")
+        self.assertEqual(body["companies"], [{"id": company_id, "name": "Test Company"}])
+        self.assertEqual(body["unavailable"], [])
+
+    @patch.dict('app.routers.user.USERS_VIEW_TIMEOUTS', {"incidents": 0.05})
+    @patch('app.routers.user.get_user_companies_request_user')
+    @patch('app.routers.user.get_user_info_request')
+    @patch('app.routers.user.get_user_incidents_request')
+    def test_get_user_with_incidents_partial_result(self, mock_get_user_incidents_request, mock_get_user_info_request, mock_get_user_companies_request_user):
+        request_data = UserCompanyRequest(user_id=uuid4(), company_id=uuid4())
+
+        async def slow_incidents(*args):
+            await asyncio.sleep(1)
+            return [], 200
+
+        mock_get_user_info_request.return_value = (self.user_info(request_data.user_id), 200)
+        mock_get_user_companies_request_user.return_value = ({"detail": "boom"}, 500)
+        mock_get_user_incidents_request.side_effect = slow_incidents
 
+        started = time.monotonic()
         response = client.post("/user-management/user/users-view", data=request_data.model_dump_json())
+        self.assertLess(time.monotonic() - started, 0.9)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["incidents"], [])
+        self.assertEqual(body["companies"], [])
+        self.assertEqual(body["unavailable"], ["companies", "incidents"])
+
+    @patch('app.routers.user.get_user_companies_request_user')
+    @patch('app.routers.user.get_user_info_request')
+    @patch('app.routers.user.get_user_incidents_request')
+    def test_get_user_with_incidents_user_not_found(self, mock_get_user_incidents_request, mock_get_user_info_request, mock_get_user_companies_request_user):
+        mock_get_user_info_request.return_value = ({"detail": "User not found"}, 404)
+        mock_get_user_companies_request_user.return_value = ({"companies": []}, 200)
+        mock_get_user_incidents_request.return_value = ([], 200)
+
+        request_data = UserCompanyRequest(user_id=uuid4(), company_id=uuid4())
+        response = client.post("/user-management/user/users-view", data=request_data.model_dump_json())
+        self.assertEqual(response.status_code, 404)
+
+    @patch('app.routers.user.get_user_companies_request_user')
+    def test_get_user_companies_user_paginated(self, mock_get_user_companies_request_user):
+        companies = [{"id": str(uuid4()), "name": f"Company {index}", "nit": "900"} for index in range(3)]
+        mock_get_user_companies_request_user.return_value = ({"user_id": "u", "companies": companies}, 200)
+
+        response = client.post("/user-management/user/companies-user?limit=2&fields=id,name", data=UserIdRequest(id=uuid4()).model_dump_json())
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["companies"], [{"id": c["id"], "name": c["name"]} for c in companies[:2]])
+        self.assertEqual(mock_get_user_companies_request_user.call_args.args[2].upstream_params(), {"limit": 2, "fields": "id,name"})
+
+        response = client.post(f"/user-management/user/companies-user?limit=2&cursor={body['next_cursor']}", data=UserIdRequest(id=uuid4()).model_dump_json())
+        self.assertEqual(response.json()["companies"], companies[2:])
+        self.assertIsNone(response.json()["next_cursor"])
+
+    @patch('app.routers.user.get_user_companies_request_user')
+    @patch('app.routers.user.get_user_info_request')
+    @patch('app.routers.user.get_user_incidents_request')
+    def test_get_user_with_incidents_paginated(self, mock_get_user_incidents_request, mock_get_user_info_request, mock_get_user_companies_request_user):
+        request_data = UserCompanyRequest(user_id=uuid4(), company_id=uuid4())
+        incidents = [
+            {"id": str(uuid4()), "description": f"Incident {index}", "state": "open", "creation_date": "2024-02-01T10:00:00"}
+            for index in range(3)
+        ]
+        mock_get_user_info_request.return_value = (self.user_info(request_data.user_id), 200)
+        mock_get_user_companies_request_user.return_value = ({"companies": []}, 200)
+        mock_get_user_incidents_request.return_value = (incidents, 200)
+
+        response = client.post("/user-management/user/users-view?limit=1&fields=id,state", data=request_data.model_dump_json())
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["incidents"], [{"id": incidents[0]["id"], "state": "open"}])
+        self.assertIsNotNone(body["next_cursor"])
+
+    def test_invalid_cursor(self):
+        response = client.post("/user-management/user/companies-user?cursor=bogus", data=UserIdRequest(id=uuid4()).model_dump_json())
+        self.assertEqual(response.status_code, 400)
+
+    @patch('app.routers.user.get_user_info_request')
+    def test_get_users_batch(self, mock_get_user_info_request):
+        user_id = uuid4()
+        mock_get_user_info_request.return_value = (self.user_info(user_id), 200)
+
+        response = client.post("/user-management/user/batch", json={"ids": [str(user_id), str(user_id)]})
         self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(len(results), 2)
+        self.assertEqual([item["data"]["username"] for item in results], ["testuser@example.com"] * 2)
+        mock_get_user_info_request.assert_awaited_once()
 
     def test_get_current_user_valid_token(self):
         payload = jwt.decode(self.token, SECRET_KEY, algorithms=[ALGORITHM])
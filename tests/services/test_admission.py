@@ -0,0 +1,211 @@
+import asyncio
+import unittest
+
+import jwt
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services import admission
+from app.services.admission import (
+    AdaptiveLimiter, AdmissionController, AdmissionMiddleware, AdmissionSettings, BucketStore, MemoryBucketStore,
+    RespBucketStore,
+)
+from app.services.auth import ALGORITHM, SECRET_KEY
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRespClient:
+    def __init__(self):
+        self.counts = {}
+        self.expiries = {}
+
+    async def pipeline(self, commands):
+        (_, key), (_, _, expiry) = commands
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.expiries[key] = expiry
+        return [self.counts[key], 1]
+
+
+class BrokenStore(MemoryBucketStore):
+    async def take(self, key, rate, burst):
+        raise ConnectionError("store down")
+
+
+class TestBucketStores(unittest.TestCase):
+    def test_memory_bucket_allows_burst_then_refills(self):
+        clock = Clock()
+        store = MemoryBucketStore(clock=clock)
+
+        waits = [asyncio.run(store.take("a", 2, 3)) for _ in range(4)]
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertAlmostEqual(waits[3], 0.5)
+        self.assertEqual(asyncio.run(store.take("b", 2, 3)), 0)
+
+        clock.now += 0.5
+        self.assertEqual(asyncio.run(store.take("a", 2, 3)), 0)
+
+    def test_store_without_take_cannot_be_built(self):
+        class SizedStore(BucketStore):
+            def size(self):
+                return 0
+
+        with self.assertRaisesRegex(TypeError, "take"):
+            SizedStore()
+
+    def test_memory_bucket_drops_least_recent_clients(self):
+        store = MemoryBucketStore(max_keys=2, clock=Clock())
+        for key in ("a", "b", "c"):
+            asyncio.run(store.take(key, 1, 1))
+
+        self.assertEqual(store.size(), 2)
+        self.assertEqual(asyncio.run(store.take("a", 1, 1)), 0)
+
+    def test_shared_store_counts_per_window(self):
+        clock = Clock()
+        client = FakeRespClient()
+        store = RespBucketStore(client, "test:rate", clock=clock)
+
+        waits = [asyncio.run(store.take("sub:a", 2, 2)) for _ in range(3)]
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertAlmostEqual(waits[2], 1.0)
+        self.assertEqual(client.expiries["test:rate:sub:a:1000"], 2000)
+
+        clock.now += 1
+        self.assertEqual(asyncio.run(store.take("sub:a", 2, 2)), 0)
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+    def test_rejects_past_the_limit(self):
+        limiter = AdaptiveLimiter(initial=2, min_limit=1)
+        self.assertTrue(limiter.acquire())
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+
+        limiter.release()
+        self.assertTrue(limiter.acquire())
+
+    def test_slow_upstream_shrinks_the_limit(self):
+        limiter = AdaptiveLimiter(initial=100, min_limit=5)
+        for _ in range(10):
+            limiter.observe(0.05)
+        for _ in range(30):
+            limiter.observe(1.0)
+
+        self.assertLess(limiter.limit, 30)
+        self.assertGreaterEqual(limiter.limit, 5)
+
+    def test_limit_grows_only_while_in_use(self):
+        limiter = AdaptiveLimiter(initial=10, max_limit=20)
+        limiter.observe(0.05)
+        self.assertEqual(limiter.limit, 10)
+
+        limiter.in_flight = 10
+        for _ in range(50):
+            limiter.observe(0.05)
+        self.assertEqual(limiter.limit, 20)
+
+    def test_failures_back_off(self):
+        limiter = AdaptiveLimiter(initial=100)
+        limiter.observe(0.1, failed=True)
+        self.assertAlmostEqual(limiter.limit, 90)
+
+
+class TestAdmissionMiddleware(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.controller = AdmissionController(
+            AdmissionSettings(enabled=True, rate=1, burst=2), store=MemoryBucketStore(clock=self.clock),
+            limiter=AdaptiveLimiter(initial=5, min_limit=1),
+        )
+        self.app = FastAPI()
+        self.app.add_middleware(AdmissionMiddleware, admission=self.controller)
+
+        @self.app.get("/user-management/company/{company_id}")
+        async def company(company_id: str):
+            return {"id": company_id}
+
+        @self.app.get("/user-management/health")
+        async def health():
+            return {"status": "OK"}
+
+        @self.app.get("/user-management/observe/{name}")
+        async def observe(name: str):
+            self.controller.observe_upstream(name, 0.1, 503)
+            return {}
+
+        self.client = TestClient(self.app)
+
+    def test_rate_limits_per_client_ip(self):
+        statuses = [self.client.get("/user-management/company/1").status_code for _ in range(3)]
+
+        self.assertEqual(statuses, [200, 200, 429])
+        response = self.client.get("/user-management/company/1")
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(response.json(), {"detail": "Rate limit exceeded"})
+        self.assertEqual(self.controller.stats.rate_limited, 2)
+
+    def test_rate_limits_per_token_subject(self):
+        alice = jwt.encode({"sub": "alice@example.com"}, SECRET_KEY, algorithm=ALGORITHM)
+        bob = jwt.encode({"sub": "bob@example.com"}, SECRET_KEY, algorithm=ALGORITHM)
+        for _ in range(2):
+            self.client.get("/user-management/company/1", headers={"token": alice})
+
+        self.assertEqual(self.client.get("/user-management/company/1", headers={"token": alice}).status_code, 429)
+        self.assertEqual(self.client.get("/user-management/company/1", headers={"token": bob}).status_code, 200)
+
+    def test_exempt_paths_are_not_limited(self):
+        statuses = {self.client.get("/user-management/health").status_code for _ in range(5)}
+        self.assertEqual(statuses, {200})
+
+    def test_sheds_when_concurrency_limit_is_full(self):
+        self.controller.limiter.in_flight = 5
+
+        response = self.client.get("/user-management/company/1")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(self.controller.stats.shed, 1)
+
+    def test_releases_slot_after_response(self):
+        self.client.get("/user-management/company/1")
+
+        self.assertEqual(self.controller.limiter.in_flight, 0)
+        self.assertEqual(self.controller.stats.admitted, 1)
+
+    def test_store_failure_admits_request(self):
+        self.controller.store = BrokenStore()
+
+        self.assertEqual(self.client.get("/user-management/company/1").status_code, 200)
+        self.assertEqual(self.controller.stats.store_errors, 1)
+
+    def test_upstream_failures_lower_the_limit(self):
+        async def request():
+            # Observations only count inside an admitted request
+            admitted = admission._admitted.set(True)
+            try:
+                self.controller.observe_upstream("user", 0.1, 503)
+                self.controller.observe_upstream("user", 0.1, "ConnectTimeout")
+            finally:
+                admission._admitted.reset(admitted)
+
+        asyncio.run(request())
+        self.assertAlmostEqual(self.controller.limiter.limit, 5 * 0.9 * 0.9)
+
+    def test_only_request_calls_to_critical_upstreams_are_observed(self):
+        self.controller.observe_upstream("user", 0.1, 503)
+        self.client.get("/user-management/observe/incident_management")
+        self.assertEqual(self.controller.limiter.limit, 5)
+
+        self.client.get("/user-management/observe/user")
+        self.assertAlmostEqual(self.controller.limiter.limit, 5 * 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import time
+import unittest
+from unittest.mock import patch
+
+import jwt
+
+from app.services.auth import TokenVerifier, token_headers, token_scope, ALGORITHM
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenVerifier(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.verifier = TokenVerifier("current", ["previous"], max_size=2, max_ttl=300, clock=self.clock)
+
+    def token(self, key="current", **claims):
+        return jwt.encode({"sub": "test@example.com", **claims}, key, algorithm=ALGORITHM)
+
+    def test_token_is_decoded_once(self):
+        token = self.token()
+        with patch("app.services.auth.jwt.decode", wraps=jwt.decode) as decode:
+            first = self.verifier.verify(token)
+            second = self.verifier.verify(token)
+        self.assertEqual(first["sub"], "test@example.com")
+        self.assertEqual(first, second)
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(self.verifier.stats.verifications, 1)
+        self.assertEqual(self.verifier.stats.cache_hits, 1)
+        self.assertGreater(self.verifier.stats.verify_seconds, 0)
+
+    def test_cached_entry_expires_at_exp_claim(self):
+        token = self.token(exp=int(self.clock.now) + 60)
+        self.verifier.verify(token)
+        self.clock.now += 30
+        self.verifier.verify(token)
+        self.assertEqual(self.verifier.stats.verifications, 1)
+        self.clock.now += 31
+        self.verifier.verify(token)
+        self.assertEqual(self.verifier.stats.verifications, 2)
+
+    def test_invalid_tokens_are_rejected_and_not_cached(self):
+        self.assertIsNone(self.verifier.verify("invalid_token"))
+        self.assertIsNone(self.verifier.verify(self.token(key="unknown")))
+        self.assertEqual(self.verifier.stats.failures, 2)
+        self.assertEqual(self.verifier.stats.cache_hits, 0)
+
+    def test_previous_key_still_verifies(self):
+        self.assertIsNotNone(self.verifier.verify(self.token(key="previous")))
+
+    def test_rotate_keeps_old_key_and_clears_cache(self):
+        old_token = self.token()
+        self.verifier.verify(old_token)
+        self.verifier.rotate("next", keep_previous=1)
+        self.assertEqual(self.verifier.keys, ["next", "current"])
+        self.assertIsNotNone(self.verifier.verify(old_token))
+        self.assertIsNone(self.verifier.verify(self.token(key="previous")))
+        self.assertEqual(self.verifier.stats.verifications, 3)
+
+    def test_cache_is_bounded(self):
+        for index in range(3):
+            self.verifier.verify(self.token(n=index))
+        self.assertEqual(self.verifier.stats.cache_evictions, 1)
+
+    def test_token_headers(self):
+        self.assertEqual(token_headers("abc"), {"token": "abc"})
+        self.assertEqual(token_headers(None), {})
+
+    def test_token_scope_is_a_digest(self):
+        self.assertEqual(token_scope("abc"), token_scope("abc"))
+        self.assertNotEqual(token_scope("abc"), token_scope("abd"))
+        self.assertNotIn("abc", token_scope("abc"))
+        self.assertEqual(token_scope(None), "anonymous")
+
+
+if __name__ == "__main__":
+    unittest.main()
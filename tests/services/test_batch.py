@@ -0,0 +1,156 @@
+import asyncio
+import json
+import unittest
+
+from datetime import date
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app.errors.errors import UpstreamTimeout
+from app.schemas.user import CompanyCreate
+from app.services.batch import BulkForwarder, batch_items, fetch_many, validate_rows
+from app.services.cache import ResponseCache
+from app.services.coalescer import BulkUnsupported
+
+COMPANY = {
+    "username": "testuser@example.com",
+    "password": "testpass",
+    "name": "Test Company",
+    "first_name": "John",
+    "last_name": "Doe",
+    "birth_date": "2023-01-01",
+    "phone_number": "+12 345 678 9012",
+    "country": "TestCountry",
+    "city": "TestCity",
+}
+
+
+class TestFetchMany(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache("batch-test", ttl=60)
+
+    def test_dedupes_fetches_and_keeps_every_requested_position(self):
+        fetched = []
+
+        async def fetch(key):
+            fetched.append(key)
+            return {"id": key}, 200
+
+        results = asyncio.run(fetch_many(["b", "a", "b", "c"], self.cache, fetch))
+        self.assertEqual([key for key, _ in results], ["b", "a", "b", "c"])
+        self.assertEqual(sorted(fetched), ["a", "b", "c"])
+
+    def test_serves_cached_ids_without_fetching(self):
+        fetched = []
+
+        async def fetch(key):
+            fetched.append(key)
+            return {"id": key}, 200
+
+        async def run():
+            await self.cache.set("a", ({"id": "a", "cached": True}, 200))
+            return await fetch_many(["a", "b"], self.cache, fetch)
+
+        results = asyncio.run(run())
+        self.assertEqual(fetched, ["b"])
+        self.assertEqual(results[0], ("a", ({"id": "a", "cached": True}, 200)))
+
+    def test_cached_entries_of_other_scopes_are_not_served(self):
+        fetched = []
+
+        async def fetch(key):
+            fetched.append(key)
+            return {"detail": "Forbidden"}, 403
+
+        async def run():
+            await self.cache.set(self.cache.scoped_key("a", "admin"), ({"id": "a"}, 200))
+            return await fetch_many(["a"], self.cache, fetch, scope="someone")
+
+        results = asyncio.run(run())
+        self.assertEqual(fetched, ["a"])
+        self.assertEqual(results, [("a", ({"detail": "Forbidden"}, 403))])
+
+    def test_concurrency_is_bounded(self):
+        in_flight = []
+        peak = []
+
+        async def fetch(key):
+            in_flight.append(key)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(key)
+            return {"id": key}, 200
+
+        asyncio.run(fetch_many([str(i) for i in range(10)], self.cache, fetch, concurrency=3))
+        self.assertEqual(max(peak), 3)
+
+    def test_per_item_errors(self):
+        async def fetch(key):
+            if key == "timeout":
+                raise UpstreamTimeout("slow")
+            if key == "missing":
+                return {"detail": "Not found"}, 404
+            return {"id": key}, 200
+
+        results = asyncio.run(fetch_many(["ok", "missing", "timeout"], self.cache, fetch))
+        items = batch_items(results)
+        self.assertEqual(items[0], {"id": "ok", "status_code": 200, "data": {"id": "ok"}})
+        self.assertEqual(items[1], {"id": "missing", "status_code": 404, "error": {"detail": "Not found"}})
+        self.assertEqual(items[2]["status_code"], 504)
+
+    def test_unexpected_errors_fail_only_their_id(self):
+        async def fetch(key):
+            if key == "not-json":
+                return json.loads("<html>")
+            if key == "dropped":
+                raise LookupError("company batch returned no result for 'dropped'")
+            return {"id": key}, 200
+
+        with self.assertLogs("app.services.batch", "ERROR"):
+            results = asyncio.run(fetch_many(["ok", "not-json", "dropped", "other"], self.cache, fetch))
+        self.assertEqual([item["status_code"] for item in batch_items(results)], [200, 502, 502, 200])
+        self.assertEqual(results[1][1], ({"detail": "Upstream service error"}, 502))
+
+
+class TestBulk(unittest.TestCase):
+
+    def test_validate_rows_reports_errors_per_row(self):
+        adapter = TypeAdapter(List[CompanyCreate])
+        rows = [COMPANY, {**COMPANY, "phone_number": "123"}, "not a company", {**COMPANY, "birth_date": "2030-01-01"}]
+        valid, errors = validate_rows(adapter, rows, context={"today": date(2024, 1, 1)})
+        self.assertEqual([index for index, _ in valid], [0])
+        self.assertIsInstance(valid[0][1], CompanyCreate)
+        self.assertEqual(sorted(errors), [1, 2, 3])
+        self.assertEqual(errors[1][0]["location"], ["body", 1, "phone_number"])
+        self.assertEqual(errors[3][0]["location"], ["body", 3, "birth_date"])
+        # The batch "today" decides, not the clock
+        valid, errors = validate_rows(adapter, rows[3:], context={"today": date(2031, 1, 1)})
+        self.assertEqual((len(valid), errors), (1, {}))
+
+    def test_forwarder_chunks_and_falls_back(self):
+        chunks, singles = [], []
+
+        async def bulk(chunk, token):
+            chunks.append(list(chunk))
+            if len(chunks) > 1:
+                raise BulkUnsupported()
+            return [(item, 201) for item in chunk]
+
+        async def single(item, token):
+            singles.append(item)
+            if item == 4:
+                raise UpstreamTimeout("slow")
+            return item, 201
+
+        forwarder = BulkForwarder("test", bulk, single, chunk_size=2, concurrency=1)
+        results = asyncio.run(forwarder.forward([0, 1, 2, 3, 4], "token"))
+        self.assertEqual(results, [(0, 201), (1, 201), (2, 201), (3, 201), ({"detail": "Upstream service timed out"}, 504)])
+        self.assertEqual(chunks, [[0, 1], [2, 3]])
+        self.assertEqual(singles, [2, 3, 4])
+        self.assertFalse(forwarder.bulk_supported)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import time
+import unittest
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+from uuid import uuid4
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services import blocking, upstream
+
+
+COMPANY = {
+    "id": "12345678-1234-5678-1234-567812345678",
+    "username": "testuser@example.com",
+    "name": "Test Company",
+    "first_name": "John",
+    "last_name": "Doe",
+    "birth_date": "2023-01-01",
+    "phone_number": "+12 345 678 9012",
+    "country": "TestCountry",
+    "city": "TestCity"
+}
+
+USER = {
+    "id": "12345678-1234-5678-1234-567812345678",
+    "username": "testuser@example.com",
+    "first_name": "John",
+    "last_name": "Doe",
+    "document_id": "A1234567",
+    "document_type": "passport",
+    "birth_date": "2000-01-01",
+    "phone_number": "+12 345 678 9012",
+    "importance": 1,
+    "allow_call": True,
+    "allow_sms": False,
+    "allow_email": True,
+    "registration_date": "2024-01-01T10:00:00"
+}
+
+
+def fake_upstream(request):
+    if "/company/" in request.url.path:
+        return httpx.Response(200, json=COMPANY)
+    if request.method == "GET" and "/user/" in request.url.path:
+        return httpx.Response(200, json=USER)
+    return httpx.Response(200, json=[])
+
+
+def app_with_detector(detector):
+    @asynccontextmanager
+    async def lifespan(app):
+        detector.register_app(app)
+        detector.start()
+        yield
+        detector.stop()
+
+    return FastAPI(lifespan=lifespan)
+
+
+class TestLoopBlockingDetector(unittest.TestCase):
+
+    def tearDown(self):
+        for name in upstream.UPSTREAMS:
+            upstream.set_transport(name, None)
+
+    def test_reports_blocking_handler_and_duration(self):
+        detector = blocking.LoopBlockingDetector(threshold=0.05)
+        app = app_with_detector(detector)
+
+        @app.get("/slow")
+        async def slow_handler():
+            time.sleep(0.3)
+            return {}
+
+        with TestClient(app) as client:
+            client.get("/slow")
+            deadline = time.monotonic() + 2
+            while not detector.events and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertEqual(len(detector.events), 1)
+        event = detector.events[0]
+        self.assertIn("slow_handler (GET /slow)", event.handler)
+        self.assertGreaterEqual(event.duration, 0.25)
+
+    def test_run_blocking_does_not_stall_the_loop(self):
+        detector = blocking.LoopBlockingDetector(threshold=0.05)
+        app = app_with_detector(detector)
+
+        @app.get("/offloaded")
+        async def offloaded_handler():
+            await blocking.run_blocking(time.sleep, 0.2)
+            return {}
+
+        with TestClient(app) as client:
+            response = client.get("/offloaded")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(detector.events), 0)
+
+    @patch.dict(os.environ, {"BLOCKING_DETECTOR": "1", "BLOCKING_DETECTOR_THRESHOLD_MS": "50"})
+    def test_app_endpoints_do_not_block_the_loop(self):
+        from app.main import app
+
+        for name in upstream.UPSTREAMS:
+            upstream.set_transport(name, httpx.MockTransport(fake_upstream))
+
+        with TestClient(app) as client:
+            client.post("/user-management/user/companies", json={"document_type": "cc", "document_id": "1"})
+            client.post("/user-management/user/companies-user", json={"id": str(uuid4())})
+            client.post("/user-management/user/users-view", json={"user_id": str(uuid4()), "company_id": str(uuid4())})
+            client.get(f"/user-management/company/{uuid4()}")
+            detector = app.state.blocking_detector
+
+        self.assertIsNotNone(detector)
+        self.assertEqual(list(detector.events), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
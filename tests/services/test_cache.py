@@ -0,0 +1,137 @@
+import asyncio
+import unittest
+
+from app.services.cache import MemoryBackend, ResponseCache, is_success
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache("test", backend=MemoryBackend(max_size=2, clock=self.clock), ttl=10)
+
+    def test_hit_and_miss_counters(self):
+        async def run():
+            self.assertIsNone(await self.cache.get("a"))
+            await self.cache.set("a", 1)
+            self.assertEqual(await self.cache.get("a"), 1)
+
+        asyncio.run(run())
+        self.assertEqual(self.cache.stats.hits, 1)
+        self.assertEqual(self.cache.stats.misses, 1)
+
+    def test_entries_expire_after_ttl(self):
+        async def run():
+            await self.cache.set("a", 1)
+            self.clock.now = 10
+            return await self.cache.get("a")
+
+        self.assertIsNone(asyncio.run(run()))
+        self.assertEqual(self.cache.stats.expirations, 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        async def run():
+            await self.cache.set("a", 1)
+            await self.cache.set("b", 2)
+            await self.cache.get("a")
+            await self.cache.set("c", 3)
+            return await self.cache.get_many(["a", "b", "c"])
+
+        self.assertEqual(asyncio.run(run()), {"a": 1, "c": 3})
+        self.assertEqual(self.cache.stats.evictions, 1)
+
+    def test_batch_set_and_get(self):
+        async def run():
+            await self.cache.set_many({"a": 1, "b": 2})
+            return await self.cache.get_many(["a", "b", "missing"])
+
+        self.assertEqual(asyncio.run(run()), {"a": 1, "b": 2})
+        self.assertEqual(self.cache.stats.misses, 1)
+
+    def test_invalidate(self):
+        async def run():
+            await self.cache.set("a", 1)
+            await self.cache.invalidate("a")
+            return await self.cache.get("a")
+
+        self.assertIsNone(asyncio.run(run()))
+
+    def test_disabled_cache_does_not_store(self):
+        cache = ResponseCache("disabled", ttl=0)
+        asyncio.run(cache.set("a", 1))
+        self.assertEqual(len(cache), 0)
+
+    def test_concurrent_misses_share_one_load(self):
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"id": "a"}, 200
+
+        async def run():
+            return await asyncio.gather(*[
+                self.cache.get_or_load("a", loader, cacheable=is_success) for _ in range(10)
+            ])
+
+        results = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result == ({"id": "a"}, 200) for result in results))
+        self.assertEqual(self.cache.stats.coalesced, 9)
+        self.assertEqual(asyncio.run(self.cache.get("a")), ({"id": "a"}, 200))
+
+    def test_concurrent_misses_in_different_scopes_load_separately(self):
+        calls = []
+
+        def loader(scope):
+            async def load():
+                calls.append(scope)
+                await asyncio.sleep(0.01)
+                return {"detail": scope}, 200 if scope == "admin" else 403
+            return load
+
+        async def run():
+            return await asyncio.gather(*[
+                self.cache.get_or_load("a", loader(scope), scope=scope) for scope in ("admin", "someone", "admin")
+            ])
+
+        results = asyncio.run(run())
+        self.assertEqual(sorted(calls), ["admin", "someone"])
+        self.assertEqual([status for _, status in results], [200, 403, 200])
+        self.assertEqual(self.cache.stats.coalesced, 1)
+
+    def test_failed_responses_are_not_cached(self):
+        async def loader():
+            return {"detail": "not found"}, 404
+
+        asyncio.run(self.cache.get_or_load("a", loader, cacheable=is_success))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_loader_errors_propagate_to_every_waiter(self):
+        async def loader():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        async def run():
+            return await asyncio.gather(
+                self.cache.get_or_load("a", loader),
+                self.cache.get_or_load("a", loader),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
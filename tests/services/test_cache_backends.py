@@ -0,0 +1,197 @@
+import asyncio
+import fnmatch
+import os
+import time
+import unittest
+from unittest.mock import patch
+from uuid import uuid4
+
+from app.schemas.user import CompanyResponse
+from app.services import cache
+from app.services.cache import CacheBackend, RespBackend, ResponseCache, ResultCodec
+from app.services.resp import RespClient, encode_command, read_reply
+
+COMPANY = {
+    "id": "12345678-1234-5678-1234-567812345678",
+    "username": "testuser@example.com",
+    "name": "Test Company",
+    "first_name": "John",
+    "last_name": "Doe",
+    "birth_date": "2023-01-01",
+    "phone_number": "+12 345 678 9012",
+    "country": "TestCountry",
+    "city": "TestCity"
+}
+
+
+class FakeRespServer:
+    """In-process stand-in for a Redis server supporting the commands the cache uses."""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def _get(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                args = await read_reply(reader)
+                command = args[0].decode().upper()
+                self.commands.append(command)
+                writer.write(self.reply(command, args[1:]))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            writer.close()
+
+    def reply(self, command, args):
+        if command == "GET":
+            return self.bulk(self._get(args[0]))
+        if command == "MGET":
+            return b"*%d\r\n" % len(args) + b"".join(self.bulk(self._get(key)) for key in args)
+        if command == "SET":
+            expires_at = None
+            if len(args) > 2 and args[2].upper() == b"PX":
+                expires_at = time.monotonic() + int(args[3]) / 1000
+            self.data[args[0]] = (args[1], expires_at)
+            return b"+OK\r\n"
+        if command == "DEL":
+            removed = sum(1 for key in args if self.data.pop(key, None) is not None)
+            return b":%d\r\n" % removed
+        if command == "SCAN":
+            pattern = args[args.index(b"MATCH") + 1].decode()
+            keys = [key for key in self.data if fnmatch.fnmatch(key.decode(), pattern)]
+            return b"*2\r\n$1\r\n0\r\n" + b"*%d\r\n" % len(keys) + b"".join(self.bulk(key) for key in keys)
+        return b"-ERR unknown command\r\n"
+
+    @staticmethod
+    def bulk(value):
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class TestRespBackend(unittest.TestCase):
+
+    def run_with_server(self, scenario):
+        async def run():
+            server = FakeRespServer()
+            port = await server.start()
+            client = RespClient("127.0.0.1", port, pool_size=2, timeout=1)
+            try:
+                return await scenario(server, client)
+            finally:
+                await client.close()
+                await server.stop()
+
+        return asyncio.run(run())
+
+    def test_encode_command(self):
+        self.assertEqual(encode_command("GET", "k"), b"*2\r\n$3\r\nGET\r\n$1\r\nk\r\n")
+
+    def test_batch_round_trip_with_model_codec(self):
+        async def scenario(server, client):
+            response_cache = ResponseCache(
+                "company-resp", backend=RespBackend(client, "test:company", ResultCodec(CompanyResponse)), ttl=60
+            )
+            extra = {**COMPANY, "password": "not-a-response-field"}
+            await response_cache.set_many({"a": (extra, 200), "b": (COMPANY, 200)})
+            found = await response_cache.get_many(["a", "b", "c"])
+            return server, found
+
+        server, found = self.run_with_server(scenario)
+        self.assertEqual(set(found), {"a", "b"})
+        data, status_code = found["a"]
+        self.assertEqual(status_code, 200)
+        self.assertEqual(data["name"], "Test Company")
+        self.assertNotIn("password", data)
+        raw, _ = server.data[b"test:company:a"]
+        self.assertTrue(raw.startswith(b'[{"id":"12345678-1234-5678-1234-567812345678","name":'))
+        self.assertNotIn(b'", "', raw)
+        self.assertIn("MGET", server.commands)
+
+    def test_entries_expire_and_can_be_invalidated(self):
+        async def scenario(server, client):
+            response_cache = ResponseCache("expiring", backend=RespBackend(client, "test:exp"), ttl=0.05)
+            await response_cache.set("a", {"v": 1})
+            await response_cache.set("b", {"v": 2}, ttl=60)
+            await response_cache.invalidate("b")
+            await asyncio.sleep(0.1)
+            return await response_cache.get("a"), await response_cache.get("b")
+
+        self.assertEqual(self.run_with_server(scenario), (None, None))
+
+    def test_clear_only_removes_namespace(self):
+        async def scenario(server, client):
+            ours = RespBackend(client, "test:ours")
+            theirs = RespBackend(client, "test:theirs")
+            await ours.set("a", 1, 60)
+            await theirs.set("a", 2, 60)
+            await ours.clear()
+            return await ours.get_many(["a"]), await theirs.get_many(["a"])
+
+        self.assertEqual(self.run_with_server(scenario), ({}, {"a": 2}))
+
+    def test_unreachable_backend_degrades_to_miss(self):
+        async def run():
+            client = RespClient("127.0.0.1", 1, timeout=0.5)
+            response_cache = ResponseCache("unreachable", backend=RespBackend(client, "test:down"), ttl=60)
+
+            async def loader():
+                return {"v": 1}, 200
+
+            result = await response_cache.get_or_load("a", loader)
+            return response_cache, result
+
+        response_cache, result = asyncio.run(run())
+        self.assertEqual(result, ({"v": 1}, 200))
+        self.assertEqual(response_cache.stats.errors, 2)
+
+    @patch.dict(os.environ, {"CACHE_BACKEND": "redis", "CACHE_REDIS_URL": "redis://cache.local:6380/2"})
+    def test_backend_selected_by_env(self):
+        cache._resp_client = None
+        try:
+            backend = cache.create_backend(f"env-{uuid4()}", 10, CompanyResponse)
+            self.assertIsInstance(backend, RespBackend)
+            self.assertEqual((backend.client.host, backend.client.port, backend.client.db), ("cache.local", 6380, 2))
+            self.assertTrue(backend.namespace.startswith("user-management:env-"))
+        finally:
+            cache._resp_client = None
+
+    def test_backend_without_batch_operations_cannot_be_built(self):
+        class SingleKeyBackend(CacheBackend):
+            async def get(self, key):
+                return cache._MISSING
+
+            async def set(self, key, value, ttl):
+                pass
+
+            async def delete(self, key):
+                pass
+
+            async def clear(self):
+                pass
+
+        with self.assertRaisesRegex(TypeError, "get_many"):
+            SingleKeyBackend()
+
+
+if __name__ == "__main__":
+    unittest.main()
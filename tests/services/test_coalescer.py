@@ -0,0 +1,158 @@
+import asyncio
+import unittest
+
+from app.services.coalescer import BatchLoader, BulkUnsupported, resolve_per_token
+
+
+class TestBatchLoader(unittest.TestCase):
+
+    def test_keys_within_window_share_one_batch(self):
+        batches = []
+
+        async def batch_fn(keys):
+            batches.append(sorted(keys))
+            return {key: key.upper() for key in keys}
+
+        async def single_fn(key):
+            raise AssertionError("bulk route should be used")
+
+        loader = BatchLoader("window", batch_fn, single_fn, window=0.01)
+
+        async def run():
+            return await asyncio.gather(*(loader.load(key) for key in ["a", "b", "a", "c"]))
+
+        self.assertEqual(asyncio.run(run()), ["A", "B", "A", "C"])
+        self.assertEqual(batches, [["a", "b", "c"]])
+        self.assertEqual(loader.stats.batches, 1)
+        self.assertEqual(loader.stats.batch_sizes, {3: 1})
+        self.assertGreater(loader.stats.window_seconds, 0)
+
+    def test_max_batch_size_dispatches_early(self):
+        batches = []
+
+        async def batch_fn(keys):
+            batches.append(len(keys))
+            return {key: key for key in keys}
+
+        loader = BatchLoader("max-size", batch_fn, None, window=10, max_batch_size=2)
+
+        async def run():
+            return await asyncio.wait_for(asyncio.gather(*(loader.load(key) for key in "abcd")), 1)
+
+        self.assertEqual(asyncio.run(run()), list("abcd"))
+        self.assertEqual(batches, [2, 2])
+        self.assertEqual(loader.stats.max_batch_size, 2)
+
+    def test_falls_back_to_single_calls_without_bulk_route(self):
+        bulk_calls = []
+        single_calls = []
+
+        async def batch_fn(keys):
+            bulk_calls.append(keys)
+            raise BulkUnsupported()
+
+        async def single_fn(key):
+            single_calls.append(key)
+            if key == "bad":
+                raise ValueError("boom")
+            return key * 2
+
+        loader = BatchLoader("fallback", batch_fn, single_fn, window=0.005)
+
+        async def run():
+            first = await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("bad"), return_exceptions=True)
+            second = await asyncio.gather(loader.load("c"), loader.load("d"))
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first[:2], ["aa", "bb"])
+        self.assertIsInstance(first[2], ValueError)
+        self.assertEqual(second, ["cc", "dd"])
+        self.assertEqual(len(bulk_calls), 1)
+        self.assertFalse(loader.bulk_supported)
+        self.assertEqual(loader.stats.fallback_batches, 2)
+
+    def test_missing_keys_and_batch_errors_reach_waiters(self):
+        async def partial(keys):
+            return {"a": 1}
+
+        async def failing(keys):
+            raise RuntimeError("upstream down")
+
+        async def run(batch_fn):
+            loader = BatchLoader("errors", batch_fn, None, window=0.005)
+            return await asyncio.gather(loader.load("a"), loader.load("b"), return_exceptions=True)
+
+        a, b = asyncio.run(run(partial))
+        self.assertEqual(a, 1)
+        self.assertIsInstance(b, LookupError)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in asyncio.run(run(failing))))
+
+    def test_disabled_loader_calls_single_fn(self):
+        async def single_fn(key):
+            return key
+
+        loader = BatchLoader("disabled", None, single_fn, enabled=False)
+        self.assertEqual(asyncio.run(loader.load("a")), "a")
+        self.assertEqual(loader.stats.batches, 0)
+
+    def test_batches_in_flight_are_kept_and_cancelled_on_close(self):
+        started = []
+
+        async def batch_fn(keys):
+            started.append(keys)
+            await asyncio.sleep(10)
+
+        loader = BatchLoader("close", batch_fn, None, window=0)
+
+        async def run():
+            waiters = [asyncio.ensure_future(loader.load(key)) for key in "ab"]
+            while not started:
+                await asyncio.sleep(0)
+            self.assertEqual(len(loader._tasks), 1)
+            await loader.close()
+            return await asyncio.gather(*waiters, return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, asyncio.CancelledError) for result in results))
+        self.assertEqual(loader._tasks, set())
+
+    def test_resolve_per_token(self):
+        calls = []
+
+        async def bulk_fn(ids, token):
+            calls.append((sorted(ids), token))
+            return {key_id: (key_id, token) for key_id in ids}
+
+        keys = [("1", "t1"), ("2", "t2"), ("3", "t1")]
+        results = asyncio.run(resolve_per_token(keys, bulk_fn))
+        self.assertEqual(sorted(calls), [(["1", "3"], "t1"), (["2"], "t2")])
+        self.assertEqual(results[("2", "t2")], ("2", "t2"))
+
+    def test_resolve_per_token_runs_calls_concurrently(self):
+        in_flight = []
+
+        async def bulk_fn(ids, token):
+            in_flight.append(token)
+            await asyncio.sleep(0.01)
+            running = len(in_flight)
+            if token == "denied":
+                raise RuntimeError("upstream down")
+            return {key_id: running for key_id in ids}
+
+        keys = [("1", "t1"), ("2", "t2"), ("3", "denied")]
+        results = asyncio.run(resolve_per_token(keys, bulk_fn))
+        self.assertEqual(results[("1", "t1")], 3)
+        self.assertEqual(results[("2", "t2")], 3)
+        self.assertIsInstance(results[("3", "denied")], RuntimeError)
+
+    def test_resolve_per_token_passes_on_bulk_unsupported(self):
+        async def bulk_fn(ids, token):
+            raise BulkUnsupported()
+
+        with self.assertRaises(BulkUnsupported):
+            asyncio.run(resolve_per_token([("1", "t1"), ("2", "t2")], bulk_fn))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import gzip
+import unittest
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.services import metrics, serialization
+from app.services.compression import CompressionMiddleware, CompressionSettings, PrecompressedCache, negotiate
+
+ITEMS = [{"id": index, "name": f"Company {index}", "country": "Colombia"} for index in range(200)]
+
+app = FastAPI()
+middleware_settings = CompressionSettings(min_size=512, cache_size=8)
+app.add_middleware(CompressionMiddleware, settings=middleware_settings)
+
+
+@app.get("/items")
+async def items():
+    response = serialization.json_response(ITEMS)
+    response.headers["ETag"] = '"items-v1"'
+    return response
+
+
+@app.get("/small")
+async def small():
+    return serialization.json_response({"status": "OK"})
+
+
+@app.get("/stream")
+async def stream():
+    async def lines():
+        for item in ITEMS:
+            yield serialization.dumps(item) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+client = TestClient(app)
+
+
+class TestNegotiate(unittest.TestCase):
+
+    def test_prefers_highest_quality_then_server_order(self):
+        self.assertEqual(negotiate("gzip, br", ("zstd", "br", "gzip")), "br")
+        self.assertEqual(negotiate("gzip;q=1.0, br;q=0.5", ("br", "gzip")), "gzip")
+        self.assertEqual(negotiate("*", ("br", "gzip")), "br")
+        self.assertEqual(negotiate("gzip;q=0, *", ("gzip",)), None)
+        self.assertIsNone(negotiate("identity", ("gzip",)))
+        self.assertIsNone(negotiate(None, ("gzip",)))
+
+
+class TestPrecompressedCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = PrecompressedCache(max_size=2)
+        cache.put('"a"', "gzip", b"a")
+        cache.put('"b"', "gzip", b"b")
+        cache.get('"a"', "gzip")
+        cache.put('"c"', "gzip", b"c")
+        self.assertIsNone(cache.get('"b"', "gzip"))
+        self.assertEqual(cache.get('"a"', "gzip"), b"a")
+
+
+class TestCompressionMiddleware(unittest.TestCase):
+
+    def test_large_body_is_compressed_once(self):
+        hits = metrics.COMPRESSION_CACHE_HITS.value("gzip")
+        for _ in range(2):
+            response = client.get("/items", headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(response.headers["content-encoding"], "gzip")
+            self.assertEqual(response.headers["vary"], "Accept-Encoding")
+            self.assertEqual(response.headers["etag"], 'W/"items-v1"')
+            self.assertEqual(response.json(), ITEMS)
+        self.assertEqual(metrics.COMPRESSION_CACHE_HITS.value("gzip"), hits + 1)
+        self.assertGreater(metrics.COMPRESSION_RATIO.count("gzip"), 0)
+
+    def test_small_body_and_identity_are_not_compressed(self):
+        response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("content-encoding", response.headers)
+        response = client.get("/items", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.headers["etag"], '"items-v1"')
+
+    def test_stream_is_compressed_chunk_by_chunk(self):
+        with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+            self.assertEqual(response.headers["content-encoding"], "gzip")
+            self.assertNotIn("content-length", response.headers)
+            raw = b"".join(response.iter_raw())
+        lines = gzip.decompress(raw).splitlines()
+        self.assertEqual([serialization.loads(line) for line in lines], ITEMS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+import httpx
+
+from app.services import serialization
+from app.services.conditional import UpstreamValidators, etag_for, none_match, respond
+
+COMPANY = {"id": "12345678-1234-5678-1234-567812345678", "name": "Test Company"}
+
+
+class TestConditional(unittest.TestCase):
+
+    def test_etag_is_stable_per_representation(self):
+        self.assertEqual(etag_for(COMPANY, "company"), etag_for(dict(COMPANY), "company"))
+        self.assertNotEqual(etag_for(COMPANY, "company"), etag_for(COMPANY, "companies-user"))
+        self.assertNotEqual(etag_for(COMPANY, "company"), etag_for({**COMPANY, "name": "Other"}, "company"))
+
+    def test_none_match_uses_weak_comparison(self):
+        etag = etag_for(COMPANY, "company")
+        self.assertTrue(none_match(etag, etag))
+        self.assertTrue(none_match(f'"other", W/{etag}', etag))
+        self.assertTrue(none_match("*", etag))
+        self.assertFalse(none_match('"other"', etag))
+        self.assertFalse(none_match(None, etag))
+
+    def test_respond_skips_rendering_on_match(self):
+        rendered = []
+
+        def render():
+            rendered.append(True)
+            return serialization.json_response(COMPANY)
+
+        response = respond(COMPANY, render, None, "company", "private, no-cache")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["cache-control"], "private, no-cache")
+
+        response = respond(COMPANY, render, response.headers["etag"], "company", "private, no-cache")
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.body, b"")
+        self.assertEqual(len(rendered), 1)
+
+
+class TestUpstreamValidators(unittest.TestCase):
+
+    def test_revalidates_with_the_stored_etag(self):
+        validators = UpstreamValidators()
+        self.assertEqual(validators.headers("company"), {})
+
+        fresh = httpx.Response(200, json=COMPANY, headers={"ETag": '"v1"'})
+        self.assertEqual(validators.resolve("company", fresh), (COMPANY, 200))
+        self.assertEqual(validators.headers("company"), {"If-None-Match": '"v1"'})
+
+        self.assertEqual(validators.resolve("company", httpx.Response(304)), (COMPANY, 200))
+
+    def test_error_drops_the_stored_entry(self):
+        validators = UpstreamValidators()
+        validators.resolve("company", httpx.Response(200, json=COMPANY, headers={"ETag": '"v1"'}))
+        self.assertEqual(validators.resolve("company", httpx.Response(404, json={"detail": "Not found"})),
+                         ({"detail": "Not found"}, 404))
+        self.assertEqual(validators.headers("company"), {})
+
+    def test_entries_are_kept_per_scope(self):
+        validators = UpstreamValidators()
+        validators.resolve(("company", "admin"), httpx.Response(200, json=COMPANY, headers={"ETag": '"v1"'}))
+        self.assertEqual(validators.headers(("company", "someone")), {})
+        self.assertEqual(validators.resolve(("company", "someone"), httpx.Response(403, json={"detail": "Forbidden"})),
+                         ({"detail": "Forbidden"}, 403))
+        self.assertEqual(validators.headers(("company", "admin")), {"If-None-Match": '"v1"'})
+
+    def test_size_is_bounded(self):
+        validators = UpstreamValidators(max_size=2)
+        for key in ("a", "b", "c"):
+            validators.resolve(key, httpx.Response(200, json=COMPANY, headers={"ETag": f'"{key}"'}))
+        self.assertEqual(len(validators), 2)
+        self.assertEqual(validators.headers("a"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import exc, text
+
+from app.services import metrics
+from app.services.database import Database, DatabaseSettings, load_settings
+
+
+class TestDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "test.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_settings_from_env(self):
+        env = {"DB_HOST": "db", "DB_USERNAME": "user", "DB_PASSWORD": "secret", "DB_POOL_SIZE": "20",
+               "DB_MAX_OVERFLOW": "5", "DB_POOL_PRE_PING": "false"}
+        with patch.dict(os.environ, env):
+            os.environ.pop("DATABASE_URL", None)
+            os.environ.pop("DB_ASYNC", None)
+            settings = load_settings()
+        self.assertEqual(settings.url, "postgresql://user:secret@db/postgres")
+        self.assertFalse(settings.async_mode)
+        self.assertEqual((settings.pool_size, settings.max_overflow, settings.pool_pre_ping), (20, 5, False))
+
+    def test_async_mode_is_opt_in(self):
+        env = {"DB_HOST": "db", "DB_USERNAME": "user", "DB_PASSWORD": "secret", "DB_ASYNC": "true"}
+        with patch.dict(os.environ, env):
+            os.environ.pop("DATABASE_URL", None)
+            settings = load_settings()
+        self.assertEqual(settings.url, "postgresql+asyncpg://user:secret@db/postgres")
+        self.assertTrue(settings.async_mode)
+
+    def test_async_session_records_checkout_wait(self):
+        database = Database(DatabaseSettings(url=f"sqlite+aiosqlite:///{self.path}", pool_size=1, max_overflow=0,
+                                             pool_timeout=0.05), name="test_async")
+
+        async def scenario():
+            async with database.session() as session:
+                result = await database.execute(session, text("SELECT 1"))
+                self.assertEqual(result.scalar(), 1)
+                self.assertEqual(database.pool_stats()["checked_out"], 1)
+                # The only connection is held by the open session, so a second checkout times out
+                with self.assertRaises(exc.TimeoutError):
+                    async with database.engine.connect():
+                        pass
+            await database.dispose()
+
+        asyncio.run(scenario())
+        self.assertGreaterEqual(metrics.DB_POOL_CHECKOUT_SECONDS.count("test_async"), 2)
+        self.assertEqual(metrics.DB_POOL_TIMEOUTS.value("test_async"), 1)
+        self.assertIsNone(database.pool_stats())
+
+    def test_sync_mode_runs_off_the_loop(self):
+        database = Database(DatabaseSettings(url=f"sqlite:///{self.path}", async_mode=False), name="test_sync")
+
+        async def scenario():
+            async with database.session() as session:
+                result = await database.execute(session, text("SELECT 1"))
+                self.assertEqual(result.scalar(), 1)
+            await database.dispose()
+
+        asyncio.run(scenario())
+        self.assertGreaterEqual(metrics.DB_POOL_CHECKOUT_SECONDS.count("test_sync"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
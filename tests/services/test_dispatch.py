@@ -0,0 +1,190 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import httpx
+
+from app.services.database import Database, DatabaseSettings
+from app.services.dispatch import (FAILED, QUEUED, SENT, DatabaseJobStore, Dispatcher, DispatchSettings,
+                                   IncidentSender, Job, QueueFull, bulk_idempotency_key)
+
+SETTINGS = DispatchSettings(enabled=True, max_size=10, batch_size=5, batch_wait=0.02, concurrency=2,
+                            max_attempts=3, backoff_base=0.001)
+
+
+class RecordingSender:
+    def __init__(self, statuses=None):
+        self.batches = []
+        self.statuses = list(statuses or [])
+
+    async def __call__(self, items):
+        self.batches.append([payload for _, payload in items])
+        status = self.statuses.pop(0) if self.statuses else 201
+        return [({"created": payload}, status) for _, payload in items]
+
+
+class TestDispatcher(unittest.TestCase):
+
+    def test_jobs_are_sent_in_batches(self):
+        sender = RecordingSender()
+        dispatcher = Dispatcher(sender, SETTINGS)
+
+        async def scenario():
+            await dispatcher.start()
+            jobs = [await dispatcher.submit({"user_id": index}) for index in range(7)]
+            await dispatcher.stop(timeout=1)
+            return [await dispatcher.status(job.id) for job in jobs]
+
+        jobs = asyncio.run(scenario())
+        self.assertEqual([job.status for job in jobs], [SENT] * 7)
+        self.assertEqual(jobs[0].result, {"created": {"user_id": 0}})
+        self.assertEqual([len(batch) for batch in sender.batches], [5, 2])
+
+    def test_full_queue_rejects(self):
+        release = asyncio.Event
+
+        async def scenario():
+            gate = release()
+
+            async def slow_sender(items):
+                await gate.wait()
+                return [(None, 201) for _ in items]
+
+            dispatcher = Dispatcher(slow_sender, DispatchSettings(enabled=True, max_size=2, batch_wait=0))
+            await dispatcher.start()
+            await dispatcher.submit({"user_id": 1})
+            await dispatcher.submit({"user_id": 2})
+            with self.assertRaises(QueueFull) as context:
+                await dispatcher.submit({"user_id": 3})
+            self.assertGreaterEqual(context.exception.retry_after, 1)
+            gate.set()
+            await dispatcher.stop(timeout=1)
+            self.assertEqual((dispatcher.stats.sent, dispatcher.stats.rejected), (2, 1))
+
+        asyncio.run(scenario())
+
+    def test_retries_transient_failures_only(self):
+        sender = RecordingSender(statuses=[503, 201, 400])
+        dispatcher = Dispatcher(sender, SETTINGS)
+
+        async def scenario():
+            await dispatcher.start()
+            retried = await dispatcher.submit({"user_id": 1})
+            await asyncio.sleep(0.1)
+            rejected = await dispatcher.submit({"user_id": 2})
+            await dispatcher.stop(timeout=1)
+            return await dispatcher.status(retried.id), await dispatcher.status(rejected.id)
+
+        retried, rejected = asyncio.run(scenario())
+        self.assertEqual((retried.status, retried.attempts), (SENT, 2))
+        self.assertEqual((rejected.status, rejected.attempts, rejected.status_code), (FAILED, 1, 400))
+        self.assertEqual(dispatcher.stats.retries, 1)
+
+    def test_stop_cancels_pending_retries(self):
+        sender = RecordingSender(statuses=[503])
+        settings = DispatchSettings(enabled=True, batch_wait=0.01, max_attempts=3, backoff_base=0.2, backoff_max=0.2)
+        dispatcher = Dispatcher(sender, settings)
+
+        async def scenario():
+            await dispatcher.start()
+            job = await dispatcher.submit({"user_id": 1})
+            while dispatcher.stats.retries == 0:
+                await asyncio.sleep(0.005)
+            await dispatcher.stop(timeout=0)
+            # Past the longest backoff, so a surviving timer would have fired by now
+            await asyncio.sleep(0.3)
+            return job
+
+        job = asyncio.run(scenario())
+        self.assertEqual((job.status, job.attempts), (QUEUED, 1))
+        self.assertEqual(dispatcher._queue.qsize(), 0)
+        self.assertEqual(len(sender.batches), 1)
+
+    def test_durable_jobs_are_recovered(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = Database(DatabaseSettings(url=f"sqlite+aiosqlite:///{directory}/dispatch.db"),
+                                name="dispatch_test")
+            store = DatabaseJobStore(database)
+            sender = RecordingSender()
+
+            async def scenario():
+                await store.setup()
+                # Queued by a previous process that stopped before sending it
+                await store.add(Job(id="a" * 32, payload={"user_id": 1}, created_at=time.time(), updated_at=time.time()))
+                dispatcher = Dispatcher(sender, SETTINGS, store)
+                await dispatcher.start()
+                await dispatcher.stop(timeout=1)
+                job = await dispatcher.status("a" * 32)
+                await database.dispose()
+                return job
+
+            job = asyncio.run(scenario())
+        self.assertEqual(job.status, SENT)
+        self.assertEqual(sender.batches, [[{"user_id": 1}]])
+
+    def test_durable_jobs_are_claimed_by_one_worker(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = Database(DatabaseSettings(url=f"sqlite+aiosqlite:///{directory}/dispatch.db"),
+                                name="dispatch_test")
+            now = [1000.0]
+            first = DatabaseJobStore(database, lease=60, owner="host:1", clock=lambda: now[0])
+            second = DatabaseJobStore(database, lease=60, owner="host:2", clock=lambda: now[0])
+            crashed = DatabaseJobStore(database, lease=60, owner="host:3", clock=lambda: now[0])
+
+            async def scenario():
+                await crashed.setup()
+                for index in range(3):
+                    await crashed.add(Job(id=f"{index}" * 32, payload={"user_id": index}, created_at=now[0] + index,
+                                          updated_at=now[0], status=QUEUED))
+                # Jobs of a live owner stay with it
+                claims = [await first.claim(), await second.claim()]
+                now[0] += 61
+                # Once the lease lapses, only one worker takes them over
+                claims += [await first.claim(), await second.claim()]
+                await first.release()
+                claims.append(await second.claim())
+                await database.dispose()
+                return [[job.id[0] for job in claim] for claim in claims]
+
+            claims = asyncio.run(scenario())
+        self.assertEqual(claims, [[], [], ["0", "1", "2"], [], ["0", "1", "2"]])
+
+
+class TestIncidentSender(unittest.TestCase):
+
+    @patch("app.services.dispatch.upstream.send", new_callable=AsyncMock)
+    def test_falls_back_to_single_posts(self, mock_send):
+        def respond(upstream, method, url, **kwargs):
+            if url.endswith("/bulk"):
+                return httpx.Response(404, json={"detail": "Not Found"})
+            return httpx.Response(201, json={"id": kwargs["headers"]["Idempotency-Key"]})
+
+        mock_send.side_effect = respond
+        sender = IncidentSender("http://incidents")
+        outcomes = asyncio.run(sender([("job-1", {"user_id": 1}), ("job-2", {"user_id": 2})]))
+        self.assertEqual(outcomes, [({"id": "job-1"}, 201), ({"id": "job-2"}, 201)])
+        self.assertFalse(sender.bulk_supported)
+
+    @patch("app.services.dispatch.upstream.send", new_callable=AsyncMock)
+    def test_bulk_post_carries_a_batch_idempotency_key(self, mock_send):
+        mock_send.return_value = httpx.Response(201, json=[{"id": 1}, {"id": 2}])
+        sender = IncidentSender("http://incidents")
+        outcomes = asyncio.run(sender([("job-1", {"user_id": 1}), ("job-2", {"user_id": 2})]))
+        self.assertEqual(outcomes, [({"id": 1}, 201), ({"id": 2}, 201)])
+        key = mock_send.call_args.kwargs["headers"]["Idempotency-Key"]
+        self.assertEqual(key, bulk_idempotency_key(["job-1", "job-2"]))
+        self.assertNotEqual(key, bulk_idempotency_key(["job-1", "job-3"]))
+
+    @patch("app.services.dispatch.upstream.send", new_callable=AsyncMock)
+    def test_mismatched_bulk_answer_fails_the_batch(self, mock_send):
+        mock_send.return_value = httpx.Response(201, json=[{"id": 1}])
+        sender = IncidentSender("http://incidents")
+        outcomes = asyncio.run(sender([("job-1", {"user_id": 1}), ("job-2", {"user_id": 2})]))
+        # A retriable failure, so the jobs are not marked sent
+        self.assertEqual(outcomes, [([{"id": 1}], 502)] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
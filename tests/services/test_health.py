@@ -0,0 +1,129 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.health import HealthProber, Probe
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def check(state):
+    async def run():
+        if state.get("delay"):
+            await asyncio.sleep(state["delay"])
+        if state.get("error"):
+            raise ConnectionError(state["error"])
+
+    return run
+
+
+class TestHealthProber(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.user_service = {}
+        self.incident_query = {}
+        self.prober = HealthProber([
+            Probe("user_service", check(self.user_service)),
+            Probe("incident_query", check(self.incident_query), critical=False),
+        ], interval=5, timeout=0.05, clock=self.clock)
+
+    def test_pending_until_first_run(self):
+        self.assertFalse(self.prober.ready())
+        report = self.prober.report()
+        self.assertEqual(report["status"], "unavailable")
+        self.assertEqual(report["checks"]["user_service"]["status"], "pending")
+
+    def test_ready_when_all_checks_pass(self):
+        asyncio.run(self.prober.run_once())
+
+        report = self.prober.report()
+        self.assertTrue(self.prober.ready())
+        self.assertEqual(report["status"], "ready")
+        self.assertEqual(report["checks"]["user_service"]["status"], "up")
+        self.assertIn("latency_ms", report["checks"]["user_service"])
+        self.assertEqual(self.prober.stats()["user_service"]["up"], 1)
+
+    def test_critical_failure_is_unready(self):
+        self.user_service["error"] = "refused"
+        asyncio.run(self.prober.run_once())
+
+        report = self.prober.report()
+        self.assertFalse(self.prober.ready())
+        self.assertEqual(report["checks"]["user_service"]["status"], "down")
+        self.assertEqual(report["checks"]["user_service"]["error"], "ConnectionError: refused")
+
+    def test_non_critical_failure_stays_ready(self):
+        self.incident_query["error"] = "refused"
+        asyncio.run(self.prober.run_once())
+
+        self.assertTrue(self.prober.ready())
+        self.assertEqual(self.prober.report()["checks"]["incident_query"]["status"], "down")
+        self.assertEqual(self.prober.stats()["incident_query"]["up"], 0)
+
+    def test_slow_check_times_out(self):
+        self.user_service["delay"] = 1
+        asyncio.run(self.prober.run_once())
+
+        self.assertFalse(self.prober.ready())
+        self.assertIn("Timed out", self.prober.report()["checks"]["user_service"]["error"])
+
+    def test_stale_results_are_unready(self):
+        asyncio.run(self.prober.run_once())
+        self.clock.now += 16
+
+        self.assertFalse(self.prober.ready())
+        self.assertEqual(self.prober.report()["checks"]["user_service"]["age_seconds"], 16)
+
+    def test_background_loop_refreshes_results(self):
+        async def scenario():
+            self.prober.start()
+            # Wait for the first background run instead of a fixed delay a loop stall can outlast
+            for _ in range(100):
+                if self.prober.results:
+                    break
+                await asyncio.sleep(0.01)
+            await self.prober.stop()
+
+        asyncio.run(scenario())
+        self.assertTrue(self.prober.ready())
+
+
+class TestHealthEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        self.prober = HealthProber([Probe("user_service", check({}))])
+
+    def test_liveness_does_not_check_dependencies(self):
+        with patch("app.services.health.prober", self.prober):
+            response = self.client.get("/user-management/health/live")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "OK"})
+
+    def test_readiness_is_503_until_probed(self):
+        with patch("app.services.health.prober", self.prober):
+            response = self.client.get("/user-management/health/ready")
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["checks"]["user_service"]["status"], "pending")
+
+    def test_readiness_reports_cached_results(self):
+        asyncio.run(self.prober.run_once())
+        with patch("app.services.health.prober", self.prober):
+            response = self.client.get("/user-management/health/ready")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "ready")
+
+
+if __name__ == "__main__":
+    unittest.main()
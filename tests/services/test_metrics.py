@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.errors.errors import UpstreamTimeout
+from app.main import app
+from app.services import metrics, upstream
+from app.services.metrics import Counter, Histogram, MultiprocessMetrics, Registry, merge_snapshots, retire_worker
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, "/a")
+        text = registry.render()
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1"} 2', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_count{route="/a"} 3', text)
+        self.assertIn('latency_seconds_sum{route="/a"} 5.55', text)
+
+    def test_label_count_is_checked(self):
+        with self.assertRaises(ValueError):
+            Counter("requests_total", "Requests", ("method",)).inc()
+
+    def test_collectors_are_rendered(self):
+        registry = Registry()
+        registry.add_collector(metrics.stats_collector(
+            "cache", "Cache", "cache", lambda: {"company": {"hits": 3, "enabled": True}}, ("hits",)
+        ))
+        self.assertIn('cache_hits{cache="company"} 3', registry.render())
+
+    def test_collector_counters_get_the_counter_type(self):
+        registry = Registry()
+        registry.add_collector(metrics.stats_collector(
+            "cache", "Cache", "cache", lambda: {"company": {"hits": 3, "size": 2}}, ("size",), counters=("hits",)
+        ))
+        text = registry.render()
+        self.assertIn("# TYPE cache_hits_total counter", text)
+        self.assertIn('cache_hits_total{cache="company"} 3', text)
+        self.assertIn("# TYPE cache_size gauge", text)
+        self.assertNotIn("cache_hits{", text)
+
+    def test_registering_twice_returns_existing_metric(self):
+        registry = Registry()
+        first = registry.histogram("h", "H")
+        self.assertIs(registry.histogram("h", "H"), first)
+        self.assertIsInstance(first, Histogram)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+
+    def test_requests_are_labelled_by_route_template(self):
+        before = metrics.REQUESTS.value("GET", "/user-management/health", 200)
+        self.client.get("/user-management/health")
+        response = self.client.get("/user-management/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertEqual(metrics.REQUESTS.value("GET", "/user-management/health", 200), before + 1)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/user-management/health"',
+                      response.text)
+        self.assertIn("http_requests_in_flight", response.text)
+        self.assertIn('coalescer_window_seconds_total{loader="company"}', response.text)
+
+    def test_path_parameters_do_not_create_new_labels(self):
+        with patch('app.routers.company.get_company_request', return_value=({"detail": "nf"}, 404)):
+            self.client.get("/user-management/company/0d4d5d3c-3e8b-4b2b-9c49-6a3c6e1e9f10")
+        self.assertGreaterEqual(metrics.REQUESTS.value("GET", "/user-management/company/{company_id}", 404), 1)
+        self.assertEqual(metrics.REQUESTS.value("GET", "/user-management/not-a-route", 404), 0)
+
+    def test_api_errors_are_counted(self):
+        before = metrics.API_ERRORS.value("UpstreamTimeout", 504)
+        with patch('app.routers.company.get_company_request', side_effect=UpstreamTimeout("slow")):
+            response = self.client.get("/user-management/company/0d4d5d3c-3e8b-4b2b-9c49-6a3c6e1e9f10")
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(metrics.API_ERRORS.value("UpstreamTimeout", 504), before + 1)
+
+
+class TestUpstreamMetrics(unittest.TestCase):
+
+    def tearDown(self):
+        asyncio.run(upstream.shutdown())
+        upstream.set_transport(upstream.INCIDENT_QUERY, None)
+        upstream.reset_guards()
+
+    def test_send_observes_latency_per_upstream(self):
+        upstream.set_transport(upstream.INCIDENT_QUERY, httpx.MockTransport(lambda request: httpx.Response(200)))
+        before = metrics.UPSTREAM_LATENCY.count(upstream.INCIDENT_QUERY, "GET", 200)
+        asyncio.run(upstream.send(upstream.INCIDENT_QUERY, "GET", "http://query.test/q"))
+        self.assertEqual(metrics.UPSTREAM_LATENCY.count(upstream.INCIDENT_QUERY, "GET", 200), before + 1)
+        self.assertEqual(metrics.UPSTREAM_IN_FLIGHT.value(upstream.INCIDENT_QUERY), 0)
+
+
+class TestMultiprocessMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def worker_registry(self, requests, in_flight):
+        registry = Registry()
+        registry.counter("requests_total", "Requests", ("route",)).inc("/a", amount=requests)
+        registry.gauge("in_flight", "In flight").set(value=in_flight)
+        histogram = registry.histogram("latency_seconds", "Latency", buckets=(1.0,))
+        histogram.observe(0.5)
+        return registry
+
+    def test_counters_and_histograms_are_summed_and_gauges_kept_per_worker(self):
+        families = {name: samples for name, _, _, samples in merge_snapshots({
+            "1": self.worker_registry(2, 1).snapshot(),
+            "2": self.worker_registry(3, 4).snapshot(),
+        })}
+        self.assertEqual(families["requests_total"], [("requests_total", {"route": "/a"}, 5)])
+        self.assertEqual(families["in_flight"], [
+            ("in_flight", {"worker": "1"}, 1), ("in_flight", {"worker": "2"}, 4),
+        ])
+        self.assertIn(("latency_seconds_count", {}, 2), families["latency_seconds"])
+
+    def test_scrape_merges_other_workers_snapshots(self):
+        MultiprocessMetrics(self.directory.name, worker="1", registry=self.worker_registry(2, 1)).write()
+        local = MultiprocessMetrics(self.directory.name, worker="2", registry=self.worker_registry(3, 4))
+
+        text = local.render()
+        self.assertIn('requests_total{route="/a"} 5', text)
+        self.assertIn('in_flight{worker="1"} 1', text)
+        self.assertIn('in_flight{worker="2"} 4', text)
+
+    def test_retired_workers_are_folded_into_one_snapshot(self):
+        MultiprocessMetrics(self.directory.name, worker="1", registry=self.worker_registry(2, 1)).write()
+        MultiprocessMetrics(self.directory.name, worker="2", registry=self.worker_registry(3, 4)).write()
+        retire_worker(self.directory.name, "1")
+        retire_worker(self.directory.name, "2")
+
+        self.assertEqual(os.listdir(self.directory.name), ["retired.json"])
+        with open(os.path.join(self.directory.name, "retired.json")) as f:
+            names = [family[0] for family in json.load(f)]
+        self.assertEqual(names, ["requests_total", "latency_seconds"])
+
+        # A new worker reusing a retired pid adds to the totals instead of replacing them
+        MultiprocessMetrics(self.directory.name, worker="1", registry=self.worker_registry(1, 7)).write()
+        text = MultiprocessMetrics(self.directory.name, worker="3", registry=Registry()).render()
+        self.assertIn('requests_total{route="/a"} 6', text)
+        self.assertIn("latency_seconds_count 3", text)
+        self.assertIn('in_flight{worker="1"} 7', text)
+        self.assertNotIn('worker="2"', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
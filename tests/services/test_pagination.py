@@ -0,0 +1,67 @@
+import unittest
+
+from fastapi import HTTPException
+
+from app.services.pagination import PageParams, decode_cursor, encode_cursor, page_params, wrap_upstream_cursor
+
+ITEMS = [{"id": index, "name": f"Item {index}", "state": "open"} for index in range(5)]
+
+
+class TestPageParams(unittest.TestCase):
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(40)), (40, None))
+        self.assertEqual(decode_cursor(wrap_upstream_cursor("abc")), (0, "abc"))
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ("garbage", encode_cursor(1)[:-1] + "!", "bzotMQ"):
+            with self.assertRaises(HTTPException) as context:
+                decode_cursor(cursor)
+            self.assertEqual(context.exception.status_code, 400)
+
+    def test_gateway_pages_through_the_full_list(self):
+        page, next_cursor = page_params(limit=2, cursor=None, fields=None).paginate(ITEMS, "incidents")
+        self.assertEqual([item["id"] for item in page], [0, 1])
+        page, next_cursor = page_params(limit=2, cursor=next_cursor, fields=None).paginate({"incidents": ITEMS}, "incidents")
+        self.assertEqual([item["id"] for item in page], [2, 3])
+        page, next_cursor = page_params(limit=2, cursor=next_cursor, fields=None).paginate(ITEMS, "incidents")
+        self.assertEqual([item["id"] for item in page], [4])
+        self.assertIsNone(next_cursor)
+
+    def test_upstream_honoring_limit_is_asked_for_the_whole_prefix(self):
+        def upstream(params):
+            # Ignores cursors but returns at most ``limit`` items
+            return {"incidents": ITEMS[:params["limit"]]}
+
+        pages, cursor = [], None
+        while True:
+            page = page_params(limit=2, cursor=cursor, fields=None)
+            items, cursor = page.paginate(upstream(page.upstream_params()), "incidents")
+            pages.append([item["id"] for item in items])
+            if cursor is None:
+                break
+        self.assertEqual(pages, [[0, 1], [2, 3], [4]])
+
+    def test_upstream_pages_are_kept(self):
+        payload = {"companies": ITEMS[:2], "next_cursor": "upstream-token"}
+        page, next_cursor = PageParams(limit=2).paginate(payload, "companies")
+        self.assertEqual(page, ITEMS[:2])
+        following = page_params(limit=2, cursor=next_cursor, fields=None)
+        self.assertEqual(following.upstream_params(), {"limit": 2, "cursor": "upstream-token"})
+
+    def test_inactive_page_returns_everything(self):
+        self.assertEqual(PageParams().paginate(ITEMS, "incidents"), (ITEMS, None))
+        self.assertEqual(PageParams().paginate(None, "incidents"), ([], None))
+
+    def test_projection(self):
+        page = PageParams(fields=("id", "missing"))
+        self.assertEqual(page.project(ITEMS[:1]), [{"id": 0}])
+        self.assertEqual(PageParams().project(ITEMS), ITEMS)
+
+    def test_upstream_params(self):
+        params = PageParams(limit=20, upstream_cursor="abc", fields=("id", "name")).upstream_params()
+        self.assertEqual(params, {"limit": 20, "cursor": "abc", "fields": "id,name"})
+
+
+if __name__ == "__main__":
+    unittest.main()
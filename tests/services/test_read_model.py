@@ -0,0 +1,210 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import jwt
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.read_store import metadata
+from app.services.auth import ALGORITHM, SECRET_KEY
+from app.services.database import Database, DatabaseSettings
+from app.services.read_model import ChangeFeedUnsupported, ReadModel, ReadModelSettings, SyncJob
+
+USER_ID = "12345678-1234-5678-1234-567812345678"
+COMPANY = {
+    "id": "87654321-4321-8765-4321-876543218765",
+    "username": "testuser@example.com",
+    "name": "Test Company",
+    "first_name": "John",
+    "last_name": "Doe",
+    "birth_date": "2023-01-01",
+    "phone_number": "+12 345 678 9012",
+    "country": "TestCountry",
+    "city": "TestCity",
+}
+USER = {"id": USER_ID, "document_type": "passport", "document_id": "A1234567", "first_name": "Jane"}
+TOKEN = jwt.encode({"sub": "test@example.com"}, SECRET_KEY, algorithm=ALGORITHM)
+OTHER_TOKEN = jwt.encode({"sub": "other@example.com"}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestReadModel(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = Database(DatabaseSettings(url=f"sqlite+aiosqlite:///{self.directory.name}/read.db"),
+                                 name="read_model_test")
+        self.clock = Clock()
+        self.model = ReadModel(self.database, ReadModelSettings(enabled=True, max_staleness=60), clock=self.clock)
+        asyncio.run(self.database.create_all(metadata))
+
+    def tearDown(self):
+        asyncio.run(self.database.dispose())
+        self.directory.cleanup()
+
+    def test_company_is_served_until_stale(self):
+        async def scenario():
+            self.assertIsNone(await self.model.get_company(COMPANY["id"], TOKEN))
+            await self.model.put_companies([COMPANY], TOKEN)
+            self.assertEqual(await self.model.get_company(COMPANY["id"], TOKEN), COMPANY)
+            # Local rows are only served to callers the upstream would also accept
+            self.assertIsNone(await self.model.get_company(COMPANY["id"], None))
+            self.assertIsNone(await self.model.get_company(COMPANY["id"], "not-a-token"))
+            self.clock.now += 61
+            self.assertIsNone(await self.model.get_company(COMPANY["id"], TOKEN))
+
+        asyncio.run(scenario())
+        self.assertEqual((self.model.stats.hits, self.model.stats.misses, self.model.stats.ungranted), (1, 1, 1))
+
+    def test_rows_are_only_served_to_the_principal_granted_them(self):
+        async def scenario():
+            await self.model.put_companies([COMPANY], TOKEN)
+            # Another valid token has not been authorized by the upstream for this company
+            self.assertIsNone(await self.model.get_company(COMPANY["id"], OTHER_TOKEN))
+            await self.model.put_companies([COMPANY], OTHER_TOKEN)
+            self.assertEqual(await self.model.get_company(COMPANY["id"], OTHER_TOKEN), COMPANY)
+            # Writes without a verified principal store the row but grant it to no one
+            self.clock.now += 61
+            await self.model.put_companies([COMPANY])
+            self.assertIsNone(await self.model.get_company(COMPANY["id"], TOKEN))
+
+        asyncio.run(scenario())
+        self.assertEqual(self.model.stats.ungranted, 2)
+
+    def test_concurrent_write_throughs_of_one_id_all_land(self):
+        async def scenario():
+            await asyncio.gather(*(self.model.put_companies([COMPANY], TOKEN) for _ in range(10)))
+            await asyncio.gather(*(self.model.put_users([USER], TOKEN) for _ in range(10)))
+            await asyncio.gather(*(self.model.put_user_companies(USER_ID, [COMPANY], token=TOKEN) for _ in range(10)))
+            return await self.model.get_company(COMPANY["id"], TOKEN)
+
+        self.assertEqual(asyncio.run(scenario()), COMPANY)
+        self.assertEqual((self.model.stats.writes, self.model.stats.errors), (30, 0))
+
+    def test_user_companies_by_id_and_document(self):
+        async def scenario():
+            await self.model.put_users([USER], TOKEN)
+            self.assertIsNone(await self.model.get_user_companies(TOKEN, user_id=USER_ID))
+            await self.model.put_user_companies(USER_ID, [{"id": COMPANY["id"], "name": "Test Company"}], token=TOKEN)
+            expected = {"user_id": USER_ID, "companies": [{"id": COMPANY["id"], "name": "Test Company"}]}
+            self.assertEqual(await self.model.get_user_companies(TOKEN, user_id=USER_ID), expected)
+            self.assertEqual(await self.model.get_user_companies(TOKEN, document=("passport", "A1234567")), expected)
+            self.assertIsNone(await self.model.get_user_companies(OTHER_TOKEN, document=("passport", "A1234567")))
+            await self.model.put_user_companies(USER_ID, [], token=TOKEN)
+            self.assertEqual(await self.model.get_user_companies(TOKEN, user_id=USER_ID),
+                             {"user_id": USER_ID, "companies": []})
+
+        asyncio.run(scenario())
+
+    def test_sync_applies_pages_and_rows_age_from_their_own_write(self):
+        pages = [
+            ({"companies": [COMPANY], "next_cursor": "1", "has_more": True}, 200),
+            ({"users": [USER], "user_companies": [{"user_id": USER_ID, "companies": [COMPANY]}],
+              "next_cursor": "2", "has_more": False}, 200),
+        ]
+        cursors = []
+
+        async def fetch(cursor, limit):
+            cursors.append(cursor)
+            return pages[len(cursors) - 1]
+
+        async def scenario():
+            self.assertEqual(await self.model.sync(fetch), 3)
+            # The feed refreshes data but grants nobody; a principal needs an upstream read first
+            self.assertIsNone(await self.model.get_user(USER_ID, TOKEN))
+            await self.model.put_users([USER], TOKEN)
+            self.clock.now += 50
+            pages.append(({"next_cursor": "2", "has_more": False}, 200))
+            self.assertEqual(await self.model.sync(fetch), 0)
+            self.assertEqual(await self.model.get_user(USER_ID, TOKEN), USER)
+            # A later sync that did not touch the row does not make it fresh again
+            self.clock.now += 20
+            self.assertIsNone(await self.model.get_user(USER_ID, TOKEN))
+            self.assertEqual(await self.model.load_sync_state(), "2")
+
+        asyncio.run(scenario())
+        self.assertEqual(cursors, [None, "1", "2"])
+
+    def test_sync_without_change_feed(self):
+        async def fetch(cursor, limit):
+            return {"detail": "Not Found"}, 404
+
+        with self.assertRaises(ChangeFeedUnsupported):
+            asyncio.run(self.model.sync(fetch))
+
+    def test_only_the_lease_holder_syncs(self):
+        fetched = []
+
+        async def fetch(cursor, limit):
+            fetched.append(cursor)
+            return {"next_cursor": "1", "has_more": False}, 200
+
+        first = SyncJob(self.model, fetch, interval=10, owner="host:1")
+        second = SyncJob(self.model, fetch, interval=10, owner="host:2")
+
+        async def scenario():
+            self.assertTrue(await first.run_once())
+            self.assertFalse(await second.run_once())
+            self.assertTrue(await first.run_once())
+            # A holder that stops renewing loses the lease once it lapses
+            self.clock.now += 31
+            self.assertTrue(await second.run_once())
+            self.assertFalse(await first.run_once())
+
+        asyncio.run(scenario())
+        self.assertEqual(len(fetched), 3)
+        self.assertEqual(self.model.stats.sync_skipped, 2)
+
+    def test_lease_holder_prunes_expired_grants(self):
+        async def fetch(cursor, limit):
+            return {"detail": "Not Found"}, 404
+
+        job = SyncJob(self.model, fetch, interval=10, owner="host:1")
+
+        async def scenario():
+            await self.model.put_companies([COMPANY], TOKEN)
+            self.clock.now += 61
+            # Without a change feed the job keeps pruning
+            self.assertTrue(await job.run_once())
+            self.assertTrue(await job.run_once())
+
+        asyncio.run(scenario())
+        self.assertEqual(self.model.stats.grants_pruned, 1)
+
+    def test_create_company_writes_through(self):
+        from app.routers import company
+
+        app = FastAPI()
+        app.include_router(company.router)
+        client = TestClient(app)
+        asyncio.run(company.company_cache.clear())
+
+        async def create(*args):
+            return COMPANY, 201
+
+        with patch.object(company, "read_model", self.model), \
+                patch.object(company, "create_company_request", side_effect=create), \
+                patch.object(company.company_loader, "load") as load:
+            body = {key: value for key, value in COMPANY.items() if key != "id"}
+            response = client.post("/user-management/company/", json={**body, "password": "testpass"},
+                                   headers={"token": TOKEN})
+            self.assertEqual(response.status_code, 201)
+            response = client.get(f"/user-management/company/{COMPANY['id']}", headers={"token": TOKEN})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["name"], "Test Company")
+            load.assert_not_called()
+        asyncio.run(company.company_cache.clear())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import asyncio
+import unittest
+
+import httpx
+
+from app.errors.errors import UpstreamBusy, UpstreamError, UpstreamTimeout, UpstreamUnavailable
+from app.services import upstream
+from app.services.resilience import CircuitBreaker, ResiliencePolicy, UpstreamGuard
+
+
+async def no_sleep(delay):
+    return None
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def responses(*items):
+    """Request callable returning (or raising) the given items in order."""
+    calls = []
+
+    async def request():
+        item = items[len(calls)]
+        calls.append(item)
+        if isinstance(item, Exception):
+            raise item
+        return httpx.Response(item)
+
+    return request, calls
+
+
+class TestUpstreamGuard(unittest.TestCase):
+
+    def guard(self, **policy):
+        return UpstreamGuard("test", ResiliencePolicy(**policy), sleep=no_sleep)
+
+    def test_idempotent_calls_retry_retryable_statuses(self):
+        request, calls = responses(503, 502, 200)
+        guard = self.guard(retries=2)
+        response = asyncio.run(guard.call(request, idempotent=True))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(guard.stats.retries, 2)
+
+    def test_non_idempotent_calls_are_not_retried(self):
+        request, calls = responses(503, 200)
+        response = asyncio.run(self.guard(retries=2).call(request, idempotent=False))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(calls), 1)
+
+    def test_client_errors_are_returned_without_retry(self):
+        request, calls = responses(404)
+        guard = self.guard(retries=2)
+        self.assertEqual(asyncio.run(guard.call(request, idempotent=True)).status_code, 404)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(guard.stats.failures, 0)
+
+    def test_timeouts_raise_upstream_timeout_after_retries(self):
+        request, calls = responses(*[httpx.ReadTimeout("slow")] * 3)
+        guard = self.guard(retries=2)
+        with self.assertRaises(UpstreamTimeout):
+            asyncio.run(guard.call(request, idempotent=True))
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(guard.stats.timeouts, 3)
+
+    def test_connection_errors_raise_upstream_error(self):
+        request, _ = responses(httpx.ConnectError("refused"))
+        with self.assertRaises(UpstreamError) as context:
+            asyncio.run(self.guard(retries=0).call(request, idempotent=True))
+        self.assertEqual(context.exception.code, 502)
+
+    def test_backoff_is_jittered_and_capped(self):
+        guard = self.guard(backoff_base=0.1, backoff_max=0.3)
+        delays = [guard.backoff(5) for _ in range(50)]
+        self.assertTrue(all(0 <= delay <= 0.3 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_open_circuit_fails_fast(self):
+        guard = self.guard(retries=0, failure_threshold=2, reset_timeout=30)
+        request, calls = responses(500, 500, 200)
+        asyncio.run(guard.call(request, idempotent=True))
+        asyncio.run(guard.call(request, idempotent=True))
+        with self.assertRaises(UpstreamUnavailable) as context:
+            asyncio.run(guard.call(request, idempotent=True))
+        self.assertEqual(context.exception.code, 503)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(guard.stats.circuit_opened, 1)
+        self.assertEqual(guard.stats.short_circuited, 1)
+
+    def test_bulkhead_caps_concurrency(self):
+        guard = self.guard(max_concurrency=1, queue_timeout=0.01)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return httpx.Response(200)
+
+        async def run():
+            first = asyncio.ensure_future(guard.call(slow, idempotent=True))
+            await asyncio.sleep(0)
+            with self.assertRaises(UpstreamBusy):
+                await guard.call(slow, idempotent=True)
+            release.set()
+            return await first
+
+        self.assertEqual(asyncio.run(run()).status_code, 200)
+        self.assertEqual(guard.stats.bulkhead_rejections, 1)
+
+    def test_held_slot_is_kept_until_released(self):
+        guard = self.guard(max_concurrency=1, queue_timeout=0.01)
+
+        async def fast():
+            return httpx.Response(200)
+
+        async def run():
+            await guard.call(fast, idempotent=True, hold_slot=True)
+            with self.assertRaises(UpstreamBusy):
+                await guard.call(fast, idempotent=True)
+            guard.release_slot()
+            return await guard.call(fast, idempotent=True)
+
+        self.assertEqual(asyncio.run(run()).status_code, 200)
+        self.assertEqual(guard.stats.bulkhead_rejections, 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_half_open_allows_single_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        clock.now = 10
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_probe_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        breaker.allow()
+        self.assertTrue(breaker.record_failure())
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class TestUpstreamSend(unittest.TestCase):
+
+    def tearDown(self):
+        asyncio.run(upstream.shutdown())
+        upstream.set_transport(upstream.INCIDENT_QUERY, None)
+        upstream.reset_guards()
+
+    def test_send_applies_policy_per_upstream(self):
+        attempts = []
+
+        def handler(request):
+            attempts.append(request.method)
+            return httpx.Response(503)
+
+        upstream.set_transport(upstream.INCIDENT_QUERY, httpx.MockTransport(handler))
+        upstream.get_guard(upstream.INCIDENT_QUERY)._sleep = no_sleep
+
+        async def run():
+            read = await upstream.send(upstream.INCIDENT_QUERY, "POST", "http://query.test/q", idempotent=True)
+            write = await upstream.send(upstream.INCIDENT_QUERY, "POST", "http://query.test/w")
+            return read, write
+
+        read, write = asyncio.run(run())
+        self.assertEqual((read.status_code, write.status_code), (503, 503))
+        self.assertEqual(len(attempts), 4)
+        self.assertEqual(upstream.guard_stats()[upstream.INCIDENT_QUERY]["retries"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import unittest
+from unittest.mock import patch
+from uuid import UUID
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app.schemas.user import CompanyResponse
+from app.services import serialization
+
+COMPANY = {
+    "id": "12345678-1234-5678-1234-567812345678",
+    "username": "testuser@example.com",
+    "name": "Test Company",
+    "first_name": "John",
+    "last_name": "Doe",
+    "birth_date": "2023-01-01",
+    "phone_number": "+12 345 678 9012",
+    "country": "TestCountry",
+    "city": "TestCity"
+}
+
+
+class TestModelResponse(unittest.TestCase):
+
+    def test_validates_and_filters_untrusted_data(self):
+        response = serialization.model_response(CompanyResponse, {**COMPANY, "password": "secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.media_type, "application/json")
+        self.assertEqual(json.loads(response.body), COMPANY)
+
+    def test_invalid_untrusted_data_raises(self):
+        with self.assertRaises(ValueError):
+            serialization.model_response(CompanyResponse, {"id": "not-a-uuid"})
+
+    def test_trusted_data_is_not_validated(self):
+        response = serialization.model_response(CompanyResponse, {"id": UUID(COMPANY["id"]), "extra": 1}, trusted=True)
+        self.assertEqual(json.loads(response.body), {"id": COMPANY["id"], "extra": 1})
+
+    def test_models_are_dumped_directly(self):
+        model = CompanyResponse.model_validate(COMPANY)
+        self.assertEqual(json.loads(serialization.model_response(CompanyResponse, model).body), COMPANY)
+
+
+class TestCodec(unittest.TestCase):
+
+    def test_default_response_class_follows_toggle(self):
+        with patch.object(serialization, "FAST_JSON", True):
+            self.assertIs(serialization.default_response_class(), ORJSONResponse)
+        with patch.object(serialization, "FAST_JSON", False):
+            self.assertIs(serialization.default_response_class(), JSONResponse)
+
+    def test_falls_back_without_orjson(self):
+        with patch.object(serialization, "orjson", None):
+            self.assertIs(serialization.default_response_class(), JSONResponse)
+            self.assertEqual(json.loads(serialization.dumps({"id": UUID(COMPANY["id"])})), {"id": COMPANY["id"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import unittest
+
+import httpx
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app.main import app
+from app.routers import user as user_router
+from app.routers.user import user_cache
+from app.schemas.user import UserCompanyRequest
+from app.services import streaming, upstream
+from app.services.pagination import PageParams
+from app.services.streaming import JsonArraySplitter
+
+USER_ID = "12345678-1234-5678-1234-567812345678"
+COMPANY_ID = "87654321-4321-8765-4321-876543218765"
+USER = {
+    "id": USER_ID,
+    "username": "jane@example.com",
+    "first_name": "Jane",
+    "last_name": "Doe",
+    "document_id": "123",
+    "document_type": "CC",
+    "birth_date": "1990-01-01",
+    "phone_number": "+57 300 000 0000",
+    "importance": 1,
+    "allow_call": True,
+    "allow_sms": True,
+    "allow_email": True,
+    "registration_date": "2024-01-01T00:00:00",
+}
+INCIDENTS = [
+    {"id": "11111111-1111-1111-1111-111111111111", "description": "Printer [on] fire, \"again\"",
+     "state": "open", "creation_date": "2024-02-01T10:00:00", "internal": True},
+    {"id": "22222222-2222-2222-2222-222222222222", "description": "Fixed {finally}",
+     "state": "closed", "creation_date": "2024-02-02T10:00:00"},
+]
+
+
+def split(body: bytes, key=None, chunk_size=1, **kwargs):
+    splitter = JsonArraySplitter(key, **kwargs)
+    items = []
+    for start in range(0, len(body), chunk_size):
+        items.extend(splitter.feed(body[start:start + chunk_size]))
+    return [json.loads(item) for item in items], splitter
+
+
+class ChunkedStream(httpx.AsyncByteStream):
+    """Response body delivered in small chunks that records whether it was closed."""
+
+    def __init__(self, body: bytes, chunk_size: int = 16):
+        self.chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+class TestJsonArraySplitter(unittest.TestCase):
+
+    def test_root_array_split_byte_by_byte(self):
+        items, splitter = split(json.dumps(INCIDENTS).encode())
+        self.assertEqual(items, INCIDENTS)
+        self.assertTrue(splitter.done)
+
+    def test_array_under_key(self):
+        body = json.dumps({"user_id": "companies", "other": [1, 2], "companies": [{"id": 1}, [2, 3], "x", 4]}).encode()
+        items, _ = split(body, key="companies", chunk_size=7)
+        self.assertEqual(items, [{"id": 1}, [2, 3], "x", 4])
+
+    def test_escaped_quotes_and_backslashes(self):
+        values = ['a\\"]', "\\", 'b"}{']
+        items, _ = split(json.dumps(values).encode(), chunk_size=3)
+        self.assertEqual(items, values)
+
+    def test_empty_array(self):
+        items, splitter = split(b'{"incidents": []}', key="incidents")
+        self.assertEqual(items, [])
+        self.assertTrue(splitter.done)
+
+    def test_item_size_is_bounded(self):
+        with self.assertRaises(ValueError):
+            split(json.dumps(["x" * 100]).encode(), chunk_size=10, max_item_bytes=50)
+
+
+class TestStreamingRoutes(unittest.TestCase):
+
+    def setUp(self):
+        self.streams = []
+        self.client = TestClient(app)
+        asyncio.run(user_cache.clear())
+
+    def tearDown(self):
+        asyncio.run(upstream.shutdown())
+        for name in (upstream.USER_SERVICE, upstream.INCIDENT_QUERY):
+            upstream.set_transport(name, None)
+        upstream.reset_guards()
+        asyncio.run(user_cache.clear())
+
+    def serve(self, name, routes):
+        def handler(request):
+            status_code, payload = routes[request.url.path.rsplit("/", 1)[-1]]
+            stream = ChunkedStream(json.dumps(payload).encode())
+            self.streams.append(stream)
+            return httpx.Response(status_code, stream=stream, headers={"Content-Type": "application/json"})
+
+        upstream.set_transport(name, httpx.MockTransport(handler))
+
+    def test_companies_ndjson(self):
+        companies = [{"id": str(index), "name": f"Company {index}"} for index in range(5)]
+        self.serve(upstream.USER_SERVICE, {"companies-user": (200, {"user_id": USER_ID, "companies": companies})})
+        response = self.client.post("/user-management/user/companies-user", json={"id": USER_ID},
+                                    headers={"Accept": streaming.NDJSON})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], streaming.NDJSON)
+        self.assertEqual([json.loads(line) for line in response.text.splitlines()], companies)
+        self.assertTrue(self.streams[0].closed)
+
+    def test_companies_raw_passthrough(self):
+        payload = {"user_id": USER_ID, "companies": [{"id": "1", "name": "Company"}]}
+        self.serve(upstream.USER_SERVICE, {"companies": (200, payload)})
+        response = self.client.post("/user-management/user/companies?stream=true",
+                                    json={"document_type": "CC", "document_id": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), payload)
+
+    def test_raw_passthrough_with_fields_is_projected(self):
+        payload = {"user_id": USER_ID, "companies": [{"id": "1", "name": "Company"}]}
+        self.serve(upstream.USER_SERVICE, {"companies": (200, payload)})
+        response = self.client.post("/user-management/user/companies?stream=true&fields=id",
+                                    json={"document_type": "CC", "document_id": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["companies"], [{"id": "1"}])
+
+    def test_upstream_error_is_raised_before_streaming(self):
+        self.serve(upstream.USER_SERVICE, {"companies": (404, {"detail": "User not found"})})
+        response = self.client.post("/user-management/user/companies", json={"document_type": "CC", "document_id": "1"},
+                                    headers={"Accept": streaming.NDJSON})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"detail": {"detail": "User not found"}})
+        self.assertTrue(self.streams[0].closed)
+
+    def test_users_view_ndjson_streams_projected_incidents(self):
+        self.serve(upstream.USER_SERVICE, {
+            USER_ID: (200, USER),
+            "companies-user": (200, {"user_id": USER_ID, "companies": [{"id": COMPANY_ID, "name": "Acme"}]}),
+        })
+        self.serve(upstream.INCIDENT_QUERY, {"user-company": (200, {"incidents": INCIDENTS})})
+        response = self.client.post("/user-management/user/users-view", json={"user_id": USER_ID, "company_id": COMPANY_ID},
+                                    headers={"Accept": streaming.NDJSON})
+        self.assertEqual(response.status_code, 200)
+        header, *incidents = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(header["id"], USER_ID)
+        self.assertEqual(header["companies"], [{"id": COMPANY_ID, "name": "Acme"}])
+        self.assertEqual(header["unavailable"], [])
+        self.assertNotIn("incidents", header)
+        self.assertEqual([incident["id"] for incident in incidents], [incident["id"] for incident in INCIDENTS])
+        self.assertNotIn("internal", incidents[0])
+
+    def test_client_disconnect_closes_the_upstream_stream(self):
+        companies = [{"id": str(index), "name": "x" * 50} for index in range(50)]
+        self.serve(upstream.USER_SERVICE, {"companies": (200, {"companies": companies})})
+
+        async def run():
+            response = await streaming.proxy(
+                upstream.stream(upstream.USER_SERVICE, "POST", "http://users.test/user/companies"),
+                ndjson=True, key="companies",
+            )
+            iterator = response.body_iterator
+            first = await iterator.__anext__()
+            # What Starlette does to the body iterator when the client goes away
+            await iterator.aclose()
+            return first
+
+        first = asyncio.run(run())
+        self.assertTrue(first.startswith(b'{"id":"0"'))
+        self.assertTrue(self.streams[0].closed)
+        self.assertEqual(upstream.guard_stats()[upstream.USER_SERVICE]["calls"], 1)
+
+    def test_streamed_body_holds_its_bulkhead_slot(self):
+        self.serve(upstream.USER_SERVICE, {"companies": (200, {"companies": []})})
+        guard = upstream.get_guard(upstream.USER_SERVICE)
+        max_concurrency = guard.policy.max_concurrency
+
+        async def run():
+            async with upstream.stream(upstream.USER_SERVICE, "POST", "http://users.test/user/companies"):
+                held = guard._slots._value
+            return held, guard._slots._value
+
+        held, after = asyncio.run(run())
+        self.assertEqual(held, max_concurrency - 1)
+        self.assertEqual(after, max_concurrency)
+
+    def test_users_view_closes_the_incidents_stream_when_the_header_fails(self):
+        self.serve(upstream.USER_SERVICE, {
+            USER_ID: (200, {**USER, "username": "not an email"}),
+            "companies-user": (200, {"user_id": USER_ID, "companies": []}),
+        })
+        self.serve(upstream.INCIDENT_QUERY, {"user-company": (200, {"incidents": INCIDENTS})})
+        request = UserCompanyRequest(user_id=USER_ID, company_id=COMPANY_ID)
+
+        async def run():
+            with self.assertRaises(ValidationError):
+                await user_router.stream_user_with_incidents(request, None, PageParams())
+            # Checked before yielding to the loop, so garbage collection cannot have closed it
+            return [stream.closed for stream in self.streams]
+
+        self.assertEqual(asyncio.run(run()), [True] * len(self.streams))
+
+
+if __name__ == "__main__":
+    unittest.main()
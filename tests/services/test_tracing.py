@@ -0,0 +1,164 @@
+import asyncio
+import contextvars
+import json
+import os
+import tempfile
+import unittest
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers.company import company_cache
+from app.services import tracing, upstream
+from app.services.tracing import FileExporter, InMemoryExporter, SpanExporter, Tracer, parse_traceparent
+
+COMPANY_ID = "12345678-1234-5678-1234-567812345678"
+CALLER_TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+class TestTraceparent(unittest.TestCase):
+
+    def test_parse_valid_header(self):
+        self.assertEqual(parse_traceparent(CALLER_TRACEPARENT),
+                         ("0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331", True))
+
+    def test_invalid_headers_are_ignored(self):
+        for value in (None, "", "garbage", "00-" + "0" * 32 + "-b7ad6b7169203331-01",
+                      "00-0af7651916cd43dd8448eb211c80319c-xyz-01"):
+            self.assertIsNone(parse_traceparent(value))
+
+
+class TestTracer(unittest.TestCase):
+
+    def test_children_share_the_trace(self):
+        exporter = InMemoryExporter()
+        tracer = Tracer(exporter, sample_ratio=1.0)
+        with tracer.start_span("parent") as parent:
+            with tracer.start_span("child") as child:
+                pass
+        self.assertEqual([span.name for span in exporter.spans], ["child", "parent"])
+        self.assertEqual(child.trace_id, parent.trace_id)
+        self.assertEqual(child.parent_id, parent.span_id)
+
+    def test_unsampled_traces_are_not_exported_but_still_propagate(self):
+        exporter = InMemoryExporter()
+        with Tracer(exporter, sample_ratio=0.0).start_span("request") as span:
+            self.assertTrue(span.traceparent.endswith("-00"))
+        self.assertEqual(exporter.spans, [])
+
+    def test_caller_sampling_decision_wins(self):
+        exporter = InMemoryExporter()
+        with Tracer(exporter, sample_ratio=0.0).start_span("request", traceparent=CALLER_TRACEPARENT):
+            pass
+        self.assertEqual(exporter.spans[0].trace_id, "0af7651916cd43dd8448eb211c80319c")
+
+    def test_inactive_span_can_end_in_another_task(self):
+        exporter = InMemoryExporter()
+        tracer = Tracer(exporter)
+
+        async def close(context):
+            context.__exit__(None, None, None)
+
+        async def run():
+            with tracer.start_span("request") as parent:
+                context = tracer.start_span("stream", activate=False)
+                child = context.__enter__()
+                self.assertIs(tracing.current_span(), parent)
+                await asyncio.create_task(close(context))
+            return parent, child
+
+        parent, child = asyncio.run(run())
+        self.assertEqual(child.parent_id, parent.span_id)
+        self.assertEqual([span.name for span in exporter.spans], ["stream", "request"])
+
+    def test_mismatched_reset_is_not_hidden(self):
+        tracer = Tracer(InMemoryExporter())
+        context = tracer.start_span("leaked")
+        contextvars.copy_context().run(context.__enter__)
+
+        async def close_elsewhere():
+            context.__exit__(None, None, None)
+
+        with self.assertRaises(ValueError):
+            asyncio.run(close_elsewhere())
+
+    def test_exceptions_mark_the_span(self):
+        exporter = InMemoryExporter()
+        with self.assertRaises(RuntimeError):
+            with Tracer(exporter).start_span("request"):
+                raise RuntimeError("boom")
+        self.assertEqual(exporter.spans[0].status, "error")
+        self.assertEqual(exporter.spans[0].attributes["exception.type"], "RuntimeError")
+
+    def test_disabled_tracer_yields_none(self):
+        with Tracer(None).start_span("request") as span:
+            self.assertIsNone(span)
+
+    def test_file_exporter_writes_json_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traces.jsonl")
+            exporter = FileExporter(path)
+            with Tracer(exporter).start_span("request", attributes={"upstream": "user"}):
+                pass
+            exporter.shutdown()
+            with open(path) as handle:
+                spans = [json.loads(line) for line in handle]
+        self.assertEqual(spans[0]["name"], "request")
+        self.assertEqual(spans[0]["attributes"], {"upstream": "user"})
+
+    def test_exporter_without_export_cannot_be_built(self):
+        class ClosingExporter(SpanExporter):
+            def shutdown(self):
+                pass
+
+        with self.assertRaisesRegex(TypeError, "export"):
+            ClosingExporter()
+
+
+class TestRequestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = InMemoryExporter()
+        tracing.configure(self.exporter, sample_ratio=1.0)
+        self.upstream_headers = []
+
+        def handler(request):
+            self.upstream_headers.append(request.headers)
+            return httpx.Response(200, json={
+                "id": COMPANY_ID, "username": "testuser@example.com", "name": "Test Company",
+                "first_name": "John", "last_name": "Doe", "birth_date": "2023-01-01",
+                "phone_number": "+12 345 678 9012", "country": "TestCountry", "city": "TestCity",
+            })
+
+        upstream.set_transport(upstream.USER_SERVICE, httpx.MockTransport(handler))
+        asyncio.run(company_cache.clear())
+
+    def tearDown(self):
+        tracing.configure(None)
+        asyncio.run(upstream.shutdown())
+        upstream.set_transport(upstream.USER_SERVICE, None)
+        upstream.reset_guards()
+        asyncio.run(company_cache.clear())
+
+    def test_server_and_upstream_spans_are_linked(self):
+        response = TestClient(app).get(f"/user-management/company/{COMPANY_ID}",
+                                       headers={"traceparent": CALLER_TRACEPARENT})
+        self.assertEqual(response.status_code, 200)
+
+        client_span, server_span = self.exporter.spans
+        self.assertEqual(server_span.name, "GET /user-management/company/{company_id}")
+        self.assertEqual(server_span.trace_id, "0af7651916cd43dd8448eb211c80319c")
+        self.assertEqual(server_span.parent_id, "b7ad6b7169203331")
+        self.assertEqual(server_span.attributes["http.status_code"], 200)
+        self.assertGreater(server_span.attributes["http.response_size"], 0)
+
+        self.assertEqual(client_span.parent_id, server_span.span_id)
+        self.assertEqual(client_span.attributes["upstream"], upstream.USER_SERVICE)
+        self.assertEqual(client_span.attributes["http.status_code"], 200)
+        self.assertGreater(client_span.attributes["http.response_size"], 0)
+        self.assertEqual(self.upstream_headers[0]["traceparent"], client_span.traceparent)
+
+
+if __name__ == "__main__":
+    unittest.main()
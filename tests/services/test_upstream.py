@@ -0,0 +1,69 @@
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+from app.services import upstream
+
+
+class TestUpstreamClients(unittest.TestCase):
+
+    def tearDown(self):
+        asyncio.run(upstream.shutdown())
+        for name in upstream.UPSTREAMS:
+            upstream.set_transport(name, None)
+
+    def test_settings_defaults(self):
+        settings = upstream.load_settings(upstream.USER_SERVICE)
+        self.assertEqual(settings.max_connections, 100)
+        self.assertEqual(settings.max_keepalive_connections, 20)
+        self.assertFalse(settings.http2)
+
+    @patch.dict(os.environ, {
+        "UPSTREAM_MAX_CONNECTIONS": "50",
+        "UPSTREAM_INCIDENT_QUERY_MAX_CONNECTIONS": "5",
+        "UPSTREAM_INCIDENT_QUERY_HTTP2": "true",
+    })
+    def test_settings_per_upstream_override(self):
+        self.assertEqual(upstream.load_settings(upstream.USER_SERVICE).max_connections, 50)
+        query = upstream.load_settings(upstream.INCIDENT_QUERY)
+        self.assertEqual(query.max_connections, 5)
+        self.assertTrue(query.http2)
+
+    def test_startup_creates_one_client_per_upstream(self):
+        async def run():
+            await upstream.startup()
+            clients = {name: upstream.get_client(name) for name in upstream.UPSTREAMS}
+            await upstream.startup()
+            self.assertTrue(all(upstream.get_client(n) is c for n, c in clients.items()))
+            await upstream.shutdown()
+            return clients
+
+        clients = asyncio.run(run())
+        self.assertTrue(all(client.is_closed for client in clients.values()))
+
+    def test_send_reuses_pooled_client(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            return httpx.Response(200, json={"ok": True})
+
+        upstream.set_transport(upstream.USER_SERVICE, httpx.MockTransport(handler))
+
+        async def run():
+            await upstream.startup()
+            first = await upstream.send(upstream.USER_SERVICE, "GET", "http://user.test/a")
+            second = await upstream.send(upstream.USER_SERVICE, "GET", "http://user.test/b")
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first.json(), {"ok": True})
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(calls, ["/a", "/b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import asyncio
+import unittest
+
+from benchmarks.run import parse_args, percentile, run_benchmark
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_percentile(self):
+        values = [float(value) for value in range(1, 101)]
+        self.assertEqual(percentile(values, 0.50), 50.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_run_benchmark_reports_every_selected_endpoint(self):
+        config = parse_args([
+            "--requests", "20", "--warmup", "0", "--concurrency", "4", "--latency-ms", "0",
+            "--endpoints", "health,company_get,users_view",
+        ])
+        report = asyncio.run(run_benchmark(config))
+
+        self.assertEqual([result["endpoint"] for result in report["results"]], ["health", "company_get", "users_view"])
+        for result in report["results"]:
+            self.assertEqual(result["errors"], 0)
+            self.assertGreater(result["rps"], 0)
+            self.assertLessEqual(result["latency_ms"]["p50"], result["latency_ms"]["p99"])
+        self.assertGreater(report["upstreams"]["incident_query"]["requests"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
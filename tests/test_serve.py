@@ -0,0 +1,121 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import httpx
+import uvicorn
+
+from app.serve import DrainingServer, available_cpus, load_settings
+from app.services.health import HealthProber
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestWorkerCount(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, path, content):
+        path = os.path.join(self.directory.name, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def test_cgroup_v2_quota_caps_affinity(self):
+        self.write("cpu.max", "150000 100000\n")
+        with patch("os.sched_getaffinity", return_value={0, 1, 2, 3, 4, 5, 6, 7}):
+            self.assertEqual(available_cpus(self.directory.name), 2)
+
+    def test_cgroup_v1_quota_caps_affinity(self):
+        self.write("cpu/cpu.cfs_quota_us", "300000\n")
+        self.write("cpu/cpu.cfs_period_us", "100000\n")
+        with patch("os.sched_getaffinity", return_value={0, 1, 2, 3, 4, 5, 6, 7}):
+            self.assertEqual(available_cpus(self.directory.name), 3)
+
+    def test_unlimited_quota_uses_affinity(self):
+        self.write("cpu.max", "max 100000\n")
+        with patch("os.sched_getaffinity", return_value={2, 3}):
+            self.assertEqual(available_cpus(self.directory.name), 2)
+
+    def test_web_concurrency_overrides_cpu_count(self):
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": "3"}):
+            self.assertEqual(load_settings().workers, 3)
+
+
+class TestDrainingServer(unittest.TestCase):
+    def test_sigterm_fails_readiness_before_exiting(self):
+        prober = HealthProber([])
+        server = DrainingServer(uvicorn.Config(lambda scope, receive, send: None), drain_delay=0.05)
+
+        with patch("app.services.health.prober", prober):
+            server.handle_exit(signal.SIGTERM, None)
+            self.assertTrue(prober.draining)
+            self.assertFalse(prober.ready())
+            self.assertFalse(server.should_exit)
+            time.sleep(0.2)
+
+        self.assertTrue(server.should_exit)
+
+    def test_second_signal_exits_at_once(self):
+        server = DrainingServer(uvicorn.Config(lambda scope, receive, send: None), drain_delay=10)
+
+        with patch("app.services.health.prober", HealthProber([])):
+            server.handle_exit(signal.SIGTERM, None)
+            server.handle_exit(signal.SIGTERM, None)
+
+        self.assertTrue(server.should_exit)
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "pre-forking needs os.fork")
+class TestSupervisor(unittest.TestCase):
+    def test_workers_serve_aggregate_metrics_and_drain_on_sigterm(self):
+        port = free_port()
+        env = {
+            **os.environ, "WEB_CONCURRENCY": "2", "SERVE_HOST": "127.0.0.1", "SERVE_PORT": str(port),
+            "SERVE_DRAIN_DELAY": "1", "SERVE_MAX_REQUESTS": "4", "SERVE_MAX_REQUESTS_JITTER": "0",
+            "METRICS_MULTIPROC_INTERVAL": "0.1", "SERVE_LOG_LEVEL": "warning",
+        }
+        process = subprocess.Popen([sys.executable, "-m", "app.serve"], cwd=ROOT, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.addCleanup(process.kill)
+        base = f"http://127.0.0.1:{port}/user-management"
+
+        for _ in range(100):
+            try:
+                httpx.get(f"{base}/health", timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        # More requests than two workers allow before recycling
+        statuses = {httpx.get(f"{base}/health", timeout=5).status_code for _ in range(12)}
+        self.assertEqual(statuses, {200})
+
+        time.sleep(0.5)
+        scrape = httpx.get(f"{base}/metrics", timeout=5).text
+        line = next(line for line in scrape.splitlines()
+                    if line.startswith('http_requests_total{method="GET",route="/user-management/health"'))
+        self.assertGreaterEqual(float(line.split()[-1]), 12)
+
+        process.send_signal(signal.SIGTERM)
+        time.sleep(0.3)
+        ready = httpx.get(f"{base}/health/ready", timeout=5)
+        self.assertEqual(ready.status_code, 503)
+        self.assertEqual(ready.json()["status"], "draining")
+        self.assertEqual(process.wait(timeout=15), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()